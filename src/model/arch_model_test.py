@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# arch_model_test.py
+# ------------------
+# Tests of the ChaCha datapath architecture model.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+from ch20p1305.arch_model import *
+
+
+#-------------------------------------------------------------------
+# test_arch_sweep()
+#
+# Run the sweep, which checks the blocks from every configuration
+# against chacha_block(), and check the cycle counts of the
+# configurations without pipeline registers. A block takes one
+# cycle for the load, one per pass and one for the final addition.
+#-------------------------------------------------------------------
+def test_arch_sweep():
+    print("*** Test of the datapath configuration sweep.")
+    errors = 0
+    results = sweep()
+    if len(results) != 9:
+        print("Error: Expected 9 configurations, got %d." % len(results))
+        errors += 1
+
+    for r in results:
+        if r["stages"] == 1 and r["latency"] != 80 // r["units"] + 2:
+            print("Error: Incorrect latency %d for %s." % (r["latency"], r["config"]))
+            errors += 1
+        if r["stages"] > 1 and r["critical_path"] >= 4 * max(1, r["units"] // 4):
+            print("Error: Pipeline does not shorten the path in %s." % r["config"])
+            errors += 1
+
+    try:
+        ArchConfig(4, 4)
+        print("Error: Four stages accepted for a single quarterround row.")
+        errors += 1
+    except ValueError:
+        pass
+
+    if errors == 0:
+        print("Correct blocks and cycle counts for all configurations.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run architecture model tests.
+#-------------------------------------------------------------------
+def main():
+    test_arch_sweep()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF arch_model_test.py
+#=======================================================================
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# backends_test.py
+# ----------------
+# Tests of the backend registry. Checks the autotuning, the
+# persisted selection and the environment override.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import json
+import tempfile
+from ch20p1305 import backends
+
+
+#-------------------------------------------------------------------
+# reset_registry()
+#
+# Forget the selection, use the given cache file and clear any
+# backend override in the environment.
+#-------------------------------------------------------------------
+def reset_registry(path):
+    backends.reset()
+    os.environ[backends.ENV_CACHE] = path
+    for name in list(os.environ):
+        if name.startswith(backends.ENV_BACKEND + "_") and name != backends.ENV_CACHE:
+            del os.environ[name]
+    os.environ.pop(backends.ENV_BACKEND, None)
+
+
+#-------------------------------------------------------------------
+# test_backend_selection()
+#
+# Autotune the operations, check that the selection is persisted
+# and reloaded without new autotuning, that the dispatched results
+# match the reference, and that the environment override works.
+#-------------------------------------------------------------------
+def test_backend_selection():
+    print("*** Test of the backend registry.")
+    errors = 0
+    saved_environ = dict(os.environ)
+    autotune = backends.autotune
+    select = backends.select
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            errors += check_selection(os.path.join(tmpdir, "backends.json"))
+    finally:
+        backends.autotune = autotune
+        backends.select = select
+        backends.BACKENDS["chacha_xor"].pop("extra", None)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        backends.reset()
+
+    if errors == 0:
+        print("Backend registry correct.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# check_selection()
+#
+# The checks of test_backend_selection() using the given cache
+# file. Returns the number of errors.
+#-------------------------------------------------------------------
+def check_selection(path):
+    errors = 0
+    autotune = backends.autotune
+    select = backends.select
+    reset_registry(path)
+
+    for operation in backends.BACKENDS:
+        for num_bytes in [10, 1000, 100000]:
+            name = backends.select(operation, num_bytes)
+            if name not in backends.available(operation):
+                print("Error: Unavailable backend %s selected." % name)
+                errors += 1
+
+    with open(path) as f:
+        cache = json.load(f)
+    if cache.get(backends.cache_key()) != backends.selection:
+        print("Error: Selection not persisted in cache file.")
+        errors += 1
+
+    # The persisted selection must be used without autotuning.
+    selected = dict(backends.selection)
+    reset_registry(path)
+    backends.autotune = None
+    try:
+        for operation in selected:
+            backends.select(operation, 10)
+    except TypeError:
+        print("Error: Autotuning rerun despite persisted selection.")
+        errors += 1
+    backends.autotune = autotune
+    if backends.selection != selected:
+        print("Error: Loaded selection differs from persisted.")
+        errors += 1
+
+    # A partial selection, as from an older cache file, must use
+    # the default backend for the missing size classes.
+    partial_path = path + ".partial"
+    with open(partial_path, "w") as f:
+        json.dump({backends.cache_key(): {"chacha_xor": {"small": "reference"},
+                                          "poly1305_mac": {}}}, f)
+    reset_registry(partial_path)
+    if backends.select("chacha_xor", 10) != "reference" or \
+       backends.select("chacha_xor", 100000) != backends.DEFAULT_BACKEND or \
+       backends.select("poly1305_mac", 10) != backends.DEFAULT_BACKEND:
+        print("Error: Partial selection not completed with the default backend.")
+        errors += 1
+
+    # A new backend must not be left out by an old selection.
+    reset_registry(path)
+    backends.register("chacha_xor", "extra", "ch20p1305.aead", "chacha_xor")
+    tuned = []
+    backends.autotune = lambda operation: tuned.append(operation) or \
+        autotune(operation)
+    backends.select("chacha_xor", 10)
+    backends.select("poly1305_mac", 10)
+    backends.autotune = autotune
+    del backends.BACKENDS["chacha_xor"]["extra"]
+    if tuned != ["chacha_xor", "poly1305_mac"]:
+        print("Error: Selection cached before a new backend used, tuned %s." %
+              tuned)
+        errors += 1
+    reset_registry(path)
+
+    key = list(range(8))
+    nonce = [0, 0x4a000000, 0]
+    data = bytes(range(200)) * 10
+    expected = backends.chacha_xor_reference(key, 1, nonce, data,
+                                             bytearray(len(data)))
+    if backends.chacha_xor(key, 1, nonce, data, bytearray(len(data))) != expected:
+        print("Error: Dispatched chacha_xor gives incorrect result.")
+        errors += 1
+
+    # The backends are resolved once, a re-tune resolves them again.
+    backends.select = None
+    try:
+        backends.chacha_xor(key, 1, nonce, data, bytearray(len(data)))
+    except TypeError:
+        print("Error: Backend resolved again on every call.")
+        errors += 1
+    backends.autotune("chacha_xor")
+    if "chacha_xor" in backends.resolved:
+        print("Error: Resolved backends kept after autotuning.")
+        errors += 1
+    backends.select = select
+    reset_registry(path)
+
+    os.environ[backends.ENV_BACKEND] = "reference"
+    os.environ[backends.ENV_BACKEND + "_POLY1305_MAC"] = "bigint"
+    if backends.select("chacha_xor", 100000) != "reference":
+        print("Error: Global backend override ignored.")
+        errors += 1
+    if backends.select("poly1305_mac", 100000) != "bigint":
+        print("Error: Operation backend override ignored.")
+        errors += 1
+    if backends.get("chacha_xor", 100000) is not backends.chacha_xor_reference:
+        print("Error: Backend override ignored by get().")
+        errors += 1
+    return errors
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run backend registry tests.
+#-------------------------------------------------------------------
+def main():
+    test_backend_selection()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF backends_test.py
+#=======================================================================
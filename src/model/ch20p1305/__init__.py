@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# __init__.py
+# -----------
+# The ChaCha20, Poly1305 and ChaCha20-Poly1305 model as an
+# importable package. The core only depends on the standard
+# library. Optional backends that need NumPy, multiprocessing or
+# asyncio, and the tools not needed by the core, are loaded lazily
+# the first time they are accessed as attributes of the package,
+# for example ch20p1305.np_chacha.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import importlib
+
+from . import metrics
+from .chacha import qr, quarterround, doubleround
+from .chacha import chacha_block, chacha_encryption, hchacha20
+from .poly1305 import Poly1305, poly1305_mac_fast
+from .aead import poly1305_key_gen, aead_tag, aead_tag_iov
+from .aead import encrypt_iov, chacha_xor, chacha_xor_at
+from .aead import aead_seal, aead_open, aead_seal_iov, aead_open_iov
+from .xchacha import xchacha20_xor, xchacha_seal, xchacha_open
+from .record import RecordSealer, RecordOpener, RecordLimitError
+from .drbg import ChaChaDRBG, StreamExhaustedError
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Lazily loaded modules and the dependency they need, None for
+# modules that only need the core.
+LAZY_MODULES = {"np_chacha":         "numpy",
+                "np_poly1305":       "numpy",
+                "pipeline":          "threading",
+                "service":           "socket",
+                "precompute":        "threading",
+                "kat":               "multiprocessing",
+                "parallel_poly1305": "multiprocessing",
+                "swar_chacha":       None,
+                "backends":          "json",
+                "snapshots":         "mmap",
+                "compare":           None,
+                "host_driver":       None,
+                "arch_model":        None}
+
+# The NumPy modules are left out, so that a star import works
+# without NumPy.
+__all__ = ["metrics", "qr", "quarterround", "doubleround",
+           "chacha_block", "chacha_encryption", "hchacha20",
+           "Poly1305", "poly1305_mac_fast",
+           "poly1305_key_gen", "aead_tag", "aead_tag_iov",
+           "encrypt_iov", "chacha_xor", "chacha_xor_at",
+           "aead_seal", "aead_open", "aead_seal_iov", "aead_open_iov",
+           "xchacha20_xor", "xchacha_seal", "xchacha_open",
+           "RecordSealer", "RecordOpener", "RecordLimitError",
+           "ChaChaDRBG", "StreamExhaustedError"] + \
+          [name for (name, dependency) in LAZY_MODULES.items()
+           if dependency != "numpy"]
+
+
+#-------------------------------------------------------------------
+# __getattr__()
+#
+# Import a lazily loaded backend module on first access.
+#-------------------------------------------------------------------
+def __getattr__(name):
+    if name in LAZY_MODULES:
+        module = importlib.import_module("." + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+#-------------------------------------------------------------------
+# __dir__()
+#-------------------------------------------------------------------
+def __dir__():
+    return sorted(list(globals()) + list(LAZY_MODULES))
+
+#=======================================================================
+# EOF __init__.py
+#=======================================================================
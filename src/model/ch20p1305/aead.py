@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# aead.py
+# -------
+# Model of the ChaCha20-Poly1305 AEAD construction as specified
+# in 2.8 in RFC 7539 (https://tools.ietf.org/html/rfc7539).
+#
+# The open function authenticates the AAD and ciphertext before
+# any keystream for the payload is generated. Forged or corrupted
+# messages are rejected after the Poly1305 key generation and one
+# Poly1305 pass.
+#
+#
+# Copyright (c) 2017 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import hmac
+import struct
+from .utils import w32bl, l2lw32, byteview
+from .chacha import chacha_block
+from .poly1305 import Poly1305
+from . import metrics
+
+
+#-------------------------------------------------------------------
+# poly1305_key_gen()
+#
+# Generate the one time Poly1305 key using the ChaCha20 block
+# function with the counter set to zero as specified in 2.6
+# in the RFC. Key and nonce are given as lists of words.
+#-------------------------------------------------------------------
+def poly1305_key_gen(key, nonce):
+    start = metrics.timer_start()
+    block = chacha_block(key, 0, nonce)
+    otk = w32bl(block)[0:32]
+    metrics.timer_stop("keygen", start)
+    return otk
+
+
+#-------------------------------------------------------------------
+# pad16()
+#
+# Return the zero padding needed to make the given length a
+# multiple of 16 bytes.
+#-------------------------------------------------------------------
+def pad16(length):
+    return bytes((16 - (length % 16)) % 16)
+
+
+#-------------------------------------------------------------------
+# aead_mac_data()
+#
+# Build the Poly1305 input for the AEAD construction:
+# AAD, padding, ciphertext, padding, and the lengths of the
+# AAD and ciphertext as 64 bit little endian words.
+# Only used as reference, aead_tag() streams the same input.
+#-------------------------------------------------------------------
+def aead_mac_data(aad, ciphertext):
+    aad = bytes(byteview(aad))
+    ciphertext = bytes(byteview(ciphertext))
+    return (aad + pad16(len(aad)) +
+            bytes(ciphertext) + pad16(len(ciphertext)) +
+            struct.pack("<QQ", len(aad), len(ciphertext)))
+
+
+#-------------------------------------------------------------------
+# aead_tag_iov()
+#
+# Calculate the AEAD tag using the given one time key. The AAD
+# and the ciphertext fragments are streamed into Poly1305 as
+# separate segments with implicit padding and length block, so
+# the ciphertext is never copied into a materialized AEAD
+# construct. The Poly1305 block alignment is carried across the
+# fragment boundaries.
+#-------------------------------------------------------------------
+def aead_tag_iov(otk, aad, fragments):
+    start = metrics.timer_start()
+    aad = byteview(aad)
+    mac = Poly1305(otk)
+    mac.update(aad).pad16()
+    ciphertext_len = 0
+    for fragment in fragments:
+        fragment = byteview(fragment)
+        mac.update(fragment)
+        ciphertext_len += len(fragment)
+    mac.pad16()
+    mac.update(struct.pack("<QQ", len(aad), ciphertext_len))
+    tag = mac.finalize()
+    metrics.timer_stop("mac", start)
+    return tag
+
+
+#-------------------------------------------------------------------
+# aead_tag()
+#
+# Calculate the AEAD tag for a contiguous ciphertext.
+#-------------------------------------------------------------------
+def aead_tag(otk, aad, ciphertext):
+    return aead_tag_iov(otk, aad, [ciphertext])
+
+
+#-------------------------------------------------------------------
+# tags_equal()
+#
+# Compare the given tags in constant time.
+#-------------------------------------------------------------------
+def tags_equal(tag, expected_tag):
+    start = metrics.timer_start()
+    equal = hmac.compare_digest(bytes(tag), bytes(expected_tag))
+    metrics.timer_stop("compare", start)
+    return equal
+
+
+#-------------------------------------------------------------------
+# encrypt_iov()
+#
+# Scatter-gather version of chacha_xor(). Each buffer in inputs
+# is enciphered into the buffer with the same index in outputs.
+# The keystream position is carried across buffer boundaries,
+# so a 64 byte keystream block may be split between buffers.
+# Buffers with items larger than a byte, for example arrays of
+# words, are used as bytes. Key and nonce are given as lists of
+# words.
+#-------------------------------------------------------------------
+def encrypt_iov(key, counter, nonce, inputs, outputs):
+    if len(inputs) != len(outputs):
+        raise ValueError("Number of input and output buffers differ.")
+
+    start = metrics.timer_start()
+    keystream = b""
+    pos = 0
+    for (src, dst) in zip(inputs, outputs):
+        src = byteview(src)
+        if not isinstance(dst, list):
+            dst = byteview(dst)
+        if len(dst) < len(src):
+            raise ValueError("Output buffer shorter than input buffer.")
+
+        done = 0
+        while done < len(src):
+            if pos == len(keystream):
+                block = chacha_block(key, counter, nonce)
+                keystream = struct.pack("<16I", *block)
+                counter += 1
+                pos = 0
+            n = min(len(src) - done, len(keystream) - pos)
+            x = (int.from_bytes(src[done : done + n], "little") ^
+                 int.from_bytes(keystream[pos : pos + n], "little"))
+            dst[done : done + n] = x.to_bytes(n, "little")
+            done += n
+            pos += n
+        if metrics.ENABLED:
+            metrics.count("xor_bytes", len(src))
+    metrics.timer_stop("keystream", start)
+    return outputs
+
+
+#-------------------------------------------------------------------
+# chacha_xor()
+#
+# Encipher or decipher the given data with the ChaCha20 keystream
+# starting at the given counter. The result is written into out,
+# which must be a mutable sequence of bytes at least as long as
+# the data. Key and nonce are given as lists of words.
+#-------------------------------------------------------------------
+def chacha_xor(key, counter, nonce, data, out):
+    encrypt_iov(key, counter, nonce, [data], [out])
+    return out
+
+
+#-------------------------------------------------------------------
+# chacha_xor_at()
+#
+# Seekable version of chacha_xor(). The data is enciphered as
+# the part of the stream starting offset bytes after the start
+# of the block with the given counter. With a 64 bit nonce the
+# counter is 64 bits, so a single stream can cover objects far
+# larger than 256 GB.
+#-------------------------------------------------------------------
+def chacha_xor_at(key, nonce, offset, data, out, counter=0):
+    skip = offset % 64
+    encrypt_iov(key, counter + offset // 64, nonce,
+                [bytes(skip), data], [bytearray(skip), out])
+    return out
+
+
+#-------------------------------------------------------------------
+# xor_precomputed()
+#
+# chacha_xor() starting at counter 1 where the keystream for the
+# first blocks has already been generated. The rest of the data
+# is enciphered with keystream generated here.
+#-------------------------------------------------------------------
+def xor_precomputed(key, nonce, keystream, data, out):
+    data = byteview(data)
+    n = min(len(data), len(keystream))
+    x = int.from_bytes(data[0 : n], "little") ^ int.from_bytes(keystream[0 : n], "little")
+    out[0 : n] = x.to_bytes(n, "little")
+    if metrics.ENABLED:
+        metrics.count("xor_bytes", n)
+    if n < len(data):
+        rest = bytearray(len(data) - n)
+        chacha_xor(key, 1 + n // 64, nonce, data[n:], rest)
+        out[n : len(data)] = rest
+    return out
+
+
+#-------------------------------------------------------------------
+# aead_seal_words()
+#
+# aead_seal() with key and nonce given as lists of words, for
+# callers that keep the key state between messages. precomputed
+# is an optional (one time key, keystream) pair for the nonce,
+# see xor_precomputed().
+#-------------------------------------------------------------------
+def aead_seal_words(key_words, nonce_words, aad, plaintext, precomputed=None):
+    if precomputed is None:
+        otk = poly1305_key_gen(key_words, nonce_words)
+        ciphertext = chacha_xor(key_words, 1, nonce_words, plaintext,
+                                [0] * len(plaintext))
+    else:
+        (otk, keystream) = precomputed
+        ciphertext = xor_precomputed(key_words, nonce_words, keystream,
+                                     plaintext, [0] * len(plaintext))
+    tag = aead_tag(otk, aad, ciphertext)
+    if metrics.ENABLED:
+        metrics.count("aead_seals")
+    return (ciphertext, tag)
+
+
+#-------------------------------------------------------------------
+# aead_seal()
+#
+# Encrypt and authenticate the plaintext and authenticate the
+# aad with the given 32 byte key and 12 byte nonce.
+# Returns the ciphertext and the 16 byte tag as lists of bytes.
+#-------------------------------------------------------------------
+def aead_seal(key, nonce, aad, plaintext):
+    return aead_seal_words(l2lw32(list(key)), l2lw32(list(nonce)),
+                           aad, plaintext)
+
+
+#-------------------------------------------------------------------
+# aead_open_words()
+#
+# aead_open() with key and nonce given as lists of words, and
+# an optional precomputed (one time key, keystream) pair.
+#-------------------------------------------------------------------
+def aead_open_words(key_words, nonce_words, aad, ciphertext, tag, out=None,
+                    precomputed=None):
+    if precomputed is None:
+        otk = poly1305_key_gen(key_words, nonce_words)
+    else:
+        (otk, keystream) = precomputed
+    expected_tag = aead_tag(otk, aad, ciphertext)
+    if metrics.ENABLED:
+        metrics.count("aead_opens")
+    if not tags_equal(tag, expected_tag):
+        if metrics.ENABLED:
+            metrics.count("aead_open_failures")
+        return None
+
+    if out is None:
+        out = [0] * len(ciphertext)
+    if precomputed is not None:
+        return xor_precomputed(key_words, nonce_words, keystream, ciphertext, out)
+    return chacha_xor(key_words, 1, nonce_words, ciphertext, out)
+
+
+#-------------------------------------------------------------------
+# aead_open()
+#
+# Authenticate and decrypt the ciphertext. The tag is checked
+# in constant time before any payload keystream is generated.
+# If out is given the plaintext is written into it, otherwise
+# a new list is returned. Returns None if the tag is incorrect.
+#-------------------------------------------------------------------
+def aead_open(key, nonce, aad, ciphertext, tag, out=None):
+    return aead_open_words(l2lw32(list(key)), l2lw32(list(nonce)),
+                           aad, ciphertext, tag, out)
+
+
+#-------------------------------------------------------------------
+# aead_seal_iov()
+#
+# Scatter-gather version of aead_seal(). The plaintext fragments
+# in inputs are enciphered into the buffers in outputs.
+# Returns the 16 byte tag.
+#-------------------------------------------------------------------
+def aead_seal_iov(key, nonce, aad, inputs, outputs):
+    key_words = l2lw32(list(key))
+    nonce_words = l2lw32(list(nonce))
+
+    otk = poly1305_key_gen(key_words, nonce_words)
+    encrypt_iov(key_words, 1, nonce_words, inputs, outputs)
+    fragments = [byteview(outputs[i])[0 : len(byteview(inputs[i]))]
+                 for i in range(len(inputs))]
+    tag = aead_tag_iov(otk, aad, fragments)
+    if metrics.ENABLED:
+        metrics.count("aead_seals")
+    return tag
+
+
+#-------------------------------------------------------------------
+# aead_open_iov()
+#
+# Scatter-gather version of aead_open(). The ciphertext fragments
+# in inputs are authenticated and, if the tag is correct,
+# deciphered into the buffers in outputs. Returns outputs, or
+# None if the tag is incorrect.
+#-------------------------------------------------------------------
+def aead_open_iov(key, nonce, aad, inputs, tag, outputs):
+    key_words = l2lw32(list(key))
+    nonce_words = l2lw32(list(nonce))
+
+    otk = poly1305_key_gen(key_words, nonce_words)
+    expected_tag = aead_tag_iov(otk, aad, inputs)
+    if metrics.ENABLED:
+        metrics.count("aead_opens")
+    if not tags_equal(tag, expected_tag):
+        if metrics.ENABLED:
+            metrics.count("aead_open_failures")
+        return None
+    return encrypt_iov(key_words, 1, nonce_words, inputs, outputs)
+
+
+#=======================================================================
+# EOF aead.py
+#=======================================================================
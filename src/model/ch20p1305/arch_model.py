@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# arch_model.py
+# -------------
+# Architectural model of the ChaCha block datapath, for choosing
+# the number of parallel quarterround units and pipeline registers
+# in the HW core.
+#
+# The 80 quarterrounds of a block are executed as passes through
+# a datapath of units quarterround units. With up to four units
+# all units work on the same column or diagonal round. With eight
+# units, two rows of four units are chained so a pass performs a
+# complete doubleround. The datapath can be split into stages
+# pipeline registers, at half quarterround granularity. Several
+# blocks can be in flight to keep the pipeline full.
+#
+# The model runs a cycle by cycle simulation of the schedule,
+# applying qr() to the state of each block as the passes are
+# issued. The result is checked against chacha_block(). Loading
+# the state and the final addition use their own logic and
+# overlap with the passes of other blocks.
+#
+# Usage: python3 -m ch20p1305.arch_model [--clock-mhz F]
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import argparse
+
+from .chacha import NUM_DOUBLEROUNDS, qr, chacha_block, counter_nonce_words
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Quarterrounds of a doubleround, column round then diagonal round.
+DOUBLEROUND_QRS = [(0, 4,  8, 12), (1, 5,  9, 13), (2, 6, 10, 14), (3, 7, 11, 15),
+                   (0, 5, 10, 15), (1, 6, 11, 12), (2, 7,  8, 13), (3, 4,  9, 14)]
+
+BLOCK_QRS = DOUBLEROUND_QRS * NUM_DOUBLEROUNDS
+
+# Adders in the combinational path of half a quarterround.
+ADDERS_PER_HALF_QR = 2
+
+# The given clock is assumed to be the max clock for a path of
+# one quarterround, the max clock of other paths is scaled.
+REFERENCE_PATH = 2 * ADDERS_PER_HALF_QR
+
+SWEEP_UNITS = [1, 2, 4, 8]
+SWEEP_STAGES = [1, 2, 4]
+CLOCK_MHZ = 100.0
+
+
+#-------------------------------------------------------------------
+# ArchConfig
+#
+# A datapath configuration. in_flight is the number of blocks
+# processed concurrently, by default one per pipeline stage.
+#-------------------------------------------------------------------
+class ArchConfig:
+    def __init__(self, units, stages=1, in_flight=None):
+        if units not in SWEEP_UNITS:
+            raise ValueError("Number of quarterround units must be 1, 2, 4 or 8.")
+        self.units = units
+        self.width = min(units, 4)
+        self.depth = units // self.width
+        if stages < 1 or (2 * self.depth) % stages:
+            raise ValueError("Stages must divide the %d half quarterrounds "
+                             "in the datapath." % (2 * self.depth))
+        self.stages = stages
+        self.in_flight = in_flight or stages
+        self.passes = len(BLOCK_QRS) // units
+
+
+    def name(self):
+        return "%d qr, %d stage%s, %d in flight" % (
+            self.units, self.stages, "s" if self.stages > 1 else "",
+            self.in_flight)
+
+
+    def critical_path(self):
+        return ADDERS_PER_HALF_QR * 2 * self.depth // self.stages
+
+
+    def register_bits(self):
+        # State and initial state for the final addition per block
+        # in flight, and the pipeline registers across all lanes.
+        return (self.in_flight * 2 * 512 +
+                (self.stages - 1) * self.width * 4 * 32)
+
+
+    def adders(self):
+        return self.units * 4 + 16
+
+
+#-------------------------------------------------------------------
+# chacha_block_state()
+#
+# The initial state for a block, as set up by chacha_block().
+#-------------------------------------------------------------------
+def chacha_block_state(key, counter, nonce):
+    return ([0x61707865, 0x3320646e, 0x79622d32, 0x6b206574] + list(key) +
+            counter_nonce_words(counter, nonce))
+
+
+#-------------------------------------------------------------------
+# simulate()
+#
+# Run the schedule for num_blocks consecutive blocks and return
+# the total number of cycles, the latency of the first block and
+# the generated blocks.
+#-------------------------------------------------------------------
+def simulate(config, key, counter, nonce, num_blocks):
+    waiting = list(range(num_blocks))
+    active = []
+    results = [None] * num_blocks
+    latency = None
+    cycle = 0
+    done = 0
+
+    while done < num_blocks:
+        # Final addition of blocks with all passes done.
+        for block in [b for b in active
+                      if b["pass"] == config.passes and b["ready"] <= cycle]:
+            results[block["id"]] = [(x + y) & 0xffffffff
+                                    for (x, y) in zip(block["state"], block["init"])]
+            if latency is None:
+                latency = cycle + 1 - block["start"]
+            active.remove(block)
+            done += 1
+
+        # Load the state of new blocks.
+        while waiting and len(active) < config.in_flight:
+            i = waiting.pop(0)
+            init = chacha_block_state(key, counter + i, nonce)
+            active.append({"id": i, "init": init, "state": init[:], "pass": 0,
+                           "ready": cycle + 1, "start": cycle})
+
+        # Issue one pass into the datapath, oldest block first.
+        for block in active:
+            if block["pass"] < config.passes and block["ready"] <= cycle:
+                first = block["pass"] * config.units
+                for (a, b, c, d) in BLOCK_QRS[first : first + config.units]:
+                    state = block["state"]
+                    (state[a], state[b], state[c], state[d]) = \
+                        qr(state[a], state[b], state[c], state[d])
+                block["pass"] += 1
+                block["ready"] = cycle + config.stages
+                break
+        cycle += 1
+
+    return (cycle, latency, results)
+
+
+#-------------------------------------------------------------------
+# evaluate()
+#
+# Simulate the configuration, check the blocks against
+# chacha_block() and return the figures for the configuration.
+#-------------------------------------------------------------------
+def evaluate(config, clock_mhz=CLOCK_MHZ, num_blocks=16):
+    key = list(range(8))
+    nonce = [0x09000000, 0x4a000000, 0x00000000]
+    (cycles, latency, blocks) = simulate(config, key, 1, nonce, num_blocks)
+    for i in range(num_blocks):
+        if blocks[i] != chacha_block(key, 1 + i, nonce):
+            raise AssertionError("Incorrect block from %s." % config.name())
+
+    cycles_per_block = cycles / num_blocks
+    bytes_per_cycle = 64 / cycles_per_block
+    fmax_mhz = clock_mhz * REFERENCE_PATH / config.critical_path()
+    return {"config": config.name(), "units": config.units,
+            "stages": config.stages, "in_flight": config.in_flight,
+            "cycles_per_block": cycles_per_block,
+            "latency": latency,
+            "bytes_per_cycle": bytes_per_cycle,
+            "mbytes_per_s": bytes_per_cycle * clock_mhz,
+            "fmax_mhz": fmax_mhz,
+            "mbytes_per_s_fmax": bytes_per_cycle * fmax_mhz,
+            "poly1305_budget": 16 / bytes_per_cycle,
+            "critical_path": config.critical_path(),
+            "register_bits": config.register_bits(),
+            "adders": config.adders()}
+
+
+#-------------------------------------------------------------------
+# sweep()
+#
+# Evaluate all valid combinations of units and stages.
+#-------------------------------------------------------------------
+def sweep(clock_mhz=CLOCK_MHZ, units=SWEEP_UNITS, stages=SWEEP_STAGES):
+    results = []
+    for u in units:
+        for s in stages:
+            try:
+                config = ArchConfig(u, s)
+            except ValueError:
+                continue
+            results.append(evaluate(config, clock_mhz))
+    return results
+
+
+#-------------------------------------------------------------------
+# print_table()
+#
+# Print the sweep results. poly1305 is the number of cycles the
+# Poly1305 datapath can use per 16 byte block to keep up, path
+# is the number of adders in the critical path and fmax the
+# scaled max clock.
+#-------------------------------------------------------------------
+def print_table(results, clock_mhz=CLOCK_MHZ):
+    print("%-30s %8s %8s %8s %10s %9s %5s %7s %10s %9s %7s" %
+          ("config", "cyc/blk", "latency", "B/cycle", "MB/s@%g" % clock_mhz,
+           "poly1305", "path", "fmax", "MB/s@fmax", "reg bits", "adders"))
+    for r in results:
+        print("%-30s %8.2f %8d %8.3f %10.1f %9.2f %5d %7.0f %10.1f %9d %7d" %
+              (r["config"], r["cycles_per_block"], r["latency"],
+               r["bytes_per_cycle"], r["mbytes_per_s"], r["poly1305_budget"],
+               r["critical_path"], r["fmax_mhz"], r["mbytes_per_s_fmax"],
+               r["register_bits"], r["adders"]))
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ChaCha datapath explorer.")
+    parser.add_argument("--clock-mhz", type=float, default=CLOCK_MHZ,
+                        help="Clock frequency for the throughput column.")
+    args = parser.parse_args(argv)
+    print_table(sweep(args.clock_mhz), args.clock_mhz)
+    return 0
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF arch_model.py
+#=======================================================================
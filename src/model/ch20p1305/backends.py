@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# backends.py
+# -----------
+# Registry of the available implementations (backends) of the
+# ChaCha20 keystream and Poly1305 operations. On first use the
+# backends for an operation are checked against each other and
+# timed for a number of message size classes. The fastest backend
+# for each size class is selected and the selection is persisted
+# in a cache file keyed by the Python and NumPy versions, the CPU
+# model and the registered backends, so adding a backend causes
+# a new autotuning.
+#
+# The selection can be forced with environment variables:
+# CH20P1305_BACKEND=<name> forces the backend for all operations
+# that have it, CH20P1305_BACKEND_<OPERATION>=<name> for a single
+# operation, for example CH20P1305_BACKEND_POLY1305_MAC=bigint.
+# The environment and the selection are resolved once, on first
+# use of an operation. Call reset() after changing them.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import sys
+import json
+import time
+import platform
+import importlib
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+ENV_BACKEND = "CH20P1305_BACKEND"
+ENV_CACHE = "CH20P1305_BACKEND_CACHE"
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache",
+                             "ch20p1305", "backends.json")
+
+# Size classes as (max number of bytes, name, benchmark size).
+SIZE_CLASSES = [(256,  "small",  64),
+                (8192, "medium", 1024),
+                (None, "large",  16384)]
+
+BENCH_REPEATS = 3
+
+# Backend used for size classes missing in a persisted selection,
+# if the operation has it. Otherwise the reference is used.
+DEFAULT_BACKEND = "bigint"
+
+# Backends for each operation as name: (module, function).
+# The modules are imported when the backend is first used.
+BACKENDS = {
+    "chacha_xor": {
+        "reference": ("ch20p1305.backends", "chacha_xor_reference"),
+        "bigint":    ("ch20p1305.aead", "chacha_xor"),
+        "numpy":     ("ch20p1305.np_chacha", "chacha_xor"),
+        "swar":      ("ch20p1305.swar_chacha", "chacha_xor"),
+    },
+    "poly1305_mac": {
+        "reference": ("ch20p1305.poly1305", "poly1305_mac_general"),
+        "bigint":    ("ch20p1305.poly1305", "poly1305_mac_fast"),
+    },
+}
+
+# Selected backend per operation and size class.
+selection = {}
+cache_loaded = False
+
+# Backend functions per operation and size class, used by get().
+resolved = {}
+
+
+#-------------------------------------------------------------------
+# chacha_xor_reference()
+#
+# The list based chacha_encryption() with the chacha_xor()
+# calling convention.
+#-------------------------------------------------------------------
+def chacha_xor_reference(key, counter, nonce, data, out):
+    from .chacha import chacha_encryption
+    out[0 : len(data)] = chacha_encryption(key, counter, nonce, list(data))
+    return out
+
+
+#-------------------------------------------------------------------
+# register()
+#
+# Add a backend for the given operation.
+#-------------------------------------------------------------------
+def register(operation, name, module, function):
+    BACKENDS.setdefault(operation, {})[name] = (module, function)
+    selection.pop(operation, None)
+    resolved.pop(operation, None)
+
+
+#-------------------------------------------------------------------
+# reset()
+#
+# Forget the selection and the resolved backends. The cache file
+# and the environment are read again on next use.
+#-------------------------------------------------------------------
+def reset():
+    global cache_loaded
+    selection.clear()
+    resolved.clear()
+    cache_loaded = False
+
+
+#-------------------------------------------------------------------
+# load_backend()
+#
+# Return the function for the named backend, or None if the
+# backend can not be loaded, for example because NumPy is not
+# installed.
+#-------------------------------------------------------------------
+def load_backend(operation, name):
+    (module, function) = BACKENDS[operation][name]
+    try:
+        return getattr(importlib.import_module(module), function)
+    except ImportError:
+        return None
+
+
+#-------------------------------------------------------------------
+# available()
+#
+# Return a dict with the loadable backends for the operation.
+#-------------------------------------------------------------------
+def available(operation):
+    funcs = {}
+    for name in BACKENDS[operation]:
+        func = load_backend(operation, name)
+        if func is not None:
+            funcs[name] = func
+    return funcs
+
+
+#-------------------------------------------------------------------
+# size_class()
+#
+# Return the name of the size class for the given message length.
+#-------------------------------------------------------------------
+def size_class(num_bytes):
+    for (max_bytes, name, bench_bytes) in SIZE_CLASSES:
+        if max_bytes is None or num_bytes <= max_bytes:
+            return name
+
+
+#-------------------------------------------------------------------
+# cache_key()
+#
+# Return the key identifying the platform and the registered
+# backends in the cache file.
+#-------------------------------------------------------------------
+def cache_key():
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = "none"
+    registry = ";".join("%s=%s" % (operation, ",".join(sorted(BACKENDS[operation])))
+                        for operation in sorted(BACKENDS))
+    return "python-%s numpy-%s cpu-%s backends-%s" % (platform.python_version(),
+                                                     numpy_version, cpu_model(),
+                                                     registry)
+
+
+#-------------------------------------------------------------------
+# cpu_model()
+#
+# Return the CPU model name, as specific as can be found.
+#-------------------------------------------------------------------
+def cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+#-------------------------------------------------------------------
+# cache_path()
+#-------------------------------------------------------------------
+def cache_path():
+    return os.environ.get(ENV_CACHE, DEFAULT_CACHE)
+
+
+#-------------------------------------------------------------------
+# load_cache()
+#
+# Load the persisted selection for this platform, if any.
+#-------------------------------------------------------------------
+def load_cache():
+    global cache_loaded
+    cache_loaded = True
+    try:
+        with open(cache_path()) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return
+    for (operation, classes) in cache.get(cache_key(), {}).items():
+        if operation in BACKENDS:
+            selection[operation] = dict(classes)
+
+
+#-------------------------------------------------------------------
+# save_cache()
+#
+# Persist the current selection for this platform. Selections
+# for other platforms in the file are kept.
+#-------------------------------------------------------------------
+def save_cache():
+    path = cache_path()
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[cache_key()] = selection
+
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print("Warning: Could not save backend selection: %s" % e,
+              file=sys.stderr)
+
+
+#-------------------------------------------------------------------
+# bench_args()
+#
+# Return the arguments used to check and time a backend for the
+# given operation and message length.
+#-------------------------------------------------------------------
+def bench_args(operation, num_bytes):
+    data = bytes((i * 7) & 0xff for i in range(num_bytes))
+    if operation == "chacha_xor":
+        return lambda: (list(range(8)), 1, [0, 0x4a000000, 0], data,
+                        bytearray(num_bytes))
+    return lambda: (bytes(range(32)), data)
+
+
+#-------------------------------------------------------------------
+# autotune()
+#
+# Check and time all available backends for the operation in
+# every size class and select the fastest. Backends that do not
+# give the same result as the reference backend are ignored.
+# Returns the selection for the operation.
+#-------------------------------------------------------------------
+def autotune(operation):
+    resolved.pop(operation, None)
+    funcs = available(operation)
+    classes = {}
+    for (max_bytes, name, bench_bytes) in SIZE_CLASSES:
+        args = bench_args(operation, bench_bytes)
+        expected = bytes(funcs["reference"](*args()))
+        best = None
+        for (backend, func) in sorted(funcs.items()):
+            if bytes(func(*args())) != expected:
+                continue
+            elapsed = None
+            for i in range(BENCH_REPEATS):
+                a = args()
+                start = time.perf_counter()
+                func(*a)
+                t = time.perf_counter() - start
+                if elapsed is None or t < elapsed:
+                    elapsed = t
+            if best is None or elapsed < best[0]:
+                best = (elapsed, backend)
+        classes[name] = best[1]
+    selection[operation] = classes
+    return classes
+
+
+#-------------------------------------------------------------------
+# forced_backend()
+#
+# Return the backend forced by the environment for the operation,
+# or None.
+#-------------------------------------------------------------------
+def forced_backend(operation):
+    name = os.environ.get("%s_%s" % (ENV_BACKEND, operation.upper()))
+    if name is None:
+        name = os.environ.get(ENV_BACKEND)
+        if name not in BACKENDS[operation]:
+            return None
+    if name not in BACKENDS[operation]:
+        raise ValueError("Unknown backend %s for %s." % (name, operation))
+    return name
+
+
+#-------------------------------------------------------------------
+# default_backend()
+#
+# Return the backend used when the selection has none for a
+# size class.
+#-------------------------------------------------------------------
+def default_backend(operation):
+    if DEFAULT_BACKEND in BACKENDS[operation]:
+        return DEFAULT_BACKEND
+    return "reference"
+
+
+#-------------------------------------------------------------------
+# select()
+#
+# Return the name of the backend to use for the operation and
+# message length. Runs and persists the autotuning on first use.
+# A size class missing in the selection, for example from a
+# partial or older cache file, uses the default backend.
+#-------------------------------------------------------------------
+def select(operation, num_bytes):
+    name = forced_backend(operation)
+    if name is not None:
+        return name
+
+    if not cache_loaded:
+        load_cache()
+    if operation not in selection:
+        autotune(operation)
+        save_cache()
+    name = selection[operation].get(size_class(num_bytes))
+    if name not in BACKENDS[operation]:
+        return default_backend(operation)
+    return name
+
+
+#-------------------------------------------------------------------
+# get()
+#
+# Return the backend function to use for the operation and
+# message length. The backends are resolved and loaded on first
+# use of the operation.
+#-------------------------------------------------------------------
+def get(operation, num_bytes):
+    funcs = resolved.get(operation)
+    if funcs is None:
+        funcs = load_classes(operation, resolve(operation))
+        resolved[operation] = funcs
+    return funcs[size_class(num_bytes)]
+
+
+#-------------------------------------------------------------------
+# resolve()
+#
+# Return the backend names for the operation per size class,
+# running the autotuning now if needed. With a forced backend
+# all size classes use it.
+#-------------------------------------------------------------------
+def resolve(operation):
+    name = forced_backend(operation)
+    if name is not None:
+        return {cls: name for (max_bytes, cls, bench_bytes) in SIZE_CLASSES}
+    return {cls: select(operation, bench_bytes)
+            for (max_bytes, cls, bench_bytes) in SIZE_CLASSES}
+
+
+#-------------------------------------------------------------------
+# load_classes()
+#
+# Load the backends given by classes, as returned by resolve().
+# Returns a dict with the function per size class.
+#-------------------------------------------------------------------
+def load_classes(operation, classes):
+    funcs = {}
+    for name in set(classes.values()):
+        func = load_backend(operation, name)
+        if func is None:
+            raise ImportError("Backend %s for %s can not be loaded." %
+                              (name, operation))
+        funcs[name] = func
+    return {cls: funcs[name] for (cls, name) in classes.items()}
+
+
+#-------------------------------------------------------------------
+# dispatch()
+#
+# Return a function for the operation that calls the backend
+# given by classes, as returned by resolve(), for the size class
+# of the message. No autotuning is done, so the function can be
+# used in worker processes with a selection made by the parent.
+#-------------------------------------------------------------------
+def dispatch(operation, classes):
+    by_class = load_classes(operation, classes)
+    if len(set(by_class.values())) == 1:
+        return next(iter(by_class.values()))
+
+    if operation == "chacha_xor":
+        return lambda key, counter, nonce, data, out: \
+            by_class[size_class(len(data))](key, counter, nonce, data, out)
+    return lambda key, message: by_class[size_class(len(message))](key, message)
+
+
+#-------------------------------------------------------------------
+# chacha_xor()
+#
+# Encipher data into out with the selected keystream backend.
+#-------------------------------------------------------------------
+def chacha_xor(key, counter, nonce, data, out):
+    return get("chacha_xor", len(data))(key, counter, nonce, data, out)
+
+
+#-------------------------------------------------------------------
+# poly1305_mac()
+#
+# Calculate the Poly1305 tag with the selected backend.
+#-------------------------------------------------------------------
+def poly1305_mac(key, message):
+    return get("poly1305_mac", len(message))(key, message)
+
+#=======================================================================
+# EOF backends.py
+#=======================================================================
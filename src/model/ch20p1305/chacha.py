@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# chacha.py
+# ---------
+# The ChaCha20 block function and stream cipher as specified in
+# RFC 7539 (https://tools.ietf.org/html/rfc7539).
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+from .utils import rotl, w32bl
+from . import metrics
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+NUM_DOUBLEROUNDS = 10
+
+# Nonce lengths in words selecting the state layout.
+IETF_NONCE_WORDS = 3
+DJB_NONCE_WORDS = 2
+
+
+#-------------------------------------------------------------------
+# qr()
+#
+# The ChaCha qr function.
+#-------------------------------------------------------------------
+def qr(a, b, c, d):
+    a0 = (a + b) & 0xffffffff
+    d0 = d ^ a0
+    d1 = rotl(d0, 16)
+    c0 = (c + d1) & 0xffffffff
+    b0 = b ^ c0
+    b1 = rotl(b0, 12)
+    a1 = (a0 + b1) & 0xffffffff
+    d2 = d1 ^ a1
+    d3 = rotl(d2, 8)
+    c1 = (c0 + d3) & 0xffffffff
+    b2 = b1 ^ c1
+    b3 = rotl(b2, 7)
+    return (a1, b3, c1, d3)
+
+
+#-------------------------------------------------------------------
+# quarterround()
+#
+# Update the given state by applying the qr function on the
+# given elements in the state.
+#-------------------------------------------------------------------
+def quarterround(state, ai, bi, ci, di):
+    (ap, bp, cp, dp) = qr(state[ai], state[bi], state[ci], state[di])
+    state[ai] = ap
+    state[bi] = bp
+    state[ci] = cp
+    state[di] = dp
+    return state
+
+
+#-------------------------------------------------------------------
+# doubleround()
+#
+# Perform the ChaCha doubleround on the given state by applying
+# eigth specific quarterrounds.
+#-------------------------------------------------------------------
+def doubleround(state):
+    quarterround(state, 0, 4, 8,12)
+    quarterround(state, 1, 5, 9,13)
+    quarterround(state, 2, 6,10,14)
+    quarterround(state, 3, 7,11,15)
+    quarterround(state, 0, 5,10,15)
+    quarterround(state, 1, 6,11,12)
+    quarterround(state, 2, 7, 8,13)
+    quarterround(state, 3, 4, 9,14)
+    return state
+
+
+#-------------------------------------------------------------------
+# counter_nonce_words()
+#
+# The last four words of the state. The layout is selected by
+# the length of the nonce. A nonce of three words gives the
+# RFC 7539 layout with a 32 bit counter and 96 bit nonce. A
+# nonce of two words gives the original layout by Bernstein
+# with a 64 bit counter and 64 bit nonce, the counter carries
+# into word 13 when the low word wraps.
+#-------------------------------------------------------------------
+def counter_nonce_words(counter, nonce):
+    if len(nonce) == DJB_NONCE_WORDS:
+        return [counter & 0xffffffff, (counter >> 32) & 0xffffffff,
+                nonce[0], nonce[1]]
+    return [counter & 0xffffffff, nonce[0], nonce[1], nonce[2]]
+
+
+#-------------------------------------------------------------------
+# check_counter()
+#
+# Raise ValueError if num_blocks blocks starting at counter do
+# not fit in the counter of the layout given by the nonce. A 32
+# bit counter must not wrap back to the block used for the
+# Poly1305 one time key.
+#-------------------------------------------------------------------
+def check_counter(counter, nonce, num_blocks=1):
+    counter_bits = 64 if len(nonce) == DJB_NONCE_WORDS else 32
+    if counter < 0 or counter + num_blocks > 2**counter_bits:
+        raise ValueError("Block counter beyond the %d bit counter." % counter_bits)
+
+
+#-------------------------------------------------------------------
+# chacha_block()
+#
+# The chacha block function. Given a 256 bit key, 32 bit counter
+# and 96 bit nonce will create a state and then update the state
+# for 10 doublerounds. Finally the finalized state is returned
+# as a sequence of bytes. With a 64 bit nonce the counter is
+# 64 bits, see counter_nonce_words(). Raises ValueError if the
+# counter does not fit.
+#
+# This code follows the pseudo code in 2.3.1 in RFC 7539.
+#-------------------------------------------------------------------
+def chacha_block(key, counter, nonce):
+    state = [0x61707865, 0x3320646e, 0x79622d32, 0x6b206574,
+                 key[0],     key[1],     key[2],     key[3],
+                 key[4],     key[5],     key[6],     key[7]]
+    check_counter(counter, nonce)
+    state += counter_nonce_words(counter, nonce)
+
+    if metrics.ENABLED:
+        metrics.count("chacha_blocks")
+
+    working_state = state[:]
+    for i in range(NUM_DOUBLEROUNDS):
+        working_state = doubleround(working_state)
+
+    for i in range(len(state)):
+        state[i] = (state[i] + working_state[i]) & 0xffffffff
+    return state
+
+
+#-------------------------------------------------------------------
+# hchacha20()
+#
+# The HChaCha20 subkey derivation used by XChaCha20. The state
+# is set up as for chacha_block(), but with a 128 bit nonce in
+# place of the counter and nonce. After the doublerounds the
+# first and last rows of the state, without the final addition,
+# are returned as the eight words of the subkey.
+#-------------------------------------------------------------------
+def hchacha20(key, nonce):
+    state = [0x61707865, 0x3320646e, 0x79622d32, 0x6b206574,
+                 key[0],     key[1],     key[2],     key[3],
+                 key[4],     key[5],     key[6],     key[7],
+               nonce[0],   nonce[1],   nonce[2],   nonce[3]]
+
+    for i in range(NUM_DOUBLEROUNDS):
+        state = doubleround(state)
+    return state[0:4] + state[12:16]
+
+
+#-------------------------------------------------------------------
+# chacha_encryption()
+#
+# Given key, initial counter value and nonce will encipher
+# the given plaintext with a generated chacha keystream.
+#-------------------------------------------------------------------
+def chacha_encryption(key, counter, nonce, plaintext):
+    num_blocks = int(len(plaintext) / 64)
+    if (len(plaintext) % 64):
+        num_blocks += 1
+
+    keystream = []
+    for b in range(num_blocks):
+        block = chacha_block(key, counter, nonce)
+        block_bytes = w32bl(block)
+        keystream += block_bytes
+        counter += 1
+
+    ciphertext = []
+    for i in range(len(plaintext)):
+        ciphertext.append(plaintext[i] ^ keystream[i])
+
+    return ciphertext
+
+
+#=======================================================================
+# EOF chacha.py
+#=======================================================================
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# compare.py
+# ----------
+# Bulk comparison of results against expected values for tests
+# of large vectors. Buffers are compared in chunks with C level
+# equality, and only the chunks that differ are searched for the
+# mismatching bytes, using NumPy when available. The result is
+# returned as a dict, and the report only includes bounded
+# hexdump windows around the first differences.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+from .utils import byteview
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Bytes compared per equality check when scanning for differences.
+CHUNK_SIZE = 65536
+
+# Below this size a differing chunk is searched byte by byte.
+SCAN_SIZE = 64
+
+# Bytes per hexdump line.
+LINE_BYTES = 16
+
+
+#-------------------------------------------------------------------
+# load_numpy()
+#
+# Return the NumPy module or None if NumPy is not available.
+#-------------------------------------------------------------------
+def load_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+#-------------------------------------------------------------------
+# scan_ranges()
+#
+# Append the mismatching ranges of a and b from offset base
+# to ranges. Equal halves are skipped using C level equality,
+# so only the neighbourhood of differences is scanned per byte.
+#-------------------------------------------------------------------
+def scan_ranges(a, b, base, ranges):
+    if a == b:
+        return
+    if len(a) > SCAN_SIZE:
+        half = len(a) // 2
+        scan_ranges(a[0 : half], b[0 : half], base, ranges)
+        scan_ranges(a[half:], b[half:], base + half, ranges)
+        return
+    for i in range(len(a)):
+        if a[i] != b[i]:
+            add_range(ranges, base + i, base + i + 1)
+
+
+#-------------------------------------------------------------------
+# numpy_ranges()
+#
+# Append the mismatching ranges of a and b from offset base to
+# ranges using NumPy.
+#-------------------------------------------------------------------
+def numpy_ranges(np, a, b, base, ranges):
+    diff = np.flatnonzero(np.frombuffer(a, dtype=np.uint8) !=
+                          np.frombuffer(b, dtype=np.uint8))
+    if len(diff) == 0:
+        return
+    breaks = np.flatnonzero(np.diff(diff) != 1)
+    starts = np.concatenate(([diff[0]], diff[breaks + 1]))
+    ends = np.concatenate((diff[breaks], [diff[-1]])) + 1
+    for (start, end) in zip(starts.tolist(), ends.tolist()):
+        add_range(ranges, base + start, base + end)
+
+
+#-------------------------------------------------------------------
+# add_range()
+#
+# Append the range [start, end) to ranges, merging it with the
+# last range if they are adjacent.
+#-------------------------------------------------------------------
+def add_range(ranges, start, end):
+    if ranges and ranges[-1][1] == start:
+        ranges[-1] = (ranges[-1][0], end)
+    else:
+        ranges.append((start, end))
+
+
+#-------------------------------------------------------------------
+# compare_buffers()
+#
+# Compare data with the expected data. Both can be bytes-like
+# objects or lists of bytes. Returns a dict with:
+#
+# equal:           True if the data matches the expected data.
+# length:          Length of the data.
+# expected_length: Length of the expected data.
+# first:           Offset of the first difference or None.
+# ranges:          List of (start, end) mismatching byte ranges.
+#                  Bytes beyond the shorter buffer are a range.
+# mismatches:      Number of mismatching bytes in the ranges.
+#
+# use_numpy selects the NumPy search of differing chunks, None
+# uses NumPy if it is available.
+#-------------------------------------------------------------------
+def compare_buffers(data, expected, use_numpy=None):
+    a = byteview(data)
+    b = byteview(expected)
+    common = min(len(a), len(b))
+
+    np = None
+    if use_numpy or use_numpy is None:
+        np = load_numpy()
+        if np is None and use_numpy:
+            raise ImportError("NumPy is not available.")
+
+    ranges = []
+    for i in range(0, common, CHUNK_SIZE):
+        end = min(common, i + CHUNK_SIZE)
+        (ca, cb) = (a[i : end], b[i : end])
+        if ca == cb:
+            continue
+        if np is not None:
+            numpy_ranges(np, ca, cb, i, ranges)
+        else:
+            scan_ranges(ca, cb, i, ranges)
+    if len(a) != len(b):
+        add_range(ranges, common, max(len(a), len(b)))
+
+    return {"equal": not ranges,
+            "length": len(a),
+            "expected_length": len(b),
+            "first": ranges[0][0] if ranges else None,
+            "ranges": ranges,
+            "mismatches": sum(end - start for (start, end) in ranges)}
+
+
+#-------------------------------------------------------------------
+# first_mismatch()
+#
+# Return the offset of the first byte where data and expected
+# differ, or None if they are equal. Bytes beyond the shorter
+# buffer differ. Stops at the first differing chunk, which is
+# halved with C level equality down to SCAN_SIZE bytes. The
+# chunks are compared as bytes, which is a memcmp, instead of
+# item by item as memoryviews.
+#-------------------------------------------------------------------
+def first_mismatch(data, expected):
+    a = byteview(data)
+    b = byteview(expected)
+    common = min(len(a), len(b))
+    for i in range(0, common, CHUNK_SIZE):
+        end = min(common, i + CHUNK_SIZE)
+        (ca, cb) = (a[i : end], b[i : end])
+        if ca.tobytes() == cb.tobytes():
+            continue
+        while len(ca) > SCAN_SIZE:
+            half = len(ca) // 2
+            if ca[0 : half] != cb[0 : half]:
+                (ca, cb) = (ca[0 : half], cb[0 : half])
+            else:
+                (ca, cb) = (ca[half:], cb[half:])
+                i += half
+        for j in range(len(ca)):
+            if ca[j] != cb[j]:
+                return i + j
+    if len(a) != len(b):
+        return common
+    return None
+
+
+#-------------------------------------------------------------------
+# hexdump_window()
+#
+# Return the hexdump lines of data and expected around the range
+# [start, end), with context bytes before and after, limited to
+# max_bytes. A window limited by max_bytes starts at most half of
+# max_bytes before start, rounded down to a line, but never so
+# far back that start is outside the window. The difference is
+# always shown.
+# Each line shows the offset, the data, the expected
+# data and a marker under the differing bytes.
+#-------------------------------------------------------------------
+def hexdump_window(data, expected, start, end, context=LINE_BYTES,
+                   max_bytes=4 * LINE_BYTES):
+    a = byteview(data)
+    b = byteview(expected)
+    first = max(0, start - context, start - max_bytes // 2)
+    first = first // LINE_BYTES * LINE_BYTES
+    first = max(first, start + 1 - max_bytes)
+    last = min(max(len(a), len(b)), end + context, first + max_bytes)
+
+    def hexline(view, pos):
+        line = view[pos : min(pos + LINE_BYTES, last)]
+        return " ".join("%02x" % x for x in line)
+
+    lines = []
+    for pos in range(first, last, LINE_BYTES):
+        marks = ""
+        for i in range(pos, min(pos + LINE_BYTES, last)):
+            same = i < len(a) and i < len(b) and a[i] == b[i]
+            marks += "   " if same else "^^ "
+        lines.append(("%08x  data:     %s" % (pos, hexline(a, pos))).rstrip())
+        lines.append(("          expected: %s" % hexline(b, pos)).rstrip())
+        if marks.strip():
+            lines.append("                    %s" % marks.rstrip())
+    return lines
+
+
+#-------------------------------------------------------------------
+# format_report()
+#
+# Return a text report of the given comparison result with
+# hexdump windows around at most max_windows mismatching ranges.
+#-------------------------------------------------------------------
+def format_report(result, data, expected, max_windows=4, context=LINE_BYTES,
+                  max_bytes=4 * LINE_BYTES):
+    if result["equal"]:
+        return "Data is correct, %d bytes." % result["length"]
+
+    lines = []
+    if result["length"] != result["expected_length"]:
+        lines.append("Length %d does not match expected length %d." %
+                     (result["length"], result["expected_length"]))
+    lines.append("%d mismatching bytes in %d ranges, first at offset %d." %
+                 (result["mismatches"], len(result["ranges"]), result["first"]))
+    for (start, end) in result["ranges"][0 : max_windows]:
+        lines.append("Range 0x%08x - 0x%08x:" % (start, end))
+        lines += hexdump_window(data, expected, start, end, context, max_bytes)
+    if len(result["ranges"]) > max_windows:
+        lines.append("%d more ranges not shown." %
+                     (len(result["ranges"]) - max_windows))
+    return "\n".join(lines)
+
+#=======================================================================
+# EOF compare.py
+#=======================================================================
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# drbg.py
+# -------
+# Deterministic random byte generator built on the ChaCha20
+# keystream. The seed is hashed into the key, and the nonce
+# holds a 64 bit stream index and a 32 bit reseed generation.
+# The output is the keystream of the stream starting at block
+# counter zero, generated in large buffers.
+#
+# Independent streams for parallel workers are made either by
+# giving each worker its own stream index (nonce partitioning),
+# or by splitting the counter range of one stream (counter
+# partitioning). If the process forks, the child reseeds with
+# fresh entropy so it does not repeat the output of the parent.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import copy
+import hashlib
+from .utils import l2lw32
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Default buffer size in bytes, must be a multiple of 64.
+BUFFER_SIZE = 65536
+
+# Number of blocks in a stream with a 32 bit block counter.
+STREAM_BLOCKS = 2**32
+
+MAX_STREAM = 2**64 - 1
+
+
+#-------------------------------------------------------------------
+# StreamExhaustedError
+#
+# Raised when a generator has used all blocks in its counter
+# range.
+#-------------------------------------------------------------------
+class StreamExhaustedError(Exception):
+    pass
+
+
+#-------------------------------------------------------------------
+# load_keystream()
+#
+# Return the keystream function used to fill the buffer, the
+# NumPy backend if it can be loaded, otherwise the SWAR core.
+#-------------------------------------------------------------------
+def load_keystream():
+    try:
+        from .np_chacha import keystream
+        return keystream
+    except ImportError:
+        from .swar_chacha import keystream
+        return keystream
+
+
+#-------------------------------------------------------------------
+# seed_key()
+#
+# Derive the 32 byte key from a seed given as bytes or as a
+# non negative integer.
+#-------------------------------------------------------------------
+def seed_key(seed):
+    if isinstance(seed, int):
+        seed = seed.to_bytes((seed.bit_length() + 7) // 8 or 1, "little")
+    return hashlib.sha256(b"ch20p1305 drbg" + bytes(seed)).digest()
+
+
+#-------------------------------------------------------------------
+# ChaChaDRBG
+#
+# Given a seed, generates the same bytes in the same order no
+# matter how the output is requested. Without a seed the
+# generator is seeded from os.urandom().
+#
+# stream selects the stream index in the nonce. first_block and
+# end_block limit the counter range used.
+#
+# fill() writes into a preallocated buffer, tell() and jump()
+# give and move the position in the stream. substream() returns
+# a generator for another stream index with the same key, and
+# split() divides the counter range of this generator into
+# equally large parts, each starting at its first block.
+#-------------------------------------------------------------------
+class ChaChaDRBG:
+    def __init__(self, seed=None, stream=0, buffer_size=BUFFER_SIZE,
+                 first_block=0, end_block=STREAM_BLOCKS):
+        if buffer_size <= 0 or buffer_size % 64:
+            raise ValueError("Buffer size must be a positive multiple of 64.")
+        if not 0 <= stream <= MAX_STREAM:
+            raise ValueError("Stream index must fit in 64 bits.")
+        if not 0 <= first_block <= end_block <= STREAM_BLOCKS:
+            raise ValueError("Incorrect counter range.")
+
+        self.buffer_size = buffer_size
+        self.stream = stream
+        self.first_block = first_block
+        self.end_block = end_block
+        self.keystream = load_keystream()
+        if seed is None:
+            seed = os.urandom(32)
+        self.seed(seed)
+
+
+    def seed(self, seed):
+        self.key = seed_key(seed)
+        self.generation = 0
+        self.restart()
+
+
+    def reseed(self, additional=None):
+        if additional is None:
+            additional = os.urandom(32)
+        self.key = hashlib.sha256(self.key + bytes(additional)).digest()
+        self.generation = (self.generation + 1) & 0xffffffff
+        self.restart()
+
+
+    def restart(self):
+        self.key_words = l2lw32(list(self.key))
+        self.nonce_words = [self.stream & 0xffffffff, self.stream >> 32,
+                            self.generation]
+        self.block = self.first_block
+        self.buffer = b""
+        self.pos = 0
+        self.pid = os.getpid()
+
+
+    def check_fork(self):
+        if os.getpid() != self.pid:
+            self.reseed()
+
+
+    def generate(self, num_blocks):
+        if self.block + num_blocks > self.end_block:
+            raise StreamExhaustedError("Counter range of the generator exhausted.")
+        data = self.keystream(self.key_words, self.block, self.nonce_words,
+                              num_blocks * 64)
+        self.block += num_blocks
+        return data
+
+
+    def refill(self):
+        num_blocks = min(self.buffer_size // 64, self.end_block - self.block)
+        self.buffer = self.generate(max(num_blocks, 1))
+        self.pos = 0
+
+
+    def fill(self, buffer):
+        self.check_fork()
+        out = memoryview(buffer).cast("B")
+        done = 0
+
+        # Use the buffered bytes first.
+        n = min(len(out), len(self.buffer) - self.pos)
+        out[0 : n] = self.buffer[self.pos : self.pos + n]
+        self.pos += n
+        done = n
+
+        # Then whole blocks directly into the output, a buffer at a time.
+        while len(out) - done >= 64:
+            num_blocks = min((len(out) - done) // 64, self.buffer_size // 64)
+            out[done : done + num_blocks * 64] = self.generate(num_blocks)
+            done += num_blocks * 64
+
+        if done < len(out):
+            self.refill()
+            n = len(out) - done
+            out[done:] = self.buffer[0 : n]
+            self.pos = n
+        return buffer
+
+
+    def random_bytes(self, num_bytes):
+        return bytes(self.fill(bytearray(num_bytes)))
+
+
+    def tell(self):
+        return (self.block - self.first_block) * 64 - len(self.buffer) + self.pos
+
+
+    def jump(self, num_blocks):
+        self.check_fork()
+        position = self.tell() + num_blocks * 64
+        self.block = self.first_block + position // 64
+        self.buffer = b""
+        self.pos = 0
+        if position % 64:
+            self.refill()
+            self.pos = position % 64
+        return self
+
+
+    def derive(self, stream, first_block, end_block):
+        child = copy.copy(self)
+        child.stream = stream
+        child.first_block = first_block
+        child.end_block = end_block
+        child.restart()
+        return child
+
+
+    def substream(self, stream):
+        if not 0 <= stream <= MAX_STREAM:
+            raise ValueError("Stream index must fit in 64 bits.")
+        return self.derive(stream, 0, STREAM_BLOCKS)
+
+
+    def split(self, num_parts):
+        size = (self.end_block - self.first_block) // num_parts
+        return [self.derive(self.stream, self.first_block + i * size,
+                            self.first_block + (i + 1) * size)
+                for i in range(num_parts)]
+
+#=======================================================================
+# EOF drbg.py
+#=======================================================================
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# host_driver.py
+# --------------
+# Host driver model for the register interface of the
+# chacha20_poly1305 top level in src/rtl/chacha20_poly1305.v.
+# The driver talks to a simulated bus with a functional model of
+# the core behind it, and the bus counts the transactions.
+#
+# The driver can shadow the key, nonce, config and data registers
+# and skip writes of words that already hold the value, and can
+# write and read the data registers as bursts. report() compares
+# the bus transactions per byte with and without these
+# optimizations for a number of packet size mixes.
+#
+# Words are written in the order of the ChaCha state, word i of
+# the key, nonce and data block is little endian word i of the
+# bytes. The top level has no AAD or length registers, so the
+# interface can only carry messages of whole 64 byte blocks with
+# an empty AAD. The driver refuses other messages, and the tag
+# is then equal to the RFC 7539 tag.
+#
+# Usage: python3 -m ch20p1305.host_driver
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import struct
+import random
+
+from .utils import l2lw32
+from .chacha import chacha_block
+from .poly1305 import Poly1305
+from .aead import poly1305_key_gen
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Register map, from src/rtl/chacha20_poly1305.v.
+ADDR_NAME0        = 0x00
+ADDR_NAME1        = 0x01
+ADDR_VERSION      = 0x02
+
+ADDR_CTRL         = 0x08
+CTRL_INIT_BIT     = 0
+CTRL_NEXT_BIT     = 1
+CTRL_DONE_BIT     = 2
+
+ADDR_STATUS       = 0x09
+STATUS_READY_BIT  = 0
+STATUS_VALID_BIT  = 1
+STATUS_TAG_OK_BIT = 2
+
+ADDR_CONFIG       = 0x0a
+CONFIG_ENCDEC_BIT = 0
+
+ADDR_KEY0         = 0x10
+ADDR_KEY7         = 0x17
+
+ADDR_NONCE0       = 0x20
+ADDR_NONCE2       = 0x22
+
+ADDR_DATA0        = 0x30
+ADDR_DATA15       = 0x3f
+
+ADDR_TAG0         = 0x40
+ADDR_TAG3         = 0x43
+
+CORE_NAME0        = 0x63323070
+CORE_NAME1        = 0x31333035
+CORE_VERSION      = 0x302e3031
+
+# Packet size mixes as (size, weight) pairs.
+PACKET_MIXES = {
+    "imix":  [(40, 7), (576, 4), (1500, 1)],
+    "voip":  [(200, 1)],
+    "dns":   [(64, 3), (512, 1)],
+    "mtu":   [(1500, 1)],
+    "tls":   [(16384, 1)],
+}
+
+
+#-------------------------------------------------------------------
+# DeviceModel
+#
+# Functional model of the core behind the register interface.
+# After a control pulse the device reports busy for busy_polls
+# status reads.
+#
+# The interface has no AAD or length registers. Every next
+# pulse processes and MACs a full 64 byte block, and the length
+# block in done() has an empty AAD and the number of blocks
+# times 64. The tag is only correct for messages of whole blocks
+# with no AAD.
+#-------------------------------------------------------------------
+class DeviceModel:
+    def __init__(self, busy_polls=1):
+        self.busy_polls = busy_polls
+        self.key = [0] * 8
+        self.nonce = [0] * 3
+        self.data = [0] * 16
+        self.data_out = [0] * 16
+        self.tag = [0] * 4
+        self.encdec = 0
+        self.ready = 1
+        self.valid = 0
+        self.busy = 0
+        self.mac = None
+        self.counter = 1
+        self.num_bytes = 0
+
+
+    def write(self, address, value):
+        if address == ADDR_CTRL:
+            if value & (1 << CTRL_INIT_BIT):
+                self.init()
+            elif value & (1 << CTRL_NEXT_BIT):
+                self.next()
+            elif value & (1 << CTRL_DONE_BIT):
+                self.done()
+        elif address == ADDR_CONFIG:
+            self.encdec = value & (1 << CONFIG_ENCDEC_BIT)
+        elif ADDR_KEY0 <= address <= ADDR_KEY7:
+            self.key[address - ADDR_KEY0] = value
+        elif ADDR_NONCE0 <= address <= ADDR_NONCE2:
+            self.nonce[address - ADDR_NONCE0] = value
+        elif ADDR_DATA0 <= address <= ADDR_DATA15:
+            self.data[address - ADDR_DATA0] = value
+
+
+    def read(self, address):
+        if address == ADDR_NAME0:
+            return CORE_NAME0
+        if address == ADDR_NAME1:
+            return CORE_NAME1
+        if address == ADDR_VERSION:
+            return CORE_VERSION
+        if address == ADDR_STATUS:
+            if self.busy:
+                self.busy -= 1
+                return 0
+            return ((self.ready << STATUS_READY_BIT) |
+                    (self.valid << STATUS_VALID_BIT))
+        if address == ADDR_CONFIG:
+            return self.encdec
+        if ADDR_KEY0 <= address <= ADDR_KEY7:
+            return self.key[address - ADDR_KEY0]
+        if ADDR_NONCE0 <= address <= ADDR_NONCE2:
+            return self.nonce[address - ADDR_NONCE0]
+        if ADDR_DATA0 <= address <= ADDR_DATA15:
+            return self.data_out[address - ADDR_DATA0]
+        if ADDR_TAG0 <= address <= ADDR_TAG3:
+            return self.tag[address - ADDR_TAG0]
+        return 0
+
+
+    def init(self):
+        self.mac = Poly1305(poly1305_key_gen(self.key, self.nonce))
+        self.counter = 1
+        self.num_bytes = 0
+        self.valid = 0
+        self.busy = self.busy_polls
+
+
+    def next(self):
+        block = chacha_block(self.key, self.counter, self.nonce)
+        self.data_out = [d ^ k for (d, k) in zip(self.data, block)]
+        ciphertext = self.data_out if self.encdec else self.data
+        self.mac.update(struct.pack("<16I", *ciphertext))
+        self.counter += 1
+        self.num_bytes += 64
+        self.valid = 1
+        self.busy = self.busy_polls
+
+
+    def done(self):
+        self.mac.update(struct.pack("<QQ", 0, self.num_bytes))
+        self.tag = l2lw32(self.mac.finalize())
+        self.valid = 1
+        self.busy = self.busy_polls
+
+
+#-------------------------------------------------------------------
+# SimulatedBus
+#
+# Local bus in front of the device. Every single access and
+# every burst is one transaction, beats counts the words moved.
+#-------------------------------------------------------------------
+class SimulatedBus:
+    def __init__(self, device):
+        self.device = device
+        self.reset_counters()
+
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+        self.beats = 0
+
+
+    def transactions(self):
+        return self.reads + self.writes
+
+
+    def write(self, address, value):
+        self.writes += 1
+        self.beats += 1
+        self.device.write(address, value)
+
+
+    def read(self, address):
+        self.reads += 1
+        self.beats += 1
+        return self.device.read(address)
+
+
+    def write_burst(self, address, values):
+        self.writes += 1
+        self.beats += len(values)
+        for (i, value) in enumerate(values):
+            self.device.write(address + i, value)
+
+
+    def read_burst(self, address, num_words):
+        self.reads += 1
+        self.beats += num_words
+        return [self.device.read(address + i) for i in range(num_words)]
+
+
+#-------------------------------------------------------------------
+# HostDriver
+#
+# Driver for the core. With shadow set, the last written key,
+# nonce, config and data words are kept and unchanged words are
+# not written again. With burst set, runs of data words are
+# written and read as bursts. Messages that are not a multiple
+# of 64 bytes raise ValueError, since the device can not be told
+# the length of a partial last block.
+#-------------------------------------------------------------------
+class HostDriver:
+    def __init__(self, bus, shadow=True, burst=True):
+        self.bus = bus
+        self.shadow = shadow
+        self.burst = burst
+        self.registers = {}
+        self.messages = 0
+
+
+    def write_words(self, address, words):
+        run = []
+        for (i, word) in enumerate(words):
+            if self.shadow and self.registers.get(address + i) == word:
+                self.flush(run)
+                run = []
+                continue
+            self.registers[address + i] = word
+            run.append((address + i, word))
+        self.flush(run)
+
+
+    def flush(self, run):
+        if not run:
+            return
+        if self.burst:
+            self.bus.write_burst(run[0][0], [word for (address, word) in run])
+        else:
+            for (address, word) in run:
+                self.bus.write(address, word)
+
+
+    def read_words(self, address, num_words):
+        if self.burst:
+            return self.bus.read_burst(address, num_words)
+        return [self.bus.read(address + i) for i in range(num_words)]
+
+
+    def wait_status(self, bit):
+        while not (self.bus.read(ADDR_STATUS) >> bit) & 1:
+            pass
+
+
+    def pulse(self, bit, status_bit):
+        self.bus.write(ADDR_CTRL, 1 << bit)
+        self.wait_status(status_bit)
+
+
+    def process(self, key, nonce, data, encdec):
+        data = bytes(data)
+        if len(data) % 64:
+            raise ValueError("Message length must be a multiple of 64 bytes.")
+        self.write_words(ADDR_KEY0, l2lw32(list(bytes(key))))
+        self.write_words(ADDR_NONCE0, l2lw32(list(bytes(nonce))))
+        self.write_words(ADDR_CONFIG, [encdec])
+        self.pulse(CTRL_INIT_BIT, STATUS_READY_BIT)
+
+        out = bytearray()
+        for pos in range(0, len(data), 64):
+            words = list(struct.unpack_from("<16I", data, pos))
+            self.write_words(ADDR_DATA0, words)
+            self.pulse(CTRL_NEXT_BIT, STATUS_VALID_BIT)
+            out += struct.pack("<16I", *self.read_words(ADDR_DATA0, 16))
+
+        self.pulse(CTRL_DONE_BIT, STATUS_VALID_BIT)
+        tag = struct.pack("<4I", *self.read_words(ADDR_TAG0, 4))
+        self.messages += 1
+        return (bytes(out), tag)
+
+
+    def seal(self, key, nonce, plaintext):
+        return self.process(key, nonce, plaintext, 1)
+
+
+    def open(self, key, nonce, ciphertext):
+        return self.process(key, nonce, ciphertext, 0)
+
+
+#-------------------------------------------------------------------
+# packet_sizes()
+#
+# Return num_packets sizes drawn from the given mix.
+#-------------------------------------------------------------------
+def packet_sizes(mix, num_packets, seed=1):
+    rng = random.Random(seed)
+    sizes = [size for (size, weight) in mix]
+    weights = [weight for (size, weight) in mix]
+    return rng.choices(sizes, weights, k=num_packets)
+
+
+#-------------------------------------------------------------------
+# measure()
+#
+# Seal random packets with one key and sequential nonces as a
+# record layer does. The packets are padded to whole blocks, as
+# the device requires. Returns the bus transactions, beats and
+# packet bytes sealed.
+#-------------------------------------------------------------------
+def measure(sizes, shadow, burst, busy_polls=1):
+    rng = random.Random(len(sizes))
+    bus = SimulatedBus(DeviceModel(busy_polls))
+    driver = HostDriver(bus, shadow, burst)
+    key = bytes(range(32))
+    for (seq, size) in enumerate(sizes):
+        nonce = bytes(4) + seq.to_bytes(8, "little")
+        driver.seal(key, nonce, rng.randbytes((size + 63) // 64 * 64))
+    return (bus.transactions(), bus.beats, sum(sizes))
+
+
+#-------------------------------------------------------------------
+# report()
+#
+# Print the bus transactions per byte and per message for the
+# packet mixes, for the plain driver and with write shadowing
+# and bursts.
+#-------------------------------------------------------------------
+def report(mixes=PACKET_MIXES, num_packets=200):
+    print("%-6s %-16s %12s %10s %10s" %
+          ("mix", "driver", "trans/msg", "trans/B", "beats/B"))
+    modes = [("plain", False, False), ("shadow", True, False),
+             ("shadow+burst", True, True)]
+    for (name, mix) in mixes.items():
+        sizes = packet_sizes(mix, num_packets)
+        for (mode, shadow, burst) in modes:
+            (transactions, beats, num_bytes) = measure(sizes, shadow, burst)
+            print("%-6s %-16s %12.1f %10.3f %10.3f" %
+                  (name, mode, transactions / len(sizes),
+                   transactions / num_bytes, beats / num_bytes))
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main():
+    report()
+    return 0
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF host_driver.py
+#=======================================================================
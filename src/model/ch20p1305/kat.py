@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# kat.py
+# ------
+# Known answer test runner. Reads test vector files in the
+# Wycheproof JSON layout (testGroups with lists of tests, hex
+# encoded fields) or as JSON lines with one vector per line.
+# The files are parsed incrementally, so they are never loaded
+# whole. The vectors are checked in a process pool against a
+# selected backend, and a machine readable report with pass/fail
+# and timing per vector is generated.
+#
+# The vector type is given by the fields in the vector:
+# key, iv, aad, msg, ct, tag:  ChaCha20-Poly1305 AEAD.
+# key, msg, tag:               Poly1305.
+# key, iv, msg, ct, counter:   ChaCha20. counter defaults to 0.
+#
+# Usage: python3 -m ch20p1305.kat [--backend NAME] [--workers N]
+#                                 [--report FILE] FILE...
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import collections
+import concurrent.futures
+
+from .utils import l2lw32
+from .aead import poly1305_key_gen, aead_mac_data, tags_equal
+from . import backends
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+CHUNK_SIZE = 65536
+BATCH_SIZE = 32
+
+TESTS_RE = re.compile(r'"tests"\s*:\s*\[')
+
+
+#-------------------------------------------------------------------
+# iter_json_tests()
+#
+# Yield the objects in all "tests" arrays in the given Wycheproof
+# style JSON file object. The file is read in chunks and only the
+# unconsumed part of the text is kept in memory.
+#-------------------------------------------------------------------
+def iter_json_tests(f, chunk_size=CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    in_tests = False
+
+    while True:
+        if pos > chunk_size:
+            buf = buf[pos:]
+            pos = 0
+
+        need_more = False
+        if not in_tests:
+            m = TESTS_RE.search(buf, pos)
+            if m is None:
+                # Keep enough text to match a split "tests" key.
+                pos = max(pos, len(buf) - 64)
+                need_more = True
+            else:
+                pos = m.end()
+                in_tests = True
+
+        if in_tests:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                need_more = True
+            elif buf[pos] == "]":
+                pos += 1
+                in_tests = False
+                continue
+            else:
+                try:
+                    (obj, pos) = decoder.raw_decode(buf, pos)
+                    yield obj
+                    continue
+                except ValueError:
+                    if eof:
+                        raise
+                    need_more = True
+
+        if need_more:
+            if eof:
+                if in_tests:
+                    raise ValueError("Unterminated tests array.")
+                return
+            data = f.read(chunk_size)
+            if not data:
+                eof = True
+            buf += data
+
+
+#-------------------------------------------------------------------
+# iter_vectors()
+#
+# Yield (file name, vector) for all vectors in the given files.
+# Files ending in .jsonl are read as one vector per line.
+#-------------------------------------------------------------------
+def iter_vectors(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield (path, json.loads(line))
+            else:
+                for vector in iter_json_tests(f):
+                    yield (path, vector)
+
+
+#-------------------------------------------------------------------
+# vector_type()
+#-------------------------------------------------------------------
+def vector_type(vector):
+    if "tag" in vector and "iv" in vector:
+        return "aead"
+    if "tag" in vector:
+        return "poly1305"
+    return "chacha20"
+
+
+#-------------------------------------------------------------------
+# check_aead()
+#
+# Check that the vector plaintext enciphers to the vector
+# ciphertext, and that the vector tag authenticates the
+# ciphertext and decrypts it to the plaintext.
+#-------------------------------------------------------------------
+def check_aead(v, chacha_xor, poly1305_mac):
+    if len(v["key"]) != 32 or len(v["iv"]) != 12:
+        raise ValueError("Unsupported key or nonce length.")
+    key = l2lw32(list(v["key"]))
+    nonce = l2lw32(list(v["iv"]))
+    otk = poly1305_key_gen(key, nonce)
+
+    ct = chacha_xor(key, 1, nonce, v["msg"], bytearray(len(v["msg"])))
+    if bytes(ct) != v["ct"]:
+        return False
+
+    tag = poly1305_mac(otk, aead_mac_data(v["aad"], v["ct"]))
+    if not tags_equal(tag, v["tag"]):
+        return False
+    msg = chacha_xor(key, 1, nonce, v["ct"], bytearray(len(v["ct"])))
+    return bytes(msg) == v["msg"]
+
+
+#-------------------------------------------------------------------
+# check_poly1305()
+#-------------------------------------------------------------------
+def check_poly1305(v, chacha_xor, poly1305_mac):
+    if len(v["key"]) != 32:
+        raise ValueError("Unsupported key length.")
+    return tags_equal(poly1305_mac(v["key"], v["msg"]), v["tag"])
+
+
+#-------------------------------------------------------------------
+# check_chacha20()
+#-------------------------------------------------------------------
+def check_chacha20(v, chacha_xor, poly1305_mac):
+    if len(v["key"]) != 32 or len(v["iv"]) != 12:
+        raise ValueError("Unsupported key or nonce length.")
+    key = l2lw32(list(v["key"]))
+    nonce = l2lw32(list(v["iv"]))
+    ct = chacha_xor(key, v.get("counter", 0), nonce, v["msg"],
+                    bytearray(len(v["msg"])))
+    return bytes(ct) == v["ct"]
+
+
+CHECKS = {"aead": check_aead, "poly1305": check_poly1305,
+          "chacha20": check_chacha20}
+
+
+#-------------------------------------------------------------------
+# resolve_backends()
+#
+# Return the backend names per operation and size class for the
+# given backend name. With no name the autotuned selection is
+# used, and the autotuning is run here, before any vector is
+# timed. Operations that do not have the named backend use the
+# big integer core.
+#-------------------------------------------------------------------
+def resolve_backends(backend):
+    names = {}
+    for operation in ["chacha_xor", "poly1305_mac"]:
+        if backend is None:
+            names[operation] = backends.resolve(operation)
+            continue
+
+        name = backend
+        if name not in backends.BACKENDS[operation]:
+            name = "bigint"
+        names[operation] = {cls: name for (max_bytes, cls, bench_bytes)
+                            in backends.SIZE_CLASSES}
+    return names
+
+
+#-------------------------------------------------------------------
+# load_functions()
+#
+# Return the chacha_xor and poly1305_mac functions for the
+# backend names from resolve_backends().
+#-------------------------------------------------------------------
+def load_functions(names):
+    return [backends.dispatch(operation, names[operation])
+            for operation in ["chacha_xor", "poly1305_mac"]]
+
+
+#-------------------------------------------------------------------
+# check_vector()
+#
+# Check a single vector and return the result record. Valid
+# vectors pass if accepted, invalid vectors pass if rejected and
+# acceptable vectors always pass. An exception counts as a
+# rejection.
+#-------------------------------------------------------------------
+def check_vector(path, vector, funcs):
+    vtype = vector_type(vector)
+    result = vector.get("result", "valid")
+    record = {"file": path, "id": vector.get("tcId"), "type": vtype,
+              "result": result}
+
+    start = time.perf_counter()
+    try:
+        v = dict(vector)
+        for field in ["key", "iv", "aad", "msg", "ct", "tag"]:
+            if field in v:
+                v[field] = bytes.fromhex(v[field])
+        accepted = CHECKS[vtype](v, *funcs)
+    except Exception as e:
+        accepted = False
+        record["error"] = "%s: %s" % (type(e).__name__, e)
+    record["seconds"] = time.perf_counter() - start
+
+    record["accepted"] = accepted
+    if result == "valid":
+        record["passed"] = accepted
+    elif result == "invalid":
+        record["passed"] = not accepted
+    else:
+        record["passed"] = True
+    return record
+
+
+#-------------------------------------------------------------------
+# check_batch()
+#
+# Check a batch of (path, vector) pairs. Run in the workers.
+#-------------------------------------------------------------------
+def check_batch(batch, names):
+    funcs = load_functions(names)
+    return [check_vector(path, vector, funcs) for (path, vector) in batch]
+
+
+#-------------------------------------------------------------------
+# iter_batches()
+#-------------------------------------------------------------------
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+#-------------------------------------------------------------------
+# run_kat()
+#
+# Check all vectors in the given files and return the report.
+# With workers set to 0 the vectors are checked in this process,
+# otherwise in a pool with the given number of processes (None
+# for one per CPU). Only a bounded number of batches are in
+# flight, so the vectors are streamed through the pool. The
+# backends are selected once, before the vectors are checked,
+# and the workers are given the selected names. mp_context is
+# the multiprocessing context of the pool, None for the default
+# start method.
+#-------------------------------------------------------------------
+def run_kat(paths, backend=None, workers=None, batch_size=BATCH_SIZE,
+            mp_context=None):
+    start = time.perf_counter()
+    names = resolve_backends(backend)
+    load_functions(names)
+    records = []
+    batches = iter_batches(iter_vectors(paths), batch_size)
+
+    if workers == 0:
+        for batch in batches:
+            records += check_batch(batch, names)
+    else:
+        max_pending = 4 * (workers or os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context) as executor:
+            pending = collections.deque()
+            for batch in batches:
+                pending.append(executor.submit(check_batch, batch, names))
+                while len(pending) >= max_pending:
+                    records += pending.popleft().result()
+            while pending:
+                records += pending.popleft().result()
+
+    passed = sum(1 for r in records if r["passed"])
+    return {"backend": backend or "auto",
+            "backends": names,
+            "total": len(records),
+            "passed": passed,
+            "failed": len(records) - passed,
+            "seconds": time.perf_counter() - start,
+            "results": records}
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run known answer tests.")
+    parser.add_argument("files", nargs="+", help="Test vector files.")
+    parser.add_argument("--backend", default=None,
+                        help="Backend to test. Default is the autotuned selection.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes, 0 to run serially.")
+    parser.add_argument("--report", default=None,
+                        help="Write the JSON report to this file.")
+    args = parser.parse_args(argv)
+
+    report = run_kat(args.files, args.backend, args.workers)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    for r in report["results"]:
+        if not r["passed"]:
+            print("FAILED: %s tcId %s (%s) %s" %
+                  (r["file"], r["id"], r["result"], r.get("error", "")))
+    print("%d vectors, %d passed, %d failed in %.3f s." %
+          (report["total"], report["passed"], report["failed"],
+           report["seconds"]))
+    return 0 if report["failed"] == 0 else 1
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF kat.py
+#=======================================================================
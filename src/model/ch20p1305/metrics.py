@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# metrics.py
+# ----------
+# Opt-in runtime metrics for the ChaCha20, Poly1305 and AEAD models.
+# Counts the work done (blocks, bytes, seals, opens) and records
+# per stage latency histograms. Metrics are disabled by default.
+# Instrumented code checks ENABLED before doing any work, so the
+# cost when disabled is one attribute lookup. Updates are guarded
+# by a lock, since the metrics are updated from the pipeline,
+# service and precompute threads.
+#
+# The counters of the core are declared in COUNTERS. Optional
+# modules declare their own counters with register() when loaded.
+# The metrics can be exported as a snapshot dict or as Prometheus
+# text format.
+#
+#
+# Copyright (c) 2017 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import time
+import _thread
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+ENABLED = False
+
+PREFIX = "ch20p1305"
+
+COUNTERS = ["chacha_blocks", "xor_bytes", "poly1305_blocks",
+            "aead_seals", "aead_opens", "aead_open_failures"]
+
+STAGES = ["keygen", "keystream", "mac", "compare"]
+
+# Upper bounds in seconds for the histogram buckets.
+BUCKETS = [1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4,
+           1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2, 1e-1, 2e-1, 5e-1, 1.0]
+
+counters = {}
+histograms = {}
+# A plain lock, the package core does not import threading.
+lock = _thread.allocate_lock()
+
+
+#-------------------------------------------------------------------
+# reset()
+#
+# Clear all counters and histograms.
+#-------------------------------------------------------------------
+def reset():
+    with lock:
+        counters.clear()
+        histograms.clear()
+        for name in COUNTERS:
+            counters[name] = 0
+        for stage in STAGES:
+            histograms[stage] = {"buckets": [0] * (len(BUCKETS) + 1),
+                                 "sum": 0.0, "count": 0}
+
+
+#-------------------------------------------------------------------
+# register()
+#
+# Declare the given counters, so they are reported from zero.
+#-------------------------------------------------------------------
+def register(*names):
+    with lock:
+        for name in names:
+            if name not in COUNTERS:
+                COUNTERS.append(name)
+            counters.setdefault(name, 0)
+
+
+#-------------------------------------------------------------------
+# enable()
+#
+# Reset and enable the metrics.
+#-------------------------------------------------------------------
+def enable():
+    global ENABLED
+    reset()
+    ENABLED = True
+
+
+#-------------------------------------------------------------------
+# disable()
+#
+# Disable the metrics. Collected values are kept.
+#-------------------------------------------------------------------
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+#-------------------------------------------------------------------
+# count()
+#
+# Increase the given counter. Callers in hot loops should check
+# ENABLED before calling.
+#-------------------------------------------------------------------
+def count(name, n=1):
+    if ENABLED:
+        with lock:
+            counters[name] = counters.get(name, 0) + n
+
+
+#-------------------------------------------------------------------
+# observe()
+#
+# Add a latency in seconds to the histogram for the given stage.
+#-------------------------------------------------------------------
+def observe(stage, seconds):
+    i = 0
+    while i < len(BUCKETS) and seconds > BUCKETS[i]:
+        i += 1
+
+    with lock:
+        hist = histograms.get(stage)
+        if hist is None:
+            hist = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+            histograms[stage] = hist
+        hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+
+#-------------------------------------------------------------------
+# timer_start()
+#
+# Start timing a stage. Returns None if metrics are disabled.
+#-------------------------------------------------------------------
+def timer_start():
+    if ENABLED:
+        return time.perf_counter()
+    return None
+
+
+#-------------------------------------------------------------------
+# timer_stop()
+#
+# Stop timing a stage started with timer_start() and record
+# the latency in the histogram for the stage.
+#-------------------------------------------------------------------
+def timer_stop(stage, start):
+    if start is not None:
+        observe(stage, time.perf_counter() - start)
+
+
+#-------------------------------------------------------------------
+# snapshot()
+#
+# Return a copy of all counters and histograms as a dict. The
+# histogram buckets are given as cumulative (upper bound, count)
+# pairs, with the last bucket having the bound "+Inf".
+#-------------------------------------------------------------------
+def snapshot():
+    with lock:
+        counts = dict(counters)
+        raw = {stage: (list(hist["buckets"]), hist["sum"], hist["count"])
+               for (stage, hist) in histograms.items()}
+
+    hists = {}
+    for (stage, (raw_buckets, raw_sum, raw_count)) in raw.items():
+        buckets = []
+        total = 0
+        for i in range(len(BUCKETS)):
+            total += raw_buckets[i]
+            buckets.append((BUCKETS[i], total))
+        buckets.append(("+Inf", total + raw_buckets[-1]))
+        hists[stage] = {"buckets": buckets, "sum": raw_sum, "count": raw_count}
+    return {"enabled": ENABLED, "counters": counts, "histograms": hists}
+
+
+#-------------------------------------------------------------------
+# prometheus_text()
+#
+# Return all counters and histograms in the Prometheus text
+# exposition format.
+#-------------------------------------------------------------------
+def prometheus_text():
+    snap = snapshot()
+    lines = []
+    for (name, value) in sorted(snap["counters"].items()):
+        metric = "%s_%s_total" % (PREFIX, name)
+        lines.append("# TYPE %s counter" % metric)
+        lines.append("%s %d" % (metric, value))
+
+    metric = "%s_stage_seconds" % PREFIX
+    lines.append("# TYPE %s histogram" % metric)
+    for (stage, hist) in sorted(snap["histograms"].items()):
+        for (le, total) in hist["buckets"]:
+            if le != "+Inf":
+                le = repr(le)
+            lines.append('%s_bucket{stage="%s",le="%s"} %d' %
+                         (metric, stage, le, total))
+        lines.append('%s_sum{stage="%s"} %r' % (metric, stage, hist["sum"]))
+        lines.append('%s_count{stage="%s"} %d' % (metric, stage, hist["count"]))
+    return "\n".join(lines) + "\n"
+
+
+reset()
+
+#=======================================================================
+# EOF metrics.py
+#=======================================================================
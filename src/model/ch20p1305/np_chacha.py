@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# np_chacha.py
+# ------------
+# NumPy backend for the ChaCha20 block function. Generates many
+# consecutive blocks at once by keeping each state word for all
+# blocks in one array. This module is loaded lazily on first use
+# from the package and requires NumPy.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import numpy as np
+from . import metrics
+from .chacha import DJB_NONCE_WORDS, check_counter
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+NUM_DOUBLEROUNDS = 10
+
+# Max number of blocks generated in one batch.
+MAX_BATCH_BLOCKS = 4096
+
+SIGMA = np.array([0x61707865, 0x3320646e, 0x79622d32, 0x6b206574],
+                 dtype=np.uint32)
+
+
+#-------------------------------------------------------------------
+# qr()
+#
+# The ChaCha quarterround applied in place on the rows a, b, c
+# and d of the given batch state.
+#-------------------------------------------------------------------
+def qr(x, a, b, c, d):
+    x[a] += x[b]
+    x[d] ^= x[a]
+    x[d] = (x[d] << 16) | (x[d] >> 16)
+    x[c] += x[d]
+    x[b] ^= x[c]
+    x[b] = (x[b] << 12) | (x[b] >> 20)
+    x[a] += x[b]
+    x[d] ^= x[a]
+    x[d] = (x[d] << 8) | (x[d] >> 24)
+    x[c] += x[d]
+    x[b] ^= x[c]
+    x[b] = (x[b] << 7) | (x[b] >> 25)
+
+
+#-------------------------------------------------------------------
+# doubleround()
+#
+# The ChaCha doubleround applied in place on the batch state.
+#-------------------------------------------------------------------
+def doubleround(x):
+    qr(x, 0, 4, 8,12)
+    qr(x, 1, 5, 9,13)
+    qr(x, 2, 6,10,14)
+    qr(x, 3, 7,11,15)
+    qr(x, 0, 5,10,15)
+    qr(x, 1, 6,11,12)
+    qr(x, 2, 7, 8,13)
+    qr(x, 3, 4, 9,14)
+
+
+#-------------------------------------------------------------------
+# chacha_blocks()
+#
+# Generate num_blocks consecutive ChaCha blocks starting at the
+# given counter. Key and nonce are given as lists of words.
+# A nonce of two words selects the 64 bit counter layout.
+# Returns an array with one row of 16 words per block. Raises
+# ValueError if the blocks do not fit in the counter.
+#-------------------------------------------------------------------
+def chacha_blocks(key, counter, nonce, num_blocks):
+    check_counter(counter, nonce, num_blocks)
+    state = np.empty((16, num_blocks), dtype=np.uint32)
+    state[0:4] = SIGMA[:, None]
+    state[4:12] = np.array(key, dtype=np.uint32)[:, None]
+    counters = np.arange(counter, counter + num_blocks, dtype=np.uint64)
+    state[12] = (counters & 0xffffffff).astype(np.uint32)
+    if len(nonce) == DJB_NONCE_WORDS:
+        state[13] = (counters >> np.uint64(32)).astype(np.uint32)
+        state[14:16] = np.array(nonce, dtype=np.uint32)[:, None]
+    else:
+        state[13:16] = np.array(nonce, dtype=np.uint32)[:, None]
+
+    if metrics.ENABLED:
+        metrics.count("chacha_blocks", num_blocks)
+
+    working_state = state.copy()
+    for i in range(NUM_DOUBLEROUNDS):
+        doubleround(working_state)
+    working_state += state
+    return working_state.T
+
+
+#-------------------------------------------------------------------
+# chacha_blocks_multi()
+#
+# Generate one block for each row of keys, counters and nonces,
+# so blocks for many messages with different keys are generated
+# in one batch. keys is an (N, 8) and nonces an (N, 3) array of
+# words, counters has N values. Returns an (N, 16) array.
+# Raises ValueError for counters beyond the 32 bit counter.
+#-------------------------------------------------------------------
+def chacha_blocks_multi(keys, counters, nonces):
+    num_blocks = len(counters)
+    counters = np.asarray(counters, dtype=np.int64)
+    if num_blocks and (counters.min() < 0 or counters.max() >= 2**32):
+        raise ValueError("Block counter beyond the 32 bit counter.")
+    state = np.empty((16, num_blocks), dtype=np.uint32)
+    state[0:4] = SIGMA[:, None]
+    state[4:12] = np.asarray(keys, dtype=np.uint32).T
+    state[12] = np.asarray(counters, dtype=np.uint32)
+    state[13:16] = np.asarray(nonces, dtype=np.uint32).T
+
+    if metrics.ENABLED:
+        metrics.count("chacha_blocks", num_blocks)
+
+    working_state = state.copy()
+    for i in range(NUM_DOUBLEROUNDS):
+        doubleround(working_state)
+    working_state += state
+    return working_state.T
+
+
+#-------------------------------------------------------------------
+# keystream()
+#
+# Return num_bytes of keystream starting at the given counter.
+#-------------------------------------------------------------------
+def keystream(key, counter, nonce, num_bytes):
+    num_blocks = (num_bytes + 63) // 64
+    blocks = chacha_blocks(key, counter, nonce, num_blocks)
+    return blocks.astype("<u4").tobytes()[0 : num_bytes]
+
+
+#-------------------------------------------------------------------
+# chacha_xor()
+#
+# Encipher or decipher the given data with the ChaCha20 keystream
+# starting at the given counter. The result is written into out
+# if given, which must be a writable buffer at least as long as
+# the data. Otherwise the result is returned as bytes.
+#-------------------------------------------------------------------
+def chacha_xor(key, counter, nonce, data, out=None):
+    src = np.frombuffer(bytes(data) if isinstance(data, list) else data,
+                        dtype=np.uint8)
+    result = out
+    if out is None:
+        result = bytearray(len(src))
+    dst = np.frombuffer(result, dtype=np.uint8)
+
+    batch_bytes = MAX_BATCH_BLOCKS * 64
+    for i in range(0, len(src), batch_bytes):
+        chunk = src[i : i + batch_bytes]
+        blocks = chacha_blocks(key, counter, nonce, (len(chunk) + 63) // 64)
+        ks = np.ascontiguousarray(blocks, dtype="<u4").view(np.uint8).reshape(-1)
+        np.bitwise_xor(chunk, ks[0 : len(chunk)], out=dst[i : i + len(chunk)])
+        counter += MAX_BATCH_BLOCKS
+
+    if metrics.ENABLED:
+        metrics.count("xor_bytes", len(src))
+    if out is None:
+        return bytes(result)
+    return out
+
+
+#=======================================================================
+# EOF np_chacha.py
+#=======================================================================
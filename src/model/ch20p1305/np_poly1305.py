@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# np_poly1305.py
+# --------------
+# NumPy backend that computes Poly1305 tags for many independent
+# messages, each with its own one time key, in lockstep. The
+# accumulator and r of every message are kept as five 26 bit
+# limbs in uint64 arrays with one column per message. Messages
+# of different lengths are handled by masking the update of
+# messages that have run out of blocks. This module is loaded
+# lazily on first use from the package and requires NumPy.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import numpy as np
+from . import metrics
+from .poly1305 import p1305_finalize
+from .aead import tags_equal
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+LIMB_MASK = np.uint64(0x3ffffff)
+
+R_CLAMP_WORDS = np.array([0x0fffffff, 0x0ffffffc, 0x0ffffffc, 0x0ffffffc],
+                         dtype=np.uint64)
+
+
+#-------------------------------------------------------------------
+# to_limbs()
+#
+# Split 128 bit values given as four little endian 32 bit words
+# in the last axis into five 26 bit limbs. hibit is added as
+# bit 128, the padding bit of a complete block.
+#-------------------------------------------------------------------
+def to_limbs(words, hibit=0):
+    w = words.astype(np.uint64)
+    (w0, w1, w2, w3) = (w[..., 0], w[..., 1], w[..., 2], w[..., 3])
+    return np.stack([w0 & LIMB_MASK,
+                     ((w0 >> np.uint64(26)) | (w1 << np.uint64(6))) & LIMB_MASK,
+                     ((w1 >> np.uint64(20)) | (w2 << np.uint64(12))) & LIMB_MASK,
+                     ((w2 >> np.uint64(14)) | (w3 << np.uint64(18))) & LIMB_MASK,
+                     (w3 >> np.uint64(8)) | (np.uint64(hibit) << np.uint64(24))])
+
+
+#-------------------------------------------------------------------
+# load_blocks()
+#
+# Pack the messages into a zero padded (M, num_blocks * 16) byte
+# array. A short last block gets its 0x01 padding byte in place.
+# Returns the limbs of all blocks with shape (5, num_blocks, M)
+# and the mask of blocks that belong to each message.
+#-------------------------------------------------------------------
+def load_blocks(messages):
+    lengths = np.array([len(m) for m in messages], dtype=np.int64)
+    num_blocks = (lengths + 15) // 16
+    max_blocks = int(num_blocks.max()) if len(messages) else 0
+
+    data = np.zeros((len(messages), max_blocks * 16), dtype=np.uint8)
+    for (i, message) in enumerate(messages):
+        if not isinstance(message, (bytes, bytearray, memoryview)):
+            message = bytes(message)
+        data[i, 0 : len(message)] = np.frombuffer(message, dtype=np.uint8)
+        if len(message) % 16:
+            data[i, len(message)] = 0x01
+
+    block_index = np.arange(max_blocks)
+    active = block_index[:, None] < num_blocks[None, :]
+    full = block_index[:, None] < (lengths // 16)[None, :]
+
+    words = data.view("<u4").reshape(len(messages), max_blocks, 4)
+    limbs = to_limbs(words.transpose(1, 0, 2))
+    limbs[4] |= full.astype(np.uint64) << np.uint64(24)
+    return (limbs, active, int(num_blocks.sum()))
+
+
+#-------------------------------------------------------------------
+# load_keys()
+#
+# Return the clamped r of each key as limbs with shape (5, M)
+# and the s values as integers.
+#-------------------------------------------------------------------
+def load_keys(keys):
+    keys = [bytes(k) for k in keys]
+    words = np.frombuffer(b"".join(keys), dtype="<u4").reshape(len(keys), 8)
+    r = to_limbs(words[:, 0 : 4] & R_CLAMP_WORDS)
+    s = [int.from_bytes(k[16:32], "little") for k in keys]
+    return (r, s)
+
+
+#-------------------------------------------------------------------
+# poly1305_accumulate()
+#
+# Run the Poly1305 block loop for all messages at once. Returns
+# the accumulators as five limb arrays. The limbs are only
+# partially carried, p1305_finalize() does the reduction.
+#-------------------------------------------------------------------
+def poly1305_accumulate(r, blocks, active):
+    (r0, r1, r2, r3, r4) = r
+    five = np.uint64(5)
+    (s1, s2, s3, s4) = (r1 * five, r2 * five, r3 * five, r4 * five)
+    shift = np.uint64(26)
+    mask = LIMB_MASK
+
+    h = np.zeros(r.shape, dtype=np.uint64)
+    for j in range(blocks.shape[1]):
+        (h0, h1, h2, h3, h4) = h + blocks[:, j]
+
+        d0 = h0 * r0 + h1 * s4 + h2 * s3 + h3 * s2 + h4 * s1
+        d1 = h0 * r1 + h1 * r0 + h2 * s4 + h3 * s3 + h4 * s2
+        d2 = h0 * r2 + h1 * r1 + h2 * r0 + h3 * s4 + h4 * s3
+        d3 = h0 * r3 + h1 * r2 + h2 * r1 + h3 * r0 + h4 * s4
+        d4 = h0 * r4 + h1 * r3 + h2 * r2 + h3 * r1 + h4 * r0
+
+        d1 += d0 >> shift
+        d2 += d1 >> shift
+        d3 += d2 >> shift
+        d4 += d3 >> shift
+        h0 = (d0 & mask) + (d4 >> shift) * five
+        h1 = (d1 & mask) + (h0 >> shift)
+        updated = np.stack([h0 & mask, h1, d2 & mask, d3 & mask, d4 & mask])
+
+        # Messages without a block j keep their accumulator.
+        h = np.where(active[j], updated, h)
+    return h
+
+
+#-------------------------------------------------------------------
+# poly1305_macs()
+#
+# Given M keys and M messages, return the M tags as lists of
+# bytes, equal to calling poly1305_mac_fast() for each pair.
+#-------------------------------------------------------------------
+def poly1305_macs(keys, messages):
+    if len(keys) != len(messages):
+        raise ValueError("Number of keys and messages differ.")
+    if not messages:
+        return []
+
+    (r, s) = load_keys(keys)
+    (blocks, active, num_blocks) = load_blocks(messages)
+    if metrics.ENABLED:
+        metrics.count("poly1305_blocks", num_blocks)
+    h = poly1305_accumulate(r, blocks, active).tolist()
+
+    tags = []
+    for i in range(len(messages)):
+        acc = (h[0][i] + (h[1][i] << 26) + (h[2][i] << 52) +
+               (h[3][i] << 78) + (h[4][i] << 104))
+        tags.append(p1305_finalize(acc, s[i]))
+    return tags
+
+
+#-------------------------------------------------------------------
+# poly1305_verify()
+#
+# Compute the tags for M messages and compare them with the M
+# expected tags. Returns a boolean array with True for every
+# message whose tag is correct.
+#-------------------------------------------------------------------
+def poly1305_verify(keys, messages, tags):
+    if len(tags) != len(messages):
+        raise ValueError("Number of tags and messages differ.")
+    computed = poly1305_macs(keys, messages)
+    return np.array([tags_equal(computed[i], tags[i])
+                     for i in range(len(tags))], dtype=bool)
+
+#=======================================================================
+# EOF np_poly1305.py
+#=======================================================================
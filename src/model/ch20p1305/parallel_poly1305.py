@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# parallel_poly1305.py
+# --------------------
+# Poly1305 of large files using several processes. The Poly1305
+# accumulator is the polynomial
+#
+#   acc = m_1 * r^n + m_2 * r^(n-1) + ... + m_n * r  (mod p)
+#
+# of the n padded message blocks. The blocks are split into
+# contiguous shards, and each shard is evaluated on its own from
+# a zero accumulator by a worker process reading the file through
+# mmap. The shard results are combined in order as
+#
+#   acc = acc * r^(shard length) + shard result  (mod p)
+#
+# with the powers of r computed once per shard length. The tag
+# is identical to the tag from the serial computation.
+#
+# Usage: python3 -m ch20p1305.parallel_poly1305 KEYHEX FILE [--workers N]
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import sys
+import mmap
+import argparse
+import concurrent.futures
+
+from .poly1305 import P1305, MASK128, R_CLAMP, p1305_blocks
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Number of shards per worker, more shards even out the load.
+SHARDS_PER_WORKER = 4
+
+# Smallest shard in bytes, smaller files use fewer shards.
+MIN_SHARD_SIZE = 1 << 20
+
+
+#-------------------------------------------------------------------
+# shard_ranges()
+#
+# Split num_bytes into at most num_shards contiguous byte ranges.
+# All ranges except the last are a multiple of 16 bytes, so the
+# shards contain complete Poly1305 blocks.
+#-------------------------------------------------------------------
+def shard_ranges(num_bytes, num_shards):
+    num_blocks = (num_bytes + 15) // 16
+    blocks_per_shard = max(1, -(-num_blocks // max(1, num_shards)))
+    ranges = []
+    for first in range(0, num_blocks, blocks_per_shard):
+        start = first * 16
+        end = min(num_bytes, (first + blocks_per_shard) * 16)
+        ranges.append((start, end))
+    return ranges
+
+
+#-------------------------------------------------------------------
+# shard_accumulator()
+#
+# Evaluate the Poly1305 polynomial of bytes start to end in the
+# file from a zero accumulator. Run in the workers.
+#-------------------------------------------------------------------
+def shard_accumulator(path, r, start, end):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            view = memoryview(m)
+            try:
+                return p1305_blocks(0, r, view[start : end]) % P1305
+            finally:
+                view.release()
+
+
+#-------------------------------------------------------------------
+# combine()
+#
+# Combine the shard accumulators given as (accumulator, number
+# of blocks) pairs in message order.
+#-------------------------------------------------------------------
+def combine(r, shards):
+    powers = {}
+    acc = 0
+    for (shard_acc, num_blocks) in shards:
+        if num_blocks not in powers:
+            powers[num_blocks] = pow(r, num_blocks, P1305)
+        acc = (acc * powers[num_blocks] + shard_acc) % P1305
+    return acc
+
+
+#-------------------------------------------------------------------
+# poly1305_mac_file()
+#
+# Return the Poly1305 tag of the file as a list of bytes, equal
+# to poly1305_mac_fast() of the file contents. With workers set
+# to 0 the shards are evaluated in this process. num_shards
+# overrides the number of shards.
+#-------------------------------------------------------------------
+def poly1305_mac_file(key, path, workers=None, num_shards=None):
+    key = bytes(key)
+    r = int.from_bytes(key[0:16], "little") & R_CLAMP
+    s = int.from_bytes(key[16:32], "little")
+
+    num_bytes = os.path.getsize(path)
+    if num_shards is None:
+        num_workers = workers or os.cpu_count() or 1
+        num_shards = min(num_workers * SHARDS_PER_WORKER,
+                         max(1, num_bytes // MIN_SHARD_SIZE))
+    ranges = shard_ranges(num_bytes, num_shards)
+
+    if workers == 0 or len(ranges) <= 1:
+        accs = [shard_accumulator(path, r, start, end) for (start, end) in ranges]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(shard_accumulator, path, r, start, end)
+                       for (start, end) in ranges]
+            accs = [future.result() for future in futures]
+
+    shards = [(accs[i], (end - start + 15) // 16)
+              for (i, (start, end)) in enumerate(ranges)]
+    tagword = (combine(r, shards) + s) & MASK128
+    return list(tagword.to_bytes(16, "little"))
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Poly1305 of a file.")
+    parser.add_argument("key", help="The 32 byte key in hex.")
+    parser.add_argument("file", help="The file to authenticate.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes, 0 to run serially.")
+    args = parser.parse_args(argv)
+
+    tag = poly1305_mac_file(bytes.fromhex(args.key), args.file, args.workers)
+    print(bytes(tag).hex())
+    return 0
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF parallel_poly1305.py
+#=======================================================================
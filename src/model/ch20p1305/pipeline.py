@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# pipeline.py
+# -----------
+# Pipelined AEAD seal and open for large messages. The keystream
+# generation and XOR runs in a worker thread and Poly1305 runs in
+# the calling thread. The stages are connected by a bounded queue
+# of views into the ciphertext, so the MAC of one chunk could be
+# computed while the next chunk is enciphered. The NumPy ChaCha
+# backend is used for the keystream stage when available.
+#
+# This is not a speedup path. The MAC stage is big integer
+# Poly1305, which holds the GIL for the whole chunk, and the
+# NumPy keystream stage releases it only for short array
+# operations. The stages therefore run one at a time, the
+# measured overlap is close to zero and the pipelined seal is
+# slower than a single chunk. Use aead_seal_iov() for
+# throughput. The module models the pipeline structure and
+# measures the overlap, for comparison with a hardware pipeline
+# or a MAC kernel that releases the GIL.
+#
+# This module is loaded lazily on first use from the package.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import queue
+import struct
+import threading
+import time
+
+from . import metrics
+from .utils import l2lw32, byteview
+from .poly1305 import Poly1305
+from .aead import poly1305_key_gen, tags_equal
+from .aead import chacha_xor as bigint_chacha_xor
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Chunk size in bytes, must be a multiple of the 64 byte block.
+CHUNK_SIZE = 65536
+
+# Max number of chunks waiting for the MAC stage.
+QUEUE_DEPTH = 4
+
+
+#-------------------------------------------------------------------
+# load_xor()
+#
+# Return the keystream XOR function for the pipeline, the NumPy
+# backend if it can be loaded, otherwise the big integer core.
+#-------------------------------------------------------------------
+def load_xor():
+    try:
+        from .np_chacha import chacha_xor
+        return chacha_xor
+    except ImportError:
+        return bigint_chacha_xor
+
+
+#-------------------------------------------------------------------
+# overlap()
+#
+# The fraction of the shorter stage that ran concurrently with
+# the other stage, given the busy time of both stages and the
+# total elapsed time. The busy time is measured as thread CPU
+# time, so time slicing on a single core is not counted as
+# overlap.
+#-------------------------------------------------------------------
+def overlap(keystream_seconds, mac_seconds, wall_seconds):
+    shortest = min(keystream_seconds, mac_seconds)
+    if shortest <= 0:
+        return 0.0
+    hidden = keystream_seconds + mac_seconds - wall_seconds
+    return max(0.0, min(1.0, hidden / shortest))
+
+
+#-------------------------------------------------------------------
+# run_pipeline()
+#
+# Encipher or decipher src into dst in chunks in a worker thread
+# and absorb the ciphertext into Poly1305 in this thread. When
+# sealing, the ciphertext is in dst and a chunk is queued after
+# it has been enciphered. When opening, the ciphertext is in src
+# and a chunk is queued before it is deciphered.
+# Returns the tag and fills in stats if given.
+#-------------------------------------------------------------------
+def run_pipeline(key_words, nonce_words, aad, src, dst, sealing,
+                 chunk_size, stats):
+    if chunk_size <= 0 or chunk_size % 64:
+        raise ValueError("Chunk size must be a positive multiple of 64.")
+    if len(dst) < len(src):
+        raise ValueError("Output buffer shorter than input buffer.")
+
+    wall_start = time.perf_counter()
+    xor = load_xor()
+    chunks = queue.Queue(QUEUE_DEPTH)
+    busy = {"keystream": 0.0, "error": None}
+    stop = threading.Event()
+
+    def keystream_stage():
+        try:
+            for pos in range(0, len(src), chunk_size):
+                if stop.is_set():
+                    break
+                src_chunk = src[pos : pos + chunk_size]
+                dst_chunk = dst[pos : pos + len(src_chunk)]
+                if not sealing:
+                    chunks.put(src_chunk)
+                start = time.thread_time()
+                xor(key_words, 1 + pos // 64, nonce_words, src_chunk, dst_chunk)
+                busy["keystream"] += time.thread_time() - start
+                if sealing:
+                    chunks.put(dst_chunk)
+        except Exception as error:
+            busy["error"] = error
+        finally:
+            chunks.put(None)
+
+    worker = threading.Thread(target=keystream_stage, daemon=True)
+    worker.start()
+
+    # If the MAC stage fails, stop the worker and drain the queue
+    # so that it is not left blocked on a full queue.
+    drained = False
+    try:
+        otk = poly1305_key_gen(key_words, nonce_words)
+        mac = Poly1305(otk)
+        mac.update(aad).pad16()
+        mac_seconds = 0.0
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                drained = True
+                break
+            start = time.thread_time()
+            mac.update(chunk)
+            mac_seconds += time.thread_time() - start
+    finally:
+        if not drained:
+            stop.set()
+            while chunks.get() is not None:
+                pass
+        worker.join()
+    if busy["error"] is not None:
+        raise busy["error"]
+
+    mac.pad16()
+    mac.update(struct.pack("<QQ", len(aad), len(src)))
+    tag = mac.finalize()
+
+    if stats is not None:
+        stats["keystream_seconds"] = busy["keystream"]
+        stats["mac_seconds"] = mac_seconds
+        stats["wall_seconds"] = time.perf_counter() - wall_start
+        stats["overlap"] = overlap(busy["keystream"], mac_seconds,
+                                   stats["wall_seconds"])
+    return tag
+
+
+#-------------------------------------------------------------------
+# pipeline_seal()
+#
+# Pipelined version of aead_seal(). The plaintext is enciphered
+# into out, which must be a writable bytes-like object at least
+# as long as the plaintext. Returns the 16 byte tag as a list
+# of bytes. If stats is a dict, the busy time of each stage, the
+# elapsed time and the achieved overlap are stored in it.
+#-------------------------------------------------------------------
+def pipeline_seal(key, nonce, aad, plaintext, out,
+                  chunk_size=CHUNK_SIZE, stats=None):
+    tag = run_pipeline(l2lw32(list(key)), l2lw32(list(nonce)), bytes(aad),
+                       byteview(plaintext), memoryview(out), True,
+                       chunk_size, stats)
+    if metrics.ENABLED:
+        metrics.count("aead_seals")
+    return tag
+
+
+#-------------------------------------------------------------------
+# pipeline_open()
+#
+# Pipelined version of aead_open(). Deciphering runs concurrently
+# with the tag check, into a private buffer. The plaintext is
+# copied into out only if the tag is correct, and out is then
+# returned. Otherwise out is left untouched and None is returned.
+#-------------------------------------------------------------------
+def pipeline_open(key, nonce, aad, ciphertext, tag, out,
+                  chunk_size=CHUNK_SIZE, stats=None):
+    src = byteview(ciphertext)
+    dst = memoryview(out)
+    if len(dst) < len(src):
+        raise ValueError("Output buffer shorter than input buffer.")
+    plaintext = bytearray(len(src))
+    expected_tag = run_pipeline(l2lw32(list(key)), l2lw32(list(nonce)),
+                                bytes(aad), src, memoryview(plaintext),
+                                False, chunk_size, stats)
+    if metrics.ENABLED:
+        metrics.count("aead_opens")
+    if not tags_equal(tag, expected_tag):
+        if metrics.ENABLED:
+            metrics.count("aead_open_failures")
+        return None
+    dst[0 : len(src)] = plaintext
+    return out
+
+#=======================================================================
+# EOF pipeline.py
+#=======================================================================
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# poly1305.py
+# -----------
+# Big integer implementation of the Poly1305 authenticator as
+# specified in 2.5 in RFC 7539. The accumulator is reduced using
+# the special form of p = 2**130 - 5.
+#
+#
+# Copyright (c) 2017 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+from . import metrics
+from .utils import byteview
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+P1305   = 2**130 - 5
+MASK128 = 2**128 - 1
+MASK130 = 2**130 - 1
+R_CLAMP = 0x0ffffffc0ffffffc0ffffffc0fffffff
+
+
+#-------------------------------------------------------------------
+# p1305_fold()
+#
+# Partial reduction of the accumulator using 2**130 = 5 mod p.
+# The bits above bit 129 are multiplied by five and added to the
+# lower 130 bits. The result is congruent to acc, but not
+# neccessarily less than p.
+#-------------------------------------------------------------------
+def p1305_fold(acc):
+    return (acc & MASK130) + (acc >> 130) * 5
+
+
+#-------------------------------------------------------------------
+# p1305_blocks()
+#
+# Absorb the given message into the accumulator. Every complete
+# 16 byte block is padded with 0x01 and the last, short block is
+# padded as specified in 2.5.1 in the RFC.
+#
+# The accumulator is only folded once per block, never fully
+# reduced. With a clamped r (< 2**124) a folded accumulator
+# stays below 2**131, which keeps the product below 2**256.
+# The canonical reduction is done in p1305_finalize().
+#
+# Bytes-like messages are read in place as bytes, lists of bytes
+# are converted.
+#-------------------------------------------------------------------
+def p1305_blocks(acc, r, message):
+    data = message
+    if not isinstance(data, (bytes, bytearray)):
+        data = byteview(data)
+    if metrics.ENABLED:
+        metrics.count("poly1305_blocks", (len(data) + 15) // 16)
+    full = len(data) - (len(data) % 16)
+
+    # Local names, the loop is dominated by name lookups.
+    from_bytes = int.from_bytes
+    mask130 = MASK130
+    hibit = 1 << 128
+    for i in range(0, full, 16):
+        acc = (acc + (from_bytes(data[i : i + 16], "little") | hibit)) * r
+        acc = (acc & mask130) + (acc >> 130) * 5
+
+    if full < len(data):
+        lastbytes = len(data) - full
+        b = int.from_bytes(data[full:], "little") | (1 << (8 * lastbytes))
+        acc = p1305_fold((acc + b) * r)
+    return acc
+
+
+#-------------------------------------------------------------------
+# p1305_finalize()
+#
+# Canonical reduction of the accumulator, addition of s and
+# conversion of the 128 least significant bits into a tag.
+#-------------------------------------------------------------------
+def p1305_finalize(acc, s):
+    acc = p1305_fold(p1305_fold(acc))
+    if acc >= P1305:
+        acc -= P1305
+    tagword = (acc + s) & MASK128
+    return list(tagword.to_bytes(16, "little"))
+
+
+#-------------------------------------------------------------------
+# poly1305_mac_fast()
+#
+# Fast big integer version of poly1305_mac() in poly1305_test.py.
+# Given a 32 byte key and a message, returns the 16 byte tag.
+# Key and message can be lists of bytes or bytes-like objects.
+#-------------------------------------------------------------------
+def poly1305_mac_fast(key, message):
+    key = bytes(key)
+    r = int.from_bytes(key[0:16], "little") & R_CLAMP
+    s = int.from_bytes(key[16:32], "little")
+    acc = p1305_blocks(0, r, message)
+    return p1305_finalize(acc, s)
+
+
+#-------------------------------------------------------------------
+# poly1305_mac_general()
+#
+# Reference Poly1305 that reduces the accumulator with a general
+# modulo operation after every block, as poly1305_update() in
+# poly1305_test.py does.
+#-------------------------------------------------------------------
+def poly1305_mac_general(key, message):
+    key = bytes(key)
+    data = bytes(message)
+    r = int.from_bytes(key[0:16], "little") & R_CLAMP
+    s = int.from_bytes(key[16:32], "little")
+
+    acc = 0
+    for i in range(0, len(data), 16):
+        block = data[i : i + 16] + b"\x01"
+        acc = ((acc + int.from_bytes(block, "little")) * r) % P1305
+
+    tagword = (acc + s) & MASK128
+    return list(tagword.to_bytes(16, "little"))
+
+
+#-------------------------------------------------------------------
+# Poly1305
+#
+# Streaming version of poly1305_mac_fast(). The message can be
+# given as any number of segments using update(). Bytes that do
+# not fill a complete block are kept until the next segment
+# arrives, so segments do not have to be concatenated. pad16()
+# zero pads a partial block as done between the AAD, ciphertext
+# and length fields in the AEAD construction.
+#-------------------------------------------------------------------
+class Poly1305:
+    def __init__(self, key):
+        key = bytes(key)
+        self.r = int.from_bytes(key[0:16], "little") & R_CLAMP
+        self.s = int.from_bytes(key[16:32], "little")
+        self.acc = 0
+        self.partial = bytearray()
+
+
+    def update(self, segment):
+        data = byteview(segment)
+
+        if self.partial:
+            needed = 16 - len(self.partial)
+            self.partial += data[0 : needed]
+            data = data[needed:]
+            if len(self.partial) < 16:
+                return self
+            self.acc = p1305_blocks(self.acc, self.r, self.partial)
+            self.partial = bytearray()
+
+        full = len(data) - (len(data) % 16)
+        if full:
+            self.acc = p1305_blocks(self.acc, self.r, data[0 : full])
+        self.partial += data[full:]
+        return self
+
+
+    def pad16(self):
+        if self.partial:
+            self.partial += bytes(16 - len(self.partial))
+            self.acc = p1305_blocks(self.acc, self.r, self.partial)
+            self.partial = bytearray()
+        return self
+
+
+    def finalize(self):
+        if self.partial:
+            self.acc = p1305_blocks(self.acc, self.r, self.partial)
+            self.partial = bytearray()
+        return p1305_finalize(self.acc, self.s)
+
+
+#=======================================================================
+# EOF poly1305.py
+#=======================================================================
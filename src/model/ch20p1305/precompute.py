@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# precompute.py
+# -------------
+# Background precomputation of the one time Poly1305 key and the
+# first keystream blocks for upcoming records. The nonce of the
+# next records is known from the sequence number before the
+# payload arrives. A worker thread fills a bounded cache for the
+# next records, so the work left when a record arrives is the
+# XOR and the MAC.
+#
+# The cache holds at most depth records, and never more entries
+# than fit in max_bytes. Rekeying the attached record state
+# invalidates all entries, also those being computed.
+# The hits and misses are counted as key_cache_hits and
+# key_cache_misses in the metrics.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import threading
+
+from . import metrics
+from .aead import poly1305_key_gen
+from .swar_chacha import keystream
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Number of upcoming records to precompute.
+DEPTH = 4
+
+# Number of keystream blocks precomputed per record.
+BLOCKS = 16
+
+# Max number of bytes in the cache per connection.
+MAX_BYTES = 65536
+
+metrics.register("key_cache_hits", "key_cache_misses")
+
+
+#-------------------------------------------------------------------
+# KeystreamCache
+#
+# Precompute cache attached to a RecordSealer or RecordOpener.
+# take() is called by the record state for the record being
+# processed, and returns the (one time key, keystream) pair or
+# None on a miss. peek() returns the entry without removing it,
+# for records that may still be rejected.
+#-------------------------------------------------------------------
+class KeystreamCache:
+    def __init__(self, state, depth=DEPTH, blocks=BLOCKS, max_bytes=MAX_BYTES):
+        entry_bytes = 32 + blocks * 64
+        self.max_entries = min(depth, max_bytes // entry_bytes)
+        if self.max_entries < 1:
+            raise ValueError("Memory cap smaller than one cache entry.")
+
+        self.state = state
+        self.blocks = blocks
+        self.entry_bytes = entry_bytes
+        self.entries = {}
+        self.epoch = 0
+        self.next_seq = 0
+        self.stopped = False
+        self.cond = threading.Condition()
+
+        state.cache = self
+        self.worker = threading.Thread(target=self.fill_loop, daemon=True)
+        self.worker.start()
+
+
+    def window(self):
+        first = max(self.state.seq, self.next_seq)
+        return range(first, first + self.max_entries)
+
+
+    def missing(self):
+        window = self.window()
+        for seq in list(self.entries):
+            if seq not in window:
+                del self.entries[seq]
+        for seq in window:
+            if seq not in self.entries:
+                return seq
+        return None
+
+
+    def fill_loop(self):
+        while True:
+            with self.cond:
+                seq = self.missing()
+                while not self.stopped and seq is None:
+                    self.cond.wait()
+                    seq = self.missing()
+                if self.stopped:
+                    return
+                epoch = self.epoch
+                key = self.state.key_words
+                nonce = self.state.nonce_words(seq)
+
+            entry = (poly1305_key_gen(key, nonce),
+                     keystream(key, 1, nonce, self.blocks * 64))
+
+            with self.cond:
+                if epoch == self.epoch and seq in self.window():
+                    self.entries[seq] = entry
+                self.cond.notify_all()
+
+
+    def peek(self, seq):
+        with self.cond:
+            return self.entries.get(seq)
+
+
+    def take(self, seq):
+        with self.cond:
+            entry = self.entries.pop(seq, None)
+            self.next_seq = seq + 1
+            self.cond.notify_all()
+        if metrics.ENABLED:
+            metrics.count("key_cache_hits" if entry else "key_cache_misses")
+        return entry
+
+
+    def invalidate(self):
+        with self.cond:
+            self.entries.clear()
+            self.epoch += 1
+            self.next_seq = 0
+            self.cond.notify_all()
+
+
+    def wait_filled(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.missing() is None, timeout)
+
+
+    def memory(self):
+        return len(self.entries) * self.entry_bytes
+
+
+    def close(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.worker.join()
+        self.state.cache = None
+
+#=======================================================================
+# EOF precompute.py
+#=======================================================================
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# record.py
+# ---------
+# Record layer sealing and opening for TLS style usage of
+# ChaCha20-Poly1305 as specified in RFC 7905
+# (https://tools.ietf.org/html/rfc7905). The per record nonce is
+# the fixed 96 bit IV XORed with the 64 bit record sequence number,
+# left padded with zeros.
+#
+# The key and IV words are converted once per connection. The
+# nonce for a record is derived from the sequence number with a
+# few integer operations. The sequence number can not wrap, and
+# an optional limit on the number of records under one key
+# forces a rekey.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+from .utils import l2lw32
+from .aead import aead_seal_words, aead_open_words
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+MAX_SEQUENCE = 2**64 - 1
+
+
+#-------------------------------------------------------------------
+# RecordLimitError
+#
+# Raised when the sequence number is exhausted or the record
+# limit for the key is reached. The connection must be rekeyed.
+#-------------------------------------------------------------------
+class RecordLimitError(Exception):
+    pass
+
+
+#-------------------------------------------------------------------
+# RecordState
+#
+# Connection state shared by the sealer and the opener.
+# max_records limits the number of records under one key,
+# None means up to the sequence number limit. cache is set by
+# an attached KeystreamCache from precompute.py, which supplies
+# the one time key and first keystream blocks of a record.
+#-------------------------------------------------------------------
+class RecordState:
+    def __init__(self, key, iv, seq=0, max_records=None):
+        self.max_records = max_records
+        self.cache = None
+        self.rekey(key, iv, seq)
+
+
+    def rekey(self, key, iv, seq=0):
+        key = bytes(key)
+        iv = bytes(iv)
+        if len(key) != 32 or len(iv) != 12:
+            raise ValueError("Key must be 32 bytes and IV 12 bytes.")
+        self.key_words = l2lw32(list(key))
+        self.iv0 = int.from_bytes(iv[0:4], "little")
+        self.iv_tail = int.from_bytes(iv[4:12], "big")
+        self.seq = seq
+        self.records = 0
+        if self.cache is not None:
+            self.cache.invalidate()
+
+
+    def nonce_words(self, seq):
+        tail = (self.iv_tail ^ seq).to_bytes(8, "big")
+        return [self.iv0, int.from_bytes(tail[0:4], "little"),
+                int.from_bytes(tail[4:8], "little")]
+
+
+    def next_nonce(self):
+        if self.seq > MAX_SEQUENCE:
+            raise RecordLimitError("Sequence number exhausted.")
+        if self.max_records is not None and self.records >= self.max_records:
+            raise RecordLimitError("Record limit for the key reached.")
+        return self.nonce_words(self.seq)
+
+
+    def precomputed(self, keep=False):
+        if self.cache is None:
+            return None
+        if keep:
+            return self.cache.peek(self.seq)
+        return self.cache.take(self.seq)
+
+
+    def advance(self):
+        self.seq += 1
+        self.records += 1
+
+
+#-------------------------------------------------------------------
+# RecordSealer
+#
+# Seals records with consecutive sequence numbers.
+#-------------------------------------------------------------------
+class RecordSealer(RecordState):
+    def seal(self, aad, plaintext):
+        nonce = self.next_nonce()
+        result = aead_seal_words(self.key_words, nonce, aad, plaintext,
+                                 self.precomputed())
+        self.advance()
+        return result
+
+
+#-------------------------------------------------------------------
+# RecordOpener
+#
+# Opens records with consecutive sequence numbers. A record that
+# fails authentication returns None and does not advance the
+# sequence number. Its precomputed keystream is kept for the
+# real record.
+#-------------------------------------------------------------------
+class RecordOpener(RecordState):
+    def open(self, aad, ciphertext, tag, out=None):
+        nonce = self.next_nonce()
+        plaintext = aead_open_words(self.key_words, nonce, aad, ciphertext,
+                                    tag, out, self.precomputed(keep=True))
+        if plaintext is not None:
+            self.precomputed()
+            self.advance()
+        return plaintext
+
+#=======================================================================
+# EOF record.py
+#=======================================================================
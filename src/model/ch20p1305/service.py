@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# service.py
+# ----------
+# Local ChaCha20-Poly1305 seal and open service over a Unix domain
+# socket. Worker processes connect through ServiceClient, which
+# keeps a pool of persistent connections, instead of each paying
+# the interpreter and key setup cost.
+#
+# The server puts the requests from all connections into one
+# queue. The batch thread takes the first waiting request and
+# waits at most max_batch_delay seconds for more, then processes
+# up to max_batch requests together. With NumPy the keystream
+# blocks for all requests in a batch are generated in one call,
+# and all tags are computed by the batched Poly1305. Responses
+# are queued to a writer thread per connection, so a client that
+# stops reading does not stall the other connections. A client
+# with more than WRITE_QUEUE_DEPTH unsent responses is dropped.
+#
+# Protocol, all fields little endian. A request is a fixed header
+# followed by the AAD and the data (plaintext or ciphertext):
+#   op (1 byte), 3 bytes padding, request id (4 bytes),
+#   key (32 bytes), nonce (12 bytes), AAD length (4 bytes),
+#   data length (4 bytes), tag (16 bytes, zero for seal).
+# A response is a fixed header followed by the data:
+#   status (1 byte), 3 bytes padding, request id (4 bytes),
+#   data length (4 bytes), tag (16 bytes, zero for open).
+#
+# Usage: python3 -m ch20p1305.service serve --socket PATH
+#        python3 -m ch20p1305.service loadgen --socket PATH
+#                [--rates 100,200,400] [--duration 2]
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import sys
+import math
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import importlib.util
+
+from . import metrics
+from .aead import aead_seal, aead_open, aead_mac_data, tags_equal
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+OP_SEAL = 1
+OP_OPEN = 2
+
+STATUS_OK = 0
+STATUS_AUTH_FAILED = 1
+STATUS_BAD_REQUEST = 2
+
+REQUEST = struct.Struct("<BxxxI32s12sII16s")
+RESPONSE = struct.Struct("<BxxxII16s")
+NO_TAG = bytes(16)
+
+# Max AAD plus data length in a request.
+MAX_MESSAGE = 1 << 20
+
+MAX_BATCH = 64
+MAX_BATCH_DELAY = 0.002
+POOL_SIZE = 4
+
+# Interval in seconds for the accept loop to check for shutdown.
+ACCEPT_POLL = 0.1
+
+# Max number of responses waiting to be sent on a connection.
+WRITE_QUEUE_DEPTH = 256
+
+metrics.register("service_engine_errors")
+
+
+#-------------------------------------------------------------------
+# recv_exact()
+#
+# Read exactly num_bytes from the socket. Returns None if the
+# connection is closed before all bytes have arrived.
+#-------------------------------------------------------------------
+def recv_exact(sock, num_bytes):
+    buf = bytearray(num_bytes)
+    view = memoryview(buf)
+    pos = 0
+    while pos < num_bytes:
+        n = sock.recv_into(view[pos:])
+        if n == 0:
+            return None
+        pos += n
+    return buf
+
+
+#-------------------------------------------------------------------
+# process_batch_core()
+#
+# Process the requests one at a time with the core functions.
+# Returns a (status, data, tag) tuple per request.
+#-------------------------------------------------------------------
+def process_batch_core(batch):
+    results = []
+    for r in batch:
+        if r["op"] == OP_SEAL:
+            (ciphertext, tag) = aead_seal(r["key"], r["nonce"], r["aad"], r["data"])
+            results.append((STATUS_OK, bytes(ciphertext), bytes(tag)))
+        else:
+            out = bytearray(len(r["data"]))
+            if aead_open(r["key"], r["nonce"], r["aad"], r["data"], r["tag"], out) is None:
+                results.append((STATUS_AUTH_FAILED, b"", NO_TAG))
+            else:
+                results.append((STATUS_OK, bytes(out), NO_TAG))
+    return results
+
+
+#-------------------------------------------------------------------
+# process_batch_numpy()
+#
+# Process the requests in a batch with the NumPy engines. Block
+# zero of every request gives its one time Poly1305 key, the
+# following blocks its keystream. All blocks are generated in
+# one call, and all tags in one batched Poly1305 call.
+#-------------------------------------------------------------------
+def process_batch_numpy(batch):
+    import numpy as np
+    from .np_chacha import chacha_blocks_multi
+    from .np_poly1305 import poly1305_macs
+
+    keys = np.frombuffer(b"".join(r["key"] for r in batch),
+                         dtype="<u4").reshape(len(batch), 8)
+    nonces = np.frombuffer(b"".join(r["nonce"] for r in batch),
+                           dtype="<u4").reshape(len(batch), 3)
+    num_blocks = np.array([1 + (len(r["data"]) + 63) // 64 for r in batch])
+    starts = np.cumsum(num_blocks) - num_blocks
+    owner = np.repeat(np.arange(len(batch)), num_blocks)
+    counters = np.arange(int(num_blocks.sum())) - np.repeat(starts, num_blocks)
+
+    blocks = chacha_blocks_multi(keys[owner], counters, nonces[owner])
+    blocks = np.ascontiguousarray(blocks, dtype="<u4").view(np.uint8)
+
+    # Seal requests are enciphered before the MAC. Open requests
+    # are only deciphered after their tag has been verified.
+    otks = []
+    keystreams = []
+    outputs = []
+    mac_inputs = []
+    for (i, r) in enumerate(batch):
+        start = int(starts[i])
+        otks.append(blocks[start, 0 : 32].tobytes())
+        ks = blocks[start + 1 : start + int(num_blocks[i])].reshape(-1)
+        keystreams.append(ks)
+        if r["op"] == OP_SEAL:
+            data = np.frombuffer(r["data"], dtype=np.uint8)
+            out = np.bitwise_xor(data, ks[0 : len(data)]).tobytes()
+            outputs.append(out)
+            mac_inputs.append(aead_mac_data(r["aad"], out))
+        else:
+            outputs.append(None)
+            mac_inputs.append(aead_mac_data(r["aad"], r["data"]))
+    tags = poly1305_macs(otks, mac_inputs)
+
+    results = []
+    for (i, r) in enumerate(batch):
+        if r["op"] == OP_SEAL:
+            if metrics.ENABLED:
+                metrics.count("aead_seals")
+            results.append((STATUS_OK, outputs[i], bytes(tags[i])))
+            continue
+        if metrics.ENABLED:
+            metrics.count("aead_opens")
+        if tags_equal(r["tag"], tags[i]):
+            data = np.frombuffer(r["data"], dtype=np.uint8)
+            out = np.bitwise_xor(data, keystreams[i][0 : len(data)]).tobytes()
+            results.append((STATUS_OK, out, NO_TAG))
+        else:
+            if metrics.ENABLED:
+                metrics.count("aead_open_failures")
+            results.append((STATUS_AUTH_FAILED, b"", NO_TAG))
+    return results
+
+
+#-------------------------------------------------------------------
+# load_engine()
+#
+# Return the batch processing function, the NumPy engine if
+# NumPy is available, otherwise the core.
+#-------------------------------------------------------------------
+def load_engine():
+    if importlib.util.find_spec("numpy") is not None:
+        return process_batch_numpy
+    return process_batch_core
+
+
+#-------------------------------------------------------------------
+# Connection
+#
+# A client connection of the server. Responses are sent by a
+# writer thread from a bounded queue. The writer closes the
+# socket when the reader has finished and all responses for the
+# requests read have been sent, or when sending fails.
+#-------------------------------------------------------------------
+class Connection:
+    def __init__(self, sock, depth=WRITE_QUEUE_DEPTH):
+        self.sock = sock
+        self.responses = queue.Queue(depth)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.reading = True
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+
+    def write_loop(self):
+        try:
+            while True:
+                response = self.responses.get()
+                if response is None:
+                    break
+                self.sock.sendall(response)
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+
+    def abort(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+    def add_request(self):
+        with self.lock:
+            self.pending += 1
+
+
+    def send(self, response):
+        try:
+            self.responses.put_nowait(response)
+        except queue.Full:
+            # The client is not reading, drop it. The writer fails
+            # in sendall() and the reader in recv().
+            self.abort()
+
+
+    def respond(self, response):
+        self.send(response)
+        with self.lock:
+            self.pending -= 1
+            done = not self.reading and self.pending == 0
+        if done:
+            self.send(None)
+
+
+    def end_reading(self):
+        with self.lock:
+            self.reading = False
+            done = self.pending == 0
+        if done:
+            self.send(None)
+
+
+#-------------------------------------------------------------------
+# BatchServer
+#
+# The seal and open service. start() binds the socket and starts
+# the accept and batch threads, close() stops them. batches and
+# batched_requests count the processed batches and requests.
+# If the engine raises an exception, all requests in the batch
+# are answered with STATUS_BAD_REQUEST.
+#-------------------------------------------------------------------
+class BatchServer:
+    def __init__(self, path, max_batch=MAX_BATCH, max_batch_delay=MAX_BATCH_DELAY,
+                 engine=None):
+        if max_batch < 1:
+            raise ValueError("Max batch size must be at least 1.")
+        self.path = path
+        self.max_batch = max_batch
+        self.max_batch_delay = max_batch_delay
+        self.engine = engine or load_engine()
+        self.requests = queue.Queue()
+        self.connections = set()
+        self.running = False
+        self.batches = 0
+        self.batched_requests = 0
+
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(128)
+        self.listener.settimeout(ACCEPT_POLL)
+        self.running = True
+
+        self.accept_thread = threading.Thread(target=self.accept_loop, daemon=True)
+        self.batch_thread = threading.Thread(target=self.batch_loop, daemon=True)
+        self.accept_thread.start()
+        self.batch_thread.start()
+        return self
+
+
+    def close(self):
+        self.running = False
+        self.accept_thread.join()
+        self.listener.close()
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.requests.put(None)
+        self.batch_thread.join()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                (conn, address) = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.settimeout(None)
+            self.connections.add(conn)
+            threading.Thread(target=self.read_loop, args=(Connection(conn),),
+                             daemon=True).start()
+
+
+    def read_loop(self, connection):
+        conn = connection.sock
+        try:
+            while True:
+                header = recv_exact(conn, REQUEST.size)
+                if header is None:
+                    break
+                (op, request_id, key, nonce, aad_len, data_len, tag) = \
+                    REQUEST.unpack(header)
+                if op not in (OP_SEAL, OP_OPEN) or aad_len + data_len > MAX_MESSAGE:
+                    # The stream can not be resynchronized, give up.
+                    connection.send(RESPONSE.pack(STATUS_BAD_REQUEST, request_id,
+                                                  0, NO_TAG))
+                    break
+                body = recv_exact(conn, aad_len + data_len)
+                if body is None:
+                    break
+                connection.add_request()
+                self.requests.put({"conn": connection, "id": request_id,
+                                   "op": op, "key": key, "nonce": nonce,
+                                   "aad": bytes(body[0 : aad_len]),
+                                   "data": bytes(body[aad_len:]), "tag": tag})
+        except OSError:
+            pass
+        finally:
+            self.connections.discard(conn)
+            connection.end_reading()
+
+
+    def next_batch(self):
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_batch_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    request = self.requests.get(timeout=remaining)
+                else:
+                    request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+
+    def batch_loop(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            try:
+                results = self.engine(batch)
+            except Exception:
+                if metrics.ENABLED:
+                    metrics.count("service_engine_errors")
+                results = [(STATUS_BAD_REQUEST, b"", NO_TAG)] * len(batch)
+            self.batches += 1
+            self.batched_requests += len(batch)
+            for (r, (status, data, tag)) in zip(batch, results):
+                response = RESPONSE.pack(status, r["id"], len(data), tag) + data
+                r["conn"].respond(response)
+
+
+#-------------------------------------------------------------------
+# ServiceClient
+#
+# Client for the service. Connections are kept open and reused,
+# at most pool_size idle connections are kept. The client can be
+# used from many threads, each call uses its own connection.
+#-------------------------------------------------------------------
+class ServiceClient:
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+
+    def acquire(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            return sock
+
+
+    def release(self, sock):
+        if self.pool.qsize() < self.pool_size:
+            self.pool.put(sock)
+        else:
+            sock.close()
+
+
+    def request(self, op, key, nonce, aad, data, tag=NO_TAG):
+        key = bytes(key)
+        nonce = bytes(nonce)
+        if len(key) != 32 or len(nonce) != 12:
+            raise ValueError("Key must be 32 bytes and nonce 12 bytes.")
+        aad = bytes(aad)
+        data = bytes(data)
+        with self.lock:
+            request_id = self.next_id
+            self.next_id = (self.next_id + 1) & 0xffffffff
+
+        sock = self.acquire()
+        try:
+            sock.sendall(REQUEST.pack(op, request_id, key, nonce, len(aad),
+                                      len(data), bytes(tag)) + aad + data)
+            header = recv_exact(sock, RESPONSE.size)
+            if header is None:
+                raise ConnectionError("Connection closed by the service.")
+            (status, response_id, data_len, tag) = RESPONSE.unpack(header)
+            body = recv_exact(sock, data_len)
+            if body is None or response_id != request_id:
+                raise ConnectionError("Incorrect response from the service.")
+        except BaseException:
+            sock.close()
+            raise
+        self.release(sock)
+        if status == STATUS_BAD_REQUEST:
+            raise ValueError("Request rejected by the service.")
+        return (status, bytes(body), tag)
+
+
+    def seal(self, key, nonce, aad, plaintext):
+        (status, ciphertext, tag) = self.request(OP_SEAL, key, nonce, aad, plaintext)
+        return (ciphertext, tag)
+
+
+    def open(self, key, nonce, aad, ciphertext, tag):
+        (status, plaintext, no_tag) = self.request(OP_OPEN, key, nonce, aad,
+                                                   ciphertext, tag)
+        if status != STATUS_OK:
+            return None
+        return plaintext
+
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+#-------------------------------------------------------------------
+# percentile()
+#
+# Nearest rank percentile of the given values.
+#-------------------------------------------------------------------
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+#-------------------------------------------------------------------
+# load_test()
+#
+# Send seal requests to the service at a fixed rate for the given
+# time from a number of client threads. Latency is measured from
+# the time each request was scheduled, so requests delayed by a
+# slow service are not left out. Returns the achieved request
+# rate and the p50 and p99 latency in seconds.
+#-------------------------------------------------------------------
+def load_test(path, rate, duration, message_size=256, concurrency=16):
+    client = ServiceClient(path, concurrency)
+    key = os.urandom(32)
+    aad = os.urandom(12)
+    plaintext = os.urandom(message_size)
+    num_requests = max(1, int(rate * duration))
+
+    latencies = []
+    lock = threading.Lock()
+    issued = [0]
+    start = time.perf_counter() + 0.01
+
+    def worker():
+        while True:
+            with lock:
+                i = issued[0]
+                issued[0] += 1
+            if i >= num_requests:
+                return
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            client.seal(key, i.to_bytes(12, "little"), aad, plaintext)
+            latencies.append(time.perf_counter() - scheduled)
+
+    threads = [threading.Thread(target=worker) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    client.close()
+
+    return {"rate": rate, "requests": num_requests,
+            "achieved": num_requests / elapsed,
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99)}
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local seal and open service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the service.")
+    serve.add_argument("--socket", required=True, help="Unix socket path.")
+    serve.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                       help="Max number of requests in a batch.")
+    serve.add_argument("--max-batch-delay", type=float, default=MAX_BATCH_DELAY,
+                       help="Max time in seconds to wait for a batch to fill.")
+
+    loadgen = commands.add_parser("loadgen", help="Run the load generator.")
+    loadgen.add_argument("--socket", required=True, help="Unix socket path.")
+    loadgen.add_argument("--rates", default="100,200,400,800",
+                         help="Comma separated request rates per second.")
+    loadgen.add_argument("--duration", type=float, default=2.0,
+                         help="Time in seconds per rate.")
+    loadgen.add_argument("--size", type=int, default=256,
+                         help="Plaintext size in bytes.")
+    loadgen.add_argument("--concurrency", type=int, default=16,
+                         help="Number of client threads.")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = BatchServer(args.socket, args.max_batch, args.max_batch_delay)
+        server.start()
+        print("Serving on %s." % args.socket)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        server.close()
+        print("%d requests in %d batches." %
+              (server.batched_requests, server.batches))
+        return 0
+
+    print("%10s %10s %10s %10s" % ("rate", "achieved", "p50 ms", "p99 ms"))
+    for rate in [float(r) for r in args.rates.split(",")]:
+        result = load_test(args.socket, rate, args.duration, args.size,
+                           args.concurrency)
+        print("%10.0f %10.0f %10.3f %10.3f" %
+              (rate, result["achieved"], result["p50"] * 1000,
+               result["p99"] * 1000))
+    return 0
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF service.py
+#=======================================================================
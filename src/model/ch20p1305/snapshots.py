@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# snapshots.py
+# ------------
+# Round snapshot store used to localize mismatches between the
+# RTL and the model. The model records the ChaCha state after
+# initialization, after every quarterround and after the final
+# addition for every block in a run. The states are stored in a
+# compact binary file with fixed size records, so any state can
+# be found from its (vector, block, step) key by arithmetic.
+#
+# A simulator dump, either a store file or a text file, is then
+# compared against the model store to find the first diverging
+# step and word. The records of the dump are compared with the
+# model records in bulk, a whole vector at a time for a store
+# dump, and the first differing byte gives the first diverging
+# state. Every block starts from the key, counter and nonce, so
+# no assumption is made that a wrong state stays wrong.
+#
+# Steps in a block:
+#   0      State after init.
+#   1-80   State after quarterround q (1-8) in doubleround d (1-10),
+#          step = 8 * (d - 1) + q. Step 8 * d is the state after
+#          doubleround d.
+#   81     State after the final addition.
+#
+# Text dump format, one state per line, words in hex:
+#   <vector> <block> <step> <w0> <w1> ... <w15>
+# Empty lines and lines starting with # are ignored.
+#
+# Store file format, all fields little endian:
+#   Header:  magic "CHRS", version u32, steps per block u32.
+#   Records: 16 u32 words per state, in (vector, block, step) order.
+#   Index:   per vector: vector id u32, first record block u64,
+#            first block counter u32, number of blocks u32.
+#   Footer:  number of vectors u32, index offset u64, magic "CHRS".
+#
+# Usage:
+#   python3 -m ch20p1305.snapshots record OUT --key HEX --nonce HEX
+#                                  [--counter N] [--blocks N] [--vector ID]
+#   python3 -m ch20p1305.snapshots compare MODEL DUMP
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import mmap
+import struct
+import argparse
+
+from .utils import l2lw32
+from .chacha import qr, NUM_DOUBLEROUNDS
+from .compare import first_mismatch
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+MAGIC = b"CHRS"
+VERSION = 1
+
+# The quarterrounds in a doubleround, as in doubleround().
+QR_ORDER = [(0, 4, 8,12), (1, 5, 9,13), (2, 6,10,14), (3, 7,11,15),
+            (0, 5,10,15), (1, 6,11,12), (2, 7, 8,13), (3, 4, 9,14)]
+
+STEPS = 2 + NUM_DOUBLEROUNDS * len(QR_ORDER)
+FINAL_STEP = STEPS - 1
+
+STATE = struct.Struct("<16I")
+HEADER = struct.Struct("<4sII")
+INDEX_ENTRY = struct.Struct("<IQII")
+FOOTER = struct.Struct("<IQ4s")
+
+
+#-------------------------------------------------------------------
+# step_name()
+#
+# Return a readable name for the given step.
+#-------------------------------------------------------------------
+def step_name(step):
+    if step == 0:
+        return "init"
+    if step == FINAL_STEP:
+        return "final addition"
+    dr = (step - 1) // len(QR_ORDER) + 1
+    qrn = (step - 1) % len(QR_ORDER) + 1
+    return "doubleround %d quarterround %d" % (dr, qrn)
+
+
+#-------------------------------------------------------------------
+# trace_block()
+#
+# The ChaCha block function recording the state for every step.
+# Returns a list of STEPS states. Key and nonce are given as
+# lists of words.
+#-------------------------------------------------------------------
+def trace_block(key, counter, nonce):
+    state = [0x61707865, 0x3320646e, 0x79622d32, 0x6b206574,
+                 key[0],     key[1],     key[2],     key[3],
+                 key[4],     key[5],     key[6],     key[7],
+                counter,   nonce[0],   nonce[1],   nonce[2]]
+
+    trace = [tuple(state)]
+    x = state[:]
+    for i in range(NUM_DOUBLEROUNDS):
+        for (a, b, c, d) in QR_ORDER:
+            (x[a], x[b], x[c], x[d]) = qr(x[a], x[b], x[c], x[d])
+            trace.append(tuple(x))
+    trace.append(tuple((state[i] + x[i]) & 0xffffffff for i in range(16)))
+    return trace
+
+
+#-------------------------------------------------------------------
+# write_store()
+#
+# Record the given runs into a store file. Each run is a tuple
+# (vector id, key words, first counter, nonce words, number of
+# blocks). The records are written as they are generated.
+#-------------------------------------------------------------------
+def write_store(path, runs):
+    index = []
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, STEPS))
+        block_ctr = 0
+        for (vector, key, counter, nonce, num_blocks) in runs:
+            index.append((vector, block_ctr, counter, num_blocks))
+            for block in range(counter, counter + num_blocks):
+                f.write(b"".join(STATE.pack(*s)
+                                 for s in trace_block(key, block, nonce)))
+            block_ctr += num_blocks
+
+        index_offset = f.tell()
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        f.write(FOOTER.pack(len(index), index_offset, MAGIC))
+
+
+#-------------------------------------------------------------------
+# SnapshotStore
+#
+# Read access to a store file through mmap. The records are
+# addressed by (vector, block, step), where block is the block
+# counter value, or by the record number in the file. As a dump
+# the records of each vector are one segment.
+#-------------------------------------------------------------------
+class SnapshotStore:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, steps) = HEADER.unpack_from(self.mm, 0)
+        (num_vectors, index_offset, end_magic) = \
+            FOOTER.unpack_from(self.mm, len(self.mm) - FOOTER.size)
+        if magic != MAGIC or end_magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a snapshot store." % path)
+        if steps != STEPS:
+            raise ValueError("Store has %d steps per block, expected %d." %
+                             (steps, STEPS))
+
+        # Per vector: (first record block, first counter, blocks).
+        self.vectors = {}
+        self.blocks = []
+        for i in range(num_vectors):
+            (vector, first, counter, num_blocks) = \
+                INDEX_ENTRY.unpack_from(self.mm, index_offset + i * INDEX_ENTRY.size)
+            self.vectors[vector] = (first, counter, num_blocks)
+            self.blocks.append((first, vector, counter))
+        self.num_blocks = sum(v[2] for v in self.vectors.values())
+
+
+    def close(self):
+        self.mm.close()
+
+
+    def offset(self, vector, block, step):
+        (first, counter, num_blocks) = self.vectors[vector]
+        if not (counter <= block < counter + num_blocks and 0 <= step < STEPS):
+            raise KeyError((vector, block, step))
+        record = (first + block - counter) * STEPS + step
+        return HEADER.size + record * STATE.size
+
+
+    def raw(self, vector, block, step):
+        offset = self.offset(vector, block, step)
+        return self.mm[offset : offset + STATE.size]
+
+
+    def state(self, vector, block, step):
+        return STATE.unpack_from(self.mm, self.offset(vector, block, step))
+
+
+    def num_records(self):
+        return self.num_blocks * STEPS
+
+
+    def key_at(self, i):
+        record_block = i // STEPS
+        lo = 0
+        hi = len(self.blocks)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.blocks[mid][0] <= record_block:
+                lo = mid
+            else:
+                hi = mid
+        (first, vector, counter) = self.blocks[lo]
+        return (vector, counter + record_block - first, i % STEPS)
+
+
+    def raw_at(self, i):
+        offset = HEADER.size + i * STATE.size
+        return self.mm[offset : offset + STATE.size]
+
+
+    def raw_range(self, lo, hi):
+        return memoryview(self.mm)[HEADER.size + lo * STATE.size :
+                                   HEADER.size + hi * STATE.size]
+
+
+    def segments(self):
+        for (first, vector, counter) in self.blocks:
+            num_blocks = self.vectors[vector][2]
+            yield (first * STEPS, (first + num_blocks) * STEPS)
+
+
+#-------------------------------------------------------------------
+# TextDump
+#
+# A simulator dump in the text format, sorted by key. Any subset
+# of the steps can be given. Every block is a segment.
+#-------------------------------------------------------------------
+class TextDump:
+    def __init__(self, path):
+        records = []
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if not fields or fields[0].startswith("#"):
+                    continue
+                if len(fields) != 19:
+                    raise ValueError("Malformed dump line: %s" % line.strip())
+                key = (int(fields[0]), int(fields[1]), int(fields[2]))
+                words = [int(w, 16) for w in fields[3:]]
+                records.append((key, STATE.pack(*words)))
+        records.sort()
+        self.keys = [r[0] for r in records]
+        self.raws = [r[1] for r in records]
+
+
+    def num_records(self):
+        return len(self.keys)
+
+
+    def key_at(self, i):
+        return self.keys[i]
+
+
+    def raw_at(self, i):
+        return self.raws[i]
+
+
+    def raw_range(self, lo, hi):
+        return b"".join(self.raws[lo : hi])
+
+
+    def segments(self):
+        lo = 0
+        for i in range(1, len(self.keys) + 1):
+            if i == len(self.keys) or self.keys[i][0:2] != self.keys[lo][0:2]:
+                yield (lo, i)
+                lo = i
+
+
+#-------------------------------------------------------------------
+# load_dump()
+#
+# Load a simulator dump, either a store file or a text dump.
+#-------------------------------------------------------------------
+def load_dump(path):
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return SnapshotStore(path)
+    return TextDump(path)
+
+
+#-------------------------------------------------------------------
+# model_range()
+#
+# Return the model records for the dump records [lo, hi). If the
+# keys are consecutive in the model the records are a view of
+# the store, otherwise they are collected one by one. Raises
+# KeyError if a key is not in the model.
+#-------------------------------------------------------------------
+def model_range(model, dump, lo, hi):
+    first = model.offset(*dump.key_at(lo))
+    last = model.offset(*dump.key_at(hi - 1))
+    if last - first == (hi - 1 - lo) * STATE.size:
+        return memoryview(model.mm)[first : last + STATE.size]
+    return b"".join(model.raw(*dump.key_at(i)) for i in range(lo, hi))
+
+
+#-------------------------------------------------------------------
+# missing_key()
+#
+# Return the index of the first dump record in [lo, hi) with a
+# key that is not in the model, or None.
+#-------------------------------------------------------------------
+def missing_key(model, dump, lo, hi):
+    for i in range(lo, hi):
+        try:
+            model.offset(*dump.key_at(i))
+        except KeyError:
+            return i
+    return None
+
+
+#-------------------------------------------------------------------
+# first_divergence()
+#
+# Find the first state in the dump that differs from the model.
+# Every segment of the dump is compared in bulk with the model
+# records for the same keys, and the first differing byte gives
+# the first diverging state. A key that is not in the model is
+# a divergence at that key.
+#
+# Returns None if no divergence is found, otherwise a dict with
+# the key, step name, first diverging word and the words. For a
+# key missing in the model, missing is True and expected and
+# word are None.
+#-------------------------------------------------------------------
+def first_divergence(model, dump):
+    for (lo, hi) in dump.segments():
+        missing = None
+        try:
+            expected = model_range(model, dump, lo, hi)
+        except KeyError:
+            missing = missing_key(model, dump, lo, hi)
+            hi = missing
+            expected = model_range(model, dump, lo, hi) if lo < hi else b""
+
+        pos = first_mismatch(dump.raw_range(lo, hi), expected)
+        if pos is not None:
+            return divergence(model, dump, lo + pos // STATE.size)
+        if missing is not None:
+            (vector, block, step) = dump.key_at(missing)
+            return {"vector": vector, "block": block, "step": step,
+                    "step_name": step_name(step), "word": None,
+                    "missing": True, "expected": None,
+                    "actual": STATE.unpack(dump.raw_at(missing))}
+    return None
+
+
+#-------------------------------------------------------------------
+# divergence()
+#
+# Return the divergence dict for dump record i.
+#-------------------------------------------------------------------
+def divergence(model, dump, i):
+    (vector, block, step) = dump.key_at(i)
+    expected = model.state(vector, block, step)
+    actual = STATE.unpack(dump.raw_at(i))
+    word = min(w for w in range(16) if expected[w] != actual[w])
+    return {"vector": vector, "block": block, "step": step,
+            "step_name": step_name(step), "word": word, "missing": False,
+            "expected": expected, "actual": actual}
+
+
+#-------------------------------------------------------------------
+# main()
+#-------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ChaCha round snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Record a model store.")
+    rec.add_argument("store")
+    rec.add_argument("--key", required=True, help="32 byte key in hex.")
+    rec.add_argument("--nonce", required=True, help="12 byte nonce in hex.")
+    rec.add_argument("--counter", type=int, default=0)
+    rec.add_argument("--blocks", type=int, default=1)
+    rec.add_argument("--vector", type=int, default=0)
+
+    cmp = sub.add_parser("compare", help="Compare a dump with a model store.")
+    cmp.add_argument("model")
+    cmp.add_argument("dump")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        key = l2lw32(list(bytes.fromhex(args.key)))
+        nonce = l2lw32(list(bytes.fromhex(args.nonce)))
+        write_store(args.store, [(args.vector, key, args.counter, nonce,
+                                  args.blocks)])
+        return 0
+
+    d = first_divergence(SnapshotStore(args.model), load_dump(args.dump))
+    if d is None:
+        print("No divergence found.")
+        return 0
+    if d["missing"]:
+        print("First divergence: vector %d, block %d, step %d (%s) not in model." %
+              (d["vector"], d["block"], d["step"], d["step_name"]))
+        return 1
+    print("First divergence: vector %d, block %d, step %d (%s), word %d." %
+          (d["vector"], d["block"], d["step"], d["step_name"], d["word"]))
+    print("Expected: " + " ".join("%08x" % w for w in d["expected"]))
+    print("Actual:   " + " ".join("%08x" % w for w in d["actual"]))
+    return 1
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF snapshots.py
+#=======================================================================
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# swar_chacha.py
+# --------------
+# Pure Python multi block ChaCha20 using SIMD within a register
+# (SWAR). The same state word of LANES independent blocks is
+# packed into one Python integer, with each 32 bit word in a 64 bit
+# lane. The upper 32 bits of each lane are guard bits that catch
+# the carries from additions and the bits shifted out by rotations.
+# They are cleared with one mask per operation, so one evaluation
+# of the quarterround advances all lanes.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import struct
+from . import metrics
+from .chacha import counter_nonce_words, check_counter
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+NUM_DOUBLEROUNDS = 10
+LANE_BITS = 64
+DEFAULT_LANES = 4
+
+SIGMA = [0x61707865, 0x3320646e, 0x79622d32, 0x6b206574]
+
+
+#-------------------------------------------------------------------
+# lane_constants()
+#
+# Return the replication constant, with a one in the lowest bit
+# of every lane, and the mask that clears the guard bits.
+#-------------------------------------------------------------------
+def lane_constants(lanes):
+    rep = 0
+    for i in range(lanes):
+        rep |= 1 << (i * LANE_BITS)
+    return (rep, rep * 0xffffffff)
+
+
+#-------------------------------------------------------------------
+# chacha_blocks()
+#
+# Generate lanes consecutive ChaCha blocks starting at the given
+# counter. Key and nonce are given as lists of words. A nonce of
+# two words selects the 64 bit counter layout. Returns the
+# keystream for the blocks as bytes. Raises ValueError if the
+# first num_blocks blocks, default all lanes, do not fit in the
+# counter. The remaining lanes are computed but not used.
+#-------------------------------------------------------------------
+def chacha_blocks(key, counter, nonce, lanes=DEFAULT_LANES, num_blocks=None):
+    check_counter(counter, nonce, lanes if num_blocks is None else num_blocks)
+    (rep, m) = lane_constants(lanes)
+    pack = struct.Struct("<%dQ" % lanes)
+
+    # The counter and nonce words differ per lane only in the
+    # counter, and in the nonce when a 64 bit counter carries.
+    rows = [counter_nonce_words(counter + i, nonce) for i in range(lanes)]
+    state = [w * rep for w in SIGMA + list(key)]
+    state += [int.from_bytes(pack.pack(*[row[j] for row in rows]), "little")
+              for j in range(4)]
+
+    if metrics.ENABLED:
+        metrics.count("chacha_blocks", lanes)
+
+    (x0, x1, x2, x3, x4, x5, x6, x7,
+     x8, x9, x10, x11, x12, x13, x14, x15) = state
+
+    for i in range(NUM_DOUBLEROUNDS):
+        # Column rounds.
+        x0 = (x0 + x4) & m; x12 ^= x0; x12 = ((x12 << 16) | (x12 >> 16)) & m
+        x8 = (x8 + x12) & m; x4 ^= x8; x4 = ((x4 << 12) | (x4 >> 20)) & m
+        x0 = (x0 + x4) & m; x12 ^= x0; x12 = ((x12 << 8) | (x12 >> 24)) & m
+        x8 = (x8 + x12) & m; x4 ^= x8; x4 = ((x4 << 7) | (x4 >> 25)) & m
+
+        x1 = (x1 + x5) & m; x13 ^= x1; x13 = ((x13 << 16) | (x13 >> 16)) & m
+        x9 = (x9 + x13) & m; x5 ^= x9; x5 = ((x5 << 12) | (x5 >> 20)) & m
+        x1 = (x1 + x5) & m; x13 ^= x1; x13 = ((x13 << 8) | (x13 >> 24)) & m
+        x9 = (x9 + x13) & m; x5 ^= x9; x5 = ((x5 << 7) | (x5 >> 25)) & m
+
+        x2 = (x2 + x6) & m; x14 ^= x2; x14 = ((x14 << 16) | (x14 >> 16)) & m
+        x10 = (x10 + x14) & m; x6 ^= x10; x6 = ((x6 << 12) | (x6 >> 20)) & m
+        x2 = (x2 + x6) & m; x14 ^= x2; x14 = ((x14 << 8) | (x14 >> 24)) & m
+        x10 = (x10 + x14) & m; x6 ^= x10; x6 = ((x6 << 7) | (x6 >> 25)) & m
+
+        x3 = (x3 + x7) & m; x15 ^= x3; x15 = ((x15 << 16) | (x15 >> 16)) & m
+        x11 = (x11 + x15) & m; x7 ^= x11; x7 = ((x7 << 12) | (x7 >> 20)) & m
+        x3 = (x3 + x7) & m; x15 ^= x3; x15 = ((x15 << 8) | (x15 >> 24)) & m
+        x11 = (x11 + x15) & m; x7 ^= x11; x7 = ((x7 << 7) | (x7 >> 25)) & m
+
+        # Diagonal rounds.
+        x0 = (x0 + x5) & m; x15 ^= x0; x15 = ((x15 << 16) | (x15 >> 16)) & m
+        x10 = (x10 + x15) & m; x5 ^= x10; x5 = ((x5 << 12) | (x5 >> 20)) & m
+        x0 = (x0 + x5) & m; x15 ^= x0; x15 = ((x15 << 8) | (x15 >> 24)) & m
+        x10 = (x10 + x15) & m; x5 ^= x10; x5 = ((x5 << 7) | (x5 >> 25)) & m
+
+        x1 = (x1 + x6) & m; x12 ^= x1; x12 = ((x12 << 16) | (x12 >> 16)) & m
+        x11 = (x11 + x12) & m; x6 ^= x11; x6 = ((x6 << 12) | (x6 >> 20)) & m
+        x1 = (x1 + x6) & m; x12 ^= x1; x12 = ((x12 << 8) | (x12 >> 24)) & m
+        x11 = (x11 + x12) & m; x6 ^= x11; x6 = ((x6 << 7) | (x6 >> 25)) & m
+
+        x2 = (x2 + x7) & m; x13 ^= x2; x13 = ((x13 << 16) | (x13 >> 16)) & m
+        x8 = (x8 + x13) & m; x7 ^= x8; x7 = ((x7 << 12) | (x7 >> 20)) & m
+        x2 = (x2 + x7) & m; x13 ^= x2; x13 = ((x13 << 8) | (x13 >> 24)) & m
+        x8 = (x8 + x13) & m; x7 ^= x8; x7 = ((x7 << 7) | (x7 >> 25)) & m
+
+        x3 = (x3 + x4) & m; x14 ^= x3; x14 = ((x14 << 16) | (x14 >> 16)) & m
+        x9 = (x9 + x14) & m; x4 ^= x9; x4 = ((x4 << 12) | (x4 >> 20)) & m
+        x3 = (x3 + x4) & m; x14 ^= x3; x14 = ((x14 << 8) | (x14 >> 24)) & m
+        x9 = (x9 + x14) & m; x4 ^= x9; x4 = ((x4 << 7) | (x4 >> 25)) & m
+
+    working_state = [x0, x1, x2, x3, x4, x5, x6, x7,
+                     x8, x9, x10, x11, x12, x13, x14, x15]
+
+    # Final addition, then transpose the lanes into blocks.
+    num_bytes = lanes * LANE_BITS // 8
+    words = [pack.unpack(((state[i] + working_state[i]) & m).to_bytes(num_bytes, "little"))
+             for i in range(16)]
+    block = struct.Struct("<16I")
+    return b"".join(block.pack(*[w[lane] for w in words])
+                    for lane in range(lanes))
+
+
+#-------------------------------------------------------------------
+# keystream()
+#
+# Return num_bytes of keystream starting at the given counter.
+#-------------------------------------------------------------------
+def keystream(key, counter, nonce, num_bytes, lanes=DEFAULT_LANES):
+    num_blocks = (num_bytes + 63) // 64
+    chunks = []
+    for block in range(0, num_blocks, lanes):
+        chunks.append(chacha_blocks(key, counter + block, nonce, lanes,
+                                    min(lanes, num_blocks - block)))
+    return b"".join(chunks)[0 : num_bytes]
+
+
+#-------------------------------------------------------------------
+# chacha_xor()
+#
+# Encipher or decipher the given data with the ChaCha20 keystream
+# starting at the given counter. The result is written into out,
+# which must be a mutable sequence of bytes at least as long as
+# the data.
+#-------------------------------------------------------------------
+def chacha_xor(key, counter, nonce, data, out, lanes=DEFAULT_LANES):
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+    n = len(data)
+    ks = keystream(key, counter, nonce, n, lanes)
+    x = int.from_bytes(data, "little") ^ int.from_bytes(ks, "little")
+    out[0 : n] = x.to_bytes(n, "little")
+    if metrics.ENABLED:
+        metrics.count("xor_bytes", n)
+    return out
+
+#=======================================================================
+# EOF swar_chacha.py
+#=======================================================================
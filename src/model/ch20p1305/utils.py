@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# utils.py
+# --------
+# Word and byte conversion functions used by the ChaCha20,
+# Poly1305 and ChaCha20-Poly1305 core.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must rettain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# rotl()
+#
+# Rotate 32-bit operand giveb number of bits left.
+#-------------------------------------------------------------------
+def rotl(op, bits):
+    assert bits < 33
+    return ((op << bits) + (op >> (32 - bits))) & 0xffffffff
+
+
+#-------------------------------------------------------------------
+# w32bl()
+#
+# Convert a given list of 32-bit little endian words to a
+# list of bytes.
+#-------------------------------------------------------------------
+def w32bl(wlist):
+    blists = [[(w & 0xff), ((w >> 8) & 0xff), ((w >> 16) & 0xff),
+                   (w >> 24)] for w in wlist]
+    merged_blist = []
+    for chunk in blists:
+        merged_blist.append(chunk[0])
+        merged_blist.append(chunk[1])
+        merged_blist.append(chunk[2])
+        merged_blist.append(chunk[3])
+    return merged_blist
+
+
+#-------------------------------------------------------------------
+# l2lw32()
+#
+# Convert a given list of bytes to list of little endian
+# 32-bit endian words.
+#-------------------------------------------------------------------
+def l2lw32(bytelist):
+    num_words = int(len(bytelist) / 4)
+    chunks = [bytelist[(i * 4) : (i*4 + 4)] for i in range(num_words)]
+    return [((b[3] << 24) + (b[2] << 16) + (b[1] << 8) + b[0]) for b in chunks]
+
+
+#-------------------------------------------------------------------
+# byteview()
+#
+# Return a memoryview of the given data as a flat sequence of
+# bytes. Objects with the buffer protocol, for example arrays of
+# words, are viewed in place and stay writable. Lists of bytes
+# are converted.
+#-------------------------------------------------------------------
+def byteview(data):
+    try:
+        view = memoryview(data)
+    except TypeError:
+        view = memoryview(bytes(data))
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
+
+#=======================================================================
+# EOF utils.py
+#=======================================================================
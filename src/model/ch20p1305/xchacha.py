@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# xchacha.py
+# ----------
+# XChaCha20 and XChaCha20-Poly1305 with 192 bit nonces, as
+# specified in draft-irtf-cfrg-xchacha. The first 128 bits of
+# the nonce and the key give a subkey with HChaCha20. The last
+# 64 bits of the nonce, prefixed with four zero bytes, are the
+# nonce used with the subkey. Random nonces can then be used
+# with one long lived key without coordinating counters.
+#
+# The subkey and nonce are given as lists of words, so any of
+# the ChaCha20 engines with the chacha_xor() calling convention
+# can be used for the keystream.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+from .utils import l2lw32
+from .chacha import hchacha20
+from .aead import chacha_xor, aead_seal_words, aead_open_words
+
+
+#-------------------------------------------------------------------
+# xchacha_key_nonce()
+#
+# Given a 32 byte key and a 24 byte nonce, return the subkey
+# and the 96 bit nonce as lists of words.
+#-------------------------------------------------------------------
+def xchacha_key_nonce(key, nonce):
+    key = bytes(key)
+    nonce = bytes(nonce)
+    if len(key) != 32:
+        raise ValueError("Key must be 32 bytes.")
+    if len(nonce) != 24:
+        raise ValueError("Nonce must be 24 bytes.")
+    subkey = hchacha20(l2lw32(list(key)), l2lw32(list(nonce[0 : 16])))
+    return (subkey, [0] + l2lw32(list(nonce[16 : 24])))
+
+
+#-------------------------------------------------------------------
+# xchacha20_xor()
+#
+# Encipher or decipher data into out with XChaCha20 starting at
+# the given block counter. xor is the ChaCha20 engine to use,
+# the big integer core by default.
+#-------------------------------------------------------------------
+def xchacha20_xor(key, nonce, data, out, counter=0, xor=chacha_xor):
+    (subkey, subnonce) = xchacha_key_nonce(key, nonce)
+    return xor(subkey, counter, subnonce, data, out)
+
+
+#-------------------------------------------------------------------
+# xchacha_seal()
+#
+# XChaCha20-Poly1305 version of aead_seal(). Returns the
+# ciphertext and the 16 byte tag as lists of bytes.
+#-------------------------------------------------------------------
+def xchacha_seal(key, nonce, aad, plaintext):
+    (subkey, subnonce) = xchacha_key_nonce(key, nonce)
+    return aead_seal_words(subkey, subnonce, aad, plaintext)
+
+
+#-------------------------------------------------------------------
+# xchacha_open()
+#
+# XChaCha20-Poly1305 version of aead_open(). Returns the
+# plaintext, or None if the tag is incorrect.
+#-------------------------------------------------------------------
+def xchacha_open(key, nonce, aad, ciphertext, tag, out=None):
+    (subkey, subnonce) = xchacha_key_nonce(key, nonce)
+    return aead_open_words(subkey, subnonce, aad, ciphertext, tag, out)
+
+#=======================================================================
+# EOF xchacha.py
+#=======================================================================
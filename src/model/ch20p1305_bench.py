@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# ch20p1305_bench.py
+# ------------------
+# Simple benchmarks of the ChaCha20, Poly1305 and ChaCha20-Poly1305
+# models. Used to compare different implementations of the same
+# functionality. All implementations are checked against each other
+# before they are timed.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import time
+from ch20p1305_utils import *
+from ch20p1305.poly1305 import *
+from ch20p1305.aead import *
+from ch20p1305 import swar_chacha
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+BENCH_REPEATS = 5
+
+
+#-------------------------------------------------------------------
+# time_function()
+#
+# Call the given function with the given arguments a number of
+# times and return the best time in seconds.
+#-------------------------------------------------------------------
+def time_function(func, *args):
+    best = None
+    for i in range(BENCH_REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+#-------------------------------------------------------------------
+# print_result()
+#
+# Print the time and throughput for a benchmarked function.
+#-------------------------------------------------------------------
+def print_result(name, num_bytes, elapsed):
+    print("%-32s %9.3f ms %9.2f MB/s" %
+          (name, elapsed * 1000, num_bytes / elapsed / 1e6))
+
+
+#-------------------------------------------------------------------
+# bench_poly1305()
+#
+# Compare the general modulo path against the fast special
+# form reduction in poly1305_mac_fast().
+#-------------------------------------------------------------------
+def bench_poly1305():
+    print("*** Poly1305 benchmark.")
+    key = list(os.urandom(32))
+    for num_bytes in [64, 1024, 16384]:
+        message = list(os.urandom(num_bytes))
+        assert poly1305_mac_general(key, message) == poly1305_mac_fast(key, message)
+
+        print("Message length: %d bytes" % num_bytes)
+        print_result("general modulo", num_bytes,
+                     time_function(poly1305_mac_general, key, message))
+        print_result("special form reduction", num_bytes,
+                     time_function(poly1305_mac_fast, key, message))
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_aead_open()
+#
+# Compare the cost of rejecting a forged message against the
+# cost of a successful open.
+#-------------------------------------------------------------------
+def bench_aead_open():
+    print("*** AEAD open benchmark.")
+    key = list(os.urandom(32))
+    nonce = list(os.urandom(12))
+    aad = list(os.urandom(12))
+    for num_bytes in [64, 1024, 16384]:
+        plaintext = list(os.urandom(num_bytes))
+        (ciphertext, tag) = aead_seal(key, nonce, aad, plaintext)
+        forged_tag = tag[:]
+        forged_tag[0] ^= 0x01
+        out = bytearray(num_bytes)
+        assert aead_open(key, nonce, aad, ciphertext, forged_tag, out) is None
+
+        print("Message length: %d bytes" % num_bytes)
+        ok_time = time_function(aead_open, key, nonce, aad, ciphertext, tag, out)
+        reject_time = time_function(aead_open, key, nonce, aad, ciphertext,
+                                    forged_tag, out)
+        print_result("successful open", num_bytes, ok_time)
+        print_result("rejected forgery", num_bytes, reject_time)
+        print("Rejection cost: %.1f%% of successful open" %
+              (100 * reject_time / ok_time))
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_swar_chacha()
+#
+# Compare the scalar ChaCha20 path against the SWAR path with
+# four and eight blocks per lane set.
+#-------------------------------------------------------------------
+def bench_swar_chacha():
+    print("*** SWAR ChaCha20 benchmark.")
+    key = l2lw32(list(os.urandom(32)))
+    nonce = l2lw32(list(os.urandom(12)))
+    for num_bytes in [64, 1024, 16384]:
+        data = os.urandom(num_bytes)
+        out = bytearray(num_bytes)
+        expected = chacha_xor(key, 1, nonce, data, bytearray(num_bytes))
+        assert swar_chacha.chacha_xor(key, 1, nonce, data, out, 4) == expected
+        assert swar_chacha.chacha_xor(key, 1, nonce, data, out, 8) == expected
+
+        print("Message length: %d bytes" % num_bytes)
+        print_result("scalar", num_bytes,
+                     time_function(chacha_xor, key, 1, nonce, data, out))
+        for lanes in [4, 8]:
+            print_result("swar, %d lanes" % lanes, num_bytes,
+                         time_function(swar_chacha.chacha_xor, key, 1, nonce,
+                                       data, out, lanes))
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_poly1305_batch()
+#
+# Compare independent poly1305_mac_fast() calls against the NumPy
+# batch for many short messages with their own keys.
+#-------------------------------------------------------------------
+def bench_poly1305_batch():
+    print("*** Batched Poly1305 benchmark.")
+    try:
+        from ch20p1305 import np_poly1305
+    except ImportError:
+        print("NumPy not available, skipping benchmark.")
+        print("")
+        return
+
+    for (num_messages, length) in [(64, 64), (1024, 64), (1024, 256)]:
+        keys = [os.urandom(32) for i in range(num_messages)]
+        messages = [os.urandom(length - i % 16) for i in range(num_messages)]
+        num_bytes = sum(len(m) for m in messages)
+        assert np_poly1305.poly1305_macs(keys, messages) == \
+            [poly1305_mac_fast(keys[i], messages[i]) for i in range(num_messages)]
+
+        print("Messages: %d, length: up to %d bytes" % (num_messages, length))
+        print_result("independent calls", num_bytes,
+                     time_function(lambda: [poly1305_mac_fast(keys[i], messages[i])
+                                            for i in range(num_messages)]))
+        print_result("numpy batch", num_bytes,
+                     time_function(np_poly1305.poly1305_macs, keys, messages))
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_pipeline()
+#
+# Compare the sequential AEAD seal against the pipelined seal
+# and report the achieved overlap of the keystream and MAC
+# stages. Under the GIL no overlap is expected, see pipeline.py.
+#-------------------------------------------------------------------
+def bench_pipeline():
+    from ch20p1305 import pipeline
+
+    print("*** Pipelined AEAD seal benchmark.")
+    print("The big integer MAC stage holds the GIL, so the stages do not")
+    print("overlap and the pipelined seal is not expected to be faster.")
+    key = os.urandom(32)
+    nonce = os.urandom(12)
+    aad = os.urandom(12)
+    for num_bytes in [65536, 1048576]:
+        plaintext = os.urandom(num_bytes)
+        out = bytearray(num_bytes)
+        stats = {}
+        tag = pipeline.pipeline_seal(key, nonce, aad, plaintext, out, stats=stats)
+        assert (list(out), tag) == aead_seal(key, nonce, aad, plaintext)
+
+        print("Message length: %d bytes" % num_bytes)
+        print_result("sequential seal", num_bytes,
+                     time_function(aead_seal_iov, key, nonce, aad,
+                                   [plaintext], [out]))
+        # A single chunk uses the same kernels without overlap.
+        print_result("single chunk seal", num_bytes,
+                     time_function(pipeline.pipeline_seal, key, nonce, aad,
+                                   plaintext, out, num_bytes))
+        print_result("pipelined seal", num_bytes,
+                     time_function(pipeline.pipeline_seal, key, nonce, aad,
+                                   plaintext, out))
+        print("Keystream stage: %.3f ms, MAC stage: %.3f ms, overlap: %.0f%%" %
+              (stats["keystream_seconds"] * 1000, stats["mac_seconds"] * 1000,
+               stats["overlap"] * 100))
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_drbg()
+#
+# Compare filling a preallocated buffer from the ChaCha20 DRBG
+# against random.randbytes().
+#-------------------------------------------------------------------
+def bench_drbg():
+    import random
+    from ch20p1305.drbg import ChaChaDRBG
+
+    print("*** DRBG benchmark.")
+    rng = random.Random(1)
+    drbg = ChaChaDRBG(1)
+    for num_bytes in [4096, 1048576]:
+        buf = bytearray(num_bytes)
+        print("Request size: %d bytes" % num_bytes)
+        print_result("random.randbytes", num_bytes,
+                     time_function(rng.randbytes, num_bytes))
+        print_result("ChaChaDRBG.fill", num_bytes,
+                     time_function(drbg.fill, buf))
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_precompute()
+#
+# Compare the latency of sealing a record when it arrives with
+# and without the one time key and keystream precomputed in the
+# background. The cache is allowed to fill between records.
+#-------------------------------------------------------------------
+def bench_precompute():
+    from ch20p1305.record import RecordSealer
+    from ch20p1305.precompute import KeystreamCache
+
+    print("*** Record precompute latency benchmark.")
+    key = os.urandom(32)
+    iv = os.urandom(12)
+    for num_bytes in [64, 1024]:
+        plaintext = os.urandom(num_bytes)
+        print("Record length: %d bytes" % num_bytes)
+        for precompute in [False, True]:
+            sealer = RecordSealer(key, iv)
+            cache = None
+            if precompute:
+                cache = KeystreamCache(sealer)
+            latencies = []
+            for i in range(200):
+                if cache:
+                    cache.wait_filled()
+                start = time.perf_counter()
+                sealer.seal([], plaintext)
+                latencies.append(time.perf_counter() - start)
+            if cache:
+                cache.close()
+            latencies.sort()
+            print("%-32s p50 %8.1f us   p99 %8.1f us" %
+                  ("with precompute" if precompute else "without precompute",
+                   latencies[len(latencies) // 2] * 1e6,
+                   latencies[len(latencies) * 99 // 100] * 1e6))
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_parallel_poly1305()
+#
+# Poly1305 of a large file with 1, 2, 4 and so on up to the
+# number of CPUs worker processes, ending with the number of CPUs.
+# The tags are checked against the serial result.
+#-------------------------------------------------------------------
+def bench_parallel_poly1305():
+    import tempfile
+    from ch20p1305.parallel_poly1305 import poly1305_mac_file
+
+    print("*** Parallel Poly1305 file benchmark.")
+    num_bytes = 8 * 1024 * 1024
+    key = os.urandom(32)
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(os.urandom(num_bytes))
+    try:
+        serial_tag = poly1305_mac_file(key, f.name, 0)
+        serial_time = time_function(poly1305_mac_file, key, f.name, 0)
+        print_result("serial", num_bytes, serial_time)
+        num_cpus = os.cpu_count() or 1
+        steps = [1 << i for i in range(num_cpus.bit_length()) if 1 << i < num_cpus]
+        for workers in steps + [num_cpus]:
+            elapsed = time_function(poly1305_mac_file, key, f.name, workers)
+            if poly1305_mac_file(key, f.name, workers) != serial_tag:
+                print("Error: Tag with %d workers differs." % workers)
+            print_result("%d workers" % workers, num_bytes, elapsed)
+            print("%-32s %8.2f x" % ("speedup", serial_time / elapsed))
+    finally:
+        os.unlink(f.name)
+    print("")
+
+
+#-------------------------------------------------------------------
+# bench_compare()
+#
+# Compare a large result with one differing byte using a Python
+# loop over the bytes, as check_bytelists() used to do, and with
+# the bulk comparison in pure Python and NumPy.
+#-------------------------------------------------------------------
+def bench_compare():
+    from ch20p1305.compare import compare_buffers, load_numpy
+
+    def loop_compare(data, expected):
+        return sum(1 for i in range(len(data)) if data[i] != expected[i])
+
+    print("*** Bulk result comparison benchmark.")
+    num_bytes = 4 * 1024 * 1024
+    expected = os.urandom(num_bytes)
+    data = bytearray(expected)
+    data[num_bytes // 3] ^= 1
+    print_result("per byte loop", num_bytes,
+                 time_function(loop_compare, data, expected))
+    print_result("bulk compare", num_bytes,
+                 time_function(compare_buffers, data, expected, False))
+    if load_numpy() is not None:
+        print_result("bulk compare numpy", num_bytes,
+                     time_function(compare_buffers, data, expected, True))
+    print("")
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run all benchmarks.
+#-------------------------------------------------------------------
+def main():
+    bench_poly1305()
+    bench_aead_open()
+    bench_swar_chacha()
+    bench_poly1305_batch()
+    bench_pipeline()
+    bench_drbg()
+    bench_precompute()
+    bench_parallel_poly1305()
+    bench_compare()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF ch20p1305_bench.py
+#=======================================================================
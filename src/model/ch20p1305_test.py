@@ -47,9 +47,13 @@
 # Python module imports.
 #-------------------------------------------------------------------
 import sys
-from chacha_test import chacha_encryption
-from chacha_test import chacha_block
+import array
+import random
+from ch20p1305.chacha import chacha_encryption
+from ch20p1305.chacha import chacha_block
 from ch20p1305_utils import *
+from ch20p1305.aead import *
+from ch20p1305.poly1305 import poly1305_mac_fast, Poly1305
 
 
 #-------------------------------------------------------------------
@@ -131,6 +135,170 @@ def aead_chacha20_poly1305_test():
     tag = [0x1a, 0xe1, 0x0b, 0x59, 0x4f, 0x09, 0xe2, 0x6a,
            0x7e, 0x90, 0x2e, 0xcb, 0xd0, 0x60, 0x06, 0x91]
 
+    print("*** Test of the ChaCha20-Poly1305 AEAD construction.")
+    nonce = common + iv
+    print("Checking that the Poly1305 input matches the AEAD construct.")
+    check_bytelists(list(aead_mac_data(aad, ciphertext)), aead_construct)
+
+    print("Checking that the streamed tag matches the AEAD construct tag.")
+    otk = poly1305_key_gen(l2lw32(key), l2lw32(nonce))
+    check_bytelists(aead_tag(otk, aad, ciphertext),
+                    poly1305_mac_fast(otk, aead_construct))
+
+    (my_ciphertext, my_tag) = aead_seal(key, nonce, aad, plaintext)
+    print("Checking ciphertext.")
+    check_bytelists(my_ciphertext, ciphertext)
+    print("Checking tag.")
+    check_bytelists(my_tag, tag)
+
+    print("Checking that open returns the plaintext.")
+    check_bytelists(aead_open(key, nonce, aad, ciphertext, tag), plaintext)
+
+
+#-------------------------------------------------------------------
+# test_aead_open()
+#
+# Test that open authenticates before decrypting. Forged tags,
+# ciphertexts and AAD must be rejected without touching the
+# output buffer. A correct message must be decrypted into the
+# given output buffer.
+#-------------------------------------------------------------------
+def test_aead_open():
+    key = list(range(0x80, 0xa0))
+    nonce = [0x07, 0x00, 0x00, 0x00, 0x40, 0x41, 0x42, 0x43,
+             0x44, 0x45, 0x46, 0x47]
+    aad = [0x50, 0x51, 0x52, 0x53, 0xc0, 0xc1, 0xc2, 0xc3]
+    plaintext = list(range(200))
+
+    print("*** Test of AEAD open with verify before decrypt.")
+    (ciphertext, tag) = aead_seal(key, nonce, aad, plaintext)
+
+    errors = 0
+    out = bytearray(len(ciphertext))
+    forged_tag = tag[:]
+    forged_tag[15] ^= 0x01
+    forged_ciphertext = ciphertext[:]
+    forged_ciphertext[100] ^= 0x80
+    forgeries = [(aad, ciphertext, forged_tag),
+                 (aad, forged_ciphertext, tag),
+                 (aad[1:], ciphertext, tag)]
+    for (f_aad, f_ciphertext, f_tag) in forgeries:
+        if aead_open(key, nonce, f_aad, f_ciphertext, f_tag, out) is not None:
+            print("Error: Forged message was not rejected.")
+            errors += 1
+    if out != bytearray(len(ciphertext)):
+        print("Error: Output buffer modified for rejected message.")
+        errors += 1
+
+    if aead_open(key, nonce, aad, ciphertext, tag, out) is not out:
+        print("Error: Correct message was rejected.")
+        errors += 1
+    if list(out) != plaintext:
+        print("Error: Incorrect plaintext in output buffer.")
+        errors += 1
+
+    if errors == 0:
+        print("Open correctly verified all messages.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_aead_iov()
+#
+# Test scatter-gather seal and open with messages split into
+# random fragments, including fragments that split keystream
+# and Poly1305 blocks. The results must match aead_seal().
+#-------------------------------------------------------------------
+def test_aead_iov():
+    rng = random.Random(0x10f)
+    key = [rng.randrange(256) for i in range(32)]
+    nonce = [rng.randrange(256) for i in range(12)]
+    aad = [rng.randrange(256) for i in range(13)]
+
+    print("*** Test of scatter-gather AEAD seal and open.")
+    errors = 0
+    for length in [0, 1, 63, 64, 65, 130, 300]:
+        plaintext = bytes(rng.randrange(256) for i in range(length))
+        (ciphertext, tag) = aead_seal(key, nonce, aad, plaintext)
+
+        cuts = sorted(rng.randrange(length + 1) for i in range(4))
+        cuts = [0] + cuts + [length]
+        inputs = [plaintext[cuts[i] : cuts[i + 1]] for i in range(len(cuts) - 1)]
+        outputs = [bytearray(len(f)) for f in inputs]
+
+        if aead_seal_iov(key, nonce, aad, inputs, outputs) != tag:
+            print("Error: Incorrect tag for length %d." % length)
+            errors += 1
+        if b"".join(outputs) != bytes(ciphertext):
+            print("Error: Incorrect ciphertext for length %d." % length)
+            errors += 1
+
+        decrypted = [bytearray(len(f)) for f in outputs]
+        if aead_open_iov(key, nonce, aad, outputs, tag, decrypted) is None:
+            print("Error: Correct message rejected for length %d." % length)
+            errors += 1
+        if b"".join(decrypted) != plaintext:
+            print("Error: Incorrect plaintext for length %d." % length)
+            errors += 1
+
+        forged_tag = tag[:]
+        forged_tag[0] ^= 0x01
+        if aead_open_iov(key, nonce, aad, outputs, forged_tag, decrypted) is not None:
+            print("Error: Forged message accepted for length %d." % length)
+            errors += 1
+
+    if errors == 0:
+        print("Scatter-gather seal and open correct.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_aead_iov_words()
+#
+# Test scatter-gather seal and open with the AAD and fragments
+# given as arrays of 32 bit words. The buffers must be used as
+# bytes, not as items, for the lengths and the block splitting.
+#-------------------------------------------------------------------
+def test_aead_iov_words():
+    rng = random.Random(0x4a7)
+    key = [rng.randrange(256) for i in range(32)]
+    nonce = [rng.randrange(256) for i in range(12)]
+    aad = bytes(rng.randrange(256) for i in range(12))
+    plaintext = bytes(rng.randrange(256) for i in range(200))
+    (ciphertext, tag) = aead_seal(key, nonce, aad, plaintext)
+
+    print("*** Test of scatter-gather AEAD with word buffers.")
+    errors = 0
+    inputs = [array.array("I", plaintext[0 : 36]),
+              array.array("I", plaintext[36 : 200])]
+    outputs = [array.array("I", bytes(len(f) * 4)) for f in inputs]
+    if aead_seal_iov(key, nonce, array.array("I", aad), inputs, outputs) != tag:
+        print("Error: Incorrect tag for word buffers.")
+        errors += 1
+    if b"".join(f.tobytes() for f in outputs) != bytes(ciphertext):
+        print("Error: Incorrect ciphertext for word buffers.")
+        errors += 1
+
+    decrypted = [array.array("I", bytes(len(f) * 4)) for f in outputs]
+    if aead_open_iov(key, nonce, array.array("I", aad), outputs, tag,
+                     decrypted) is None or \
+       b"".join(f.tobytes() for f in decrypted) != plaintext:
+        print("Error: Word buffers not opened.")
+        errors += 1
+
+    mac = Poly1305(bytes(range(32)))
+    mac.update(array.array("I", plaintext[0 : 20])).update(plaintext[20:])
+    if mac.finalize() != poly1305_mac_fast(bytes(range(32)), plaintext):
+        print("Error: Incorrect Poly1305 tag for a word segment.")
+        errors += 1
+
+    if errors == 0:
+        print("Word buffers used as bytes.")
+    print("")
+    assert errors == 0
+
 
 #-------------------------------------------------------------------
 # poly1305_keygen_test()
@@ -197,6 +365,10 @@ def ch20p1305_tests():
 def main():
     ch20p1305_tests()
     poly1305_keygen_test()
+    aead_chacha20_poly1305_test()
+    test_aead_open()
+    test_aead_iov()
+    test_aead_iov_words()
 
 
 #-------------------------------------------------------------------
@@ -41,23 +41,31 @@
 #-------------------------------------------------------------------
 # Python module imports.
 #-------------------------------------------------------------------
-import sys
+from ch20p1305.utils import rotl, w32bl, l2lw32
+from ch20p1305.compare import compare_buffers, format_report
 
 #-------------------------------------------------------------------
 # Defines.
 #-------------------------------------------------------------------
 VERBOSE = False
 
+# The word helpers are re-exported from the package for the tests.
+__all__ = ["VERBOSE", "rotl", "w32bl", "l2lw32", "print_bytelist",
+           "bl2hs", "w2bl", "b2le", "check_bytelists",
+           "print_chacha_state", "check_chacha_state"]
+
 
 #-------------------------------------------------------------------
 # print_bytelist()
+#
+# Print the given list of bytes, eight bytes per line. Lines
+# after the first are indented with pad spaces.
 #-------------------------------------------------------------------
 def print_bytelist(pad, bl):
-    for i in range(len(bl)):
-        if i > 0 and (i % 8 == 0):
-            print("\n" + " " * pad, end="")
-        print("0x%02x " % bl[i], end="")
-    print()
+    lines = []
+    for i in range(0, len(bl), 8):
+        lines.append("".join("0x%02x " % b for b in bl[i : i + 8]))
+    print(("\n" + " " * pad).join(lines))
 
 
 #-------------------------------------------------------------------
@@ -101,24 +109,21 @@ def b2le(blist):
 # check_bytelists()
 #
 # Chack if a given list of bytes matches the expected list of
-# bytes given.
+# bytes given. Mismatches are reported with hexdumps around the
+# first differences. Returns the result from compare_buffers().
 #-------------------------------------------------------------------
 def check_bytelists(bytelist, expected_bytelist):
-    if len(bytelist) != len(expected_bytelist):
+    result = compare_buffers(bytelist, expected_bytelist)
+    if result["length"] != result["expected_length"]:
         print("Error: Length of bytelist does not match length of expected bytelist.")
-        return
-
-    errors = 0
-    for i in range(len(bytelist)):
-        if bytelist[i] != expected_bytelist[i]:
-            errors += 1
-    if errors > 0:
+    elif not result["equal"]:
         print("Error: bytelist does not match expected bytelist.")
-        print(bytelist)
-        print(expected_bytelist)
     else:
         print("Bytelist is correct.")
+    if not result["equal"]:
+        print(format_report(result, bytelist, expected_bytelist))
     print("")
+    return result
 
 
 #-------------------------------------------------------------------
@@ -154,46 +159,6 @@ def check_chacha_state(state, expected):
         print("State is correct.")
     print("")
 
-
-#-------------------------------------------------------------------
-# rotl()
-#
-# Rotate 32-bit operand giveb number of bits left.
-#-------------------------------------------------------------------
-def rotl(op, bits):
-    assert bits < 33
-    return ((op << bits) + (op >> (32 - bits))) & 0xffffffff
-
-
-#-------------------------------------------------------------------
-# w32bl()
-#
-# Convert a given list of 32-bit little endian words to a
-# list of bytes.
-#-------------------------------------------------------------------
-def w32bl(wlist):
-    blists = [[(w & 0xff), ((w >> 8) & 0xff), ((w >> 16) & 0xff),
-                   (w >> 24)] for w in wlist]
-    merged_blist = []
-    for chunk in blists:
-        merged_blist.append(chunk[0])
-        merged_blist.append(chunk[1])
-        merged_blist.append(chunk[2])
-        merged_blist.append(chunk[3])
-    return merged_blist
-
-
-#-------------------------------------------------------------------
-# l2lw32()
-#
-# Convert a given list of bytes to list of little endian
-# 32-bit endian words.
-#-------------------------------------------------------------------
-def l2lw32(bytelist):
-    num_words = int(len(bytelist) / 4)
-    chunks = [bytelist[(i * 4) : (i*4 + 4)] for i in range(num_words)]
-    return [((b[3] << 24) + (b[2] << 16) + (b[1] << 8) + b[0]) for b in chunks]
-
 #=======================================================================
 # EOF utils.py
 #=======================================================================
@@ -43,11 +43,14 @@
 #-------------------------------------------------------------------
 import sys
 from ch20p1305_utils import *
+from ch20p1305.chacha import qr, quarterround, doubleround
+from ch20p1305.chacha import chacha_block, chacha_encryption
+from ch20p1305.aead import chacha_xor, chacha_xor_at
+from ch20p1305 import swar_chacha
 
 #-------------------------------------------------------------------
 # Defines.
 #-------------------------------------------------------------------
-NUM_DOUBLEROUNDS = 10
 DISPLAY_DR_STATE = False
 
 key_bytes = [0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07,
@@ -59,124 +62,6 @@ nonce_bytes = [0x00, 0x00, 0x00, 0x09, 0x00, 0x00, 0x00, 0x4a,
                0x00, 0x00, 0x00, 0x00]
 
 
-#-------------------------------------------------------------------
-#-------------------------------------------------------------------
-# Tested functions.
-#-------------------------------------------------------------------
-#-------------------------------------------------------------------
-
-#-------------------------------------------------------------------
-# qr()
-#
-# The ChaCha qr function.
-#-------------------------------------------------------------------
-def qr(a, b, c, d):
-    a0 = (a + b) & 0xffffffff
-    d0 = d ^ a0
-    d1 = rotl(d0, 16)
-    c0 = (c + d1) & 0xffffffff
-    b0 = b ^ c0
-    b1 = rotl(b0, 12)
-    a1 = (a0 + b1) & 0xffffffff
-    d2 = d1 ^ a1
-    d3 = rotl(d2, 8)
-    c1 = (c0 + d3) & 0xffffffff
-    b2 = b1 ^ c1
-    b3 = rotl(b2, 7)
-    return (a1, b3, c1, d3)
-
-
-#-------------------------------------------------------------------
-# quarterround()
-#
-# Update the given state by applying the qr function on the
-# given elements in the state.
-#-------------------------------------------------------------------
-def quarterround(state, ai, bi, ci, di):
-    (ap, bp, cp, dp) = qr(state[ai], state[bi], state[ci], state[di])
-    state[ai] = ap
-    state[bi] = bp
-    state[ci] = cp
-    state[di] = dp
-    return state
-
-
-#-------------------------------------------------------------------
-# doubleround()
-#
-# Perform the ChaCha doubleround on the given state by applying
-# eigth specific quarterrounds.
-#-------------------------------------------------------------------
-def doubleround(state):
-    quarterround(state, 0, 4, 8,12)
-    quarterround(state, 1, 5, 9,13)
-    quarterround(state, 2, 6,10,14)
-    quarterround(state, 3, 7,11,15)
-    quarterround(state, 0, 5,10,15)
-    quarterround(state, 1, 6,11,12)
-    quarterround(state, 2, 7, 8,13)
-    quarterround(state, 3, 4, 9,14)
-    return state
-
-
-#-------------------------------------------------------------------
-# chacha_block()
-#
-# The chacha block function. Given a 256 bit key, 32 bit counter
-# and 96 bit nonce will create a state and then update the state
-# for 10 doublerounds. Finally the finalized state is returned
-# as a sequence of bytes.
-#
-# This code follows the pseudo code in 2.3.1 in RFC 7539.
-#-------------------------------------------------------------------
-def chacha_block(key, counter, nonce):
-    state = [0x61707865, 0x3320646e, 0x79622d32, 0x6b206574,
-                 key[0],     key[1],     key[2],     key[3],
-                 key[4],     key[5],     key[6],     key[7],
-                counter,   nonce[0],   nonce[1],   nonce[2]]
-
-    print("ChaCha block state after init:")
-    print_chacha_state(state)
-
-    working_state = state[:]
-    for i in range(NUM_DOUBLEROUNDS):
-        working_state = doubleround(working_state)
-
-    print("ChaCha block state after 10 doublerounds:")
-    print_chacha_state(working_state)
-    for i in range(len(state)):
-        state[i] = (state[i] + working_state[i]) & 0xffffffff
-
-    print("ChaCha block state after final additions:")
-    print_chacha_state(state)
-    return state
-
-
-#-------------------------------------------------------------------
-# chacha_encryption()
-#
-# Given key, initial counter value and nonce will encipher
-# the given plaintext with a generated chacha keystream.
-#-------------------------------------------------------------------
-def chacha_encryption(key, counter, nonce, plaintext):
-    num_blocks = int(len(plaintext) / 64)
-    if (len(plaintext) % 64):
-        num_blocks += 1
-
-    keystream = []
-    for b in range(num_blocks):
-        block = chacha_block(key, counter, nonce)
-        block_bytes = w32bl(block)
-        keystream += block_bytes
-        counter += 1
-
-    ciphertext = []
-    for i in range(len(plaintext)):
-        ciphertext.append(plaintext[i] ^ keystream[i])
-
-    return ciphertext
-
-
 #-------------------------------------------------------------------
 #-------------------------------------------------------------------
 # Tests.
@@ -307,6 +192,8 @@ def run_chacha_block_test():
 
     print("*** Test of chacha block function:")
     block = chacha_block(key, counter, nonce)
+    print("ChaCha block state after final additions:")
+    print_chacha_state(block)
     check_chacha_state(block, expected_block)
     block_bytes = w32bl(block)
     check_bytelists(block_bytes, expected_bytes)
@@ -376,6 +263,110 @@ def run_chacha_encryption_test():
     check_bytelists(deciphertext, plaintext)
 
 
+#-------------------------------------------------------------------
+# test_chacha_djb_layout()
+#
+# Test of the 64 bit counter layout selected by a 64 bit nonce.
+# The blocks around the 2**32 counter boundary must be equal to
+# RFC 7539 blocks with the high counter word as the first nonce
+# word, showing that the carry goes into word 13. All engines
+# are checked, as well as seeking into the stream.
+#-------------------------------------------------------------------
+def test_chacha_djb_layout():
+    print("*** Test of chacha with 64 bit counter and nonce:")
+    errors = 0
+    key = l2lw32(key_bytes)
+    nonce = [0x4a000000, 0x09000000]
+    counter = 2**32 - 3
+
+    expected = b""
+    for i in range(6):
+        c = counter + i
+        block = chacha_block(key, c & 0xffffffff, [c >> 32] + nonce)
+        expected += bytes(w32bl(block))
+
+    scalar = b"".join(bytes(w32bl(chacha_block(key, counter + i, nonce)))
+                      for i in range(6))
+    if scalar != expected:
+        print("Error: Incorrect carry in chacha_block().")
+        errors += 1
+
+    data = bytes(range(256)) + bytes(range(128))
+    ciphertext = chacha_xor(key, counter, nonce, data, bytearray(len(data)))
+    if ciphertext != bytes(a ^ b for (a, b) in zip(data, expected)):
+        print("Error: Incorrect carry in chacha_xor().")
+        errors += 1
+
+    if swar_chacha.keystream(key, counter, nonce, len(expected)) != expected:
+        print("Error: Incorrect carry in the SWAR engine.")
+        errors += 1
+
+    try:
+        from ch20p1305 import np_chacha
+        if np_chacha.keystream(key, counter, nonce, len(expected)) != expected:
+            print("Error: Incorrect carry in the NumPy engine.")
+            errors += 1
+    except ImportError:
+        print("NumPy not available, NumPy engine not tested.")
+
+    out = bytearray(150)
+    chacha_xor_at(key, nonce, 100, data[100 : 250], out, counter)
+    if out != ciphertext[100 : 250]:
+        print("Error: Incorrect output after seek across the boundary.")
+        errors += 1
+
+    if errors == 0:
+        print("Correct carry across the 2**32 counter boundary.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_chacha_counter_limit()
+#
+# Blocks past the 32 bit counter with a 96 bit nonce must be
+# rejected by all engines instead of wrapping to block zero,
+# which holds the Poly1305 one time key. The last block before
+# the limit must still be generated.
+#-------------------------------------------------------------------
+def test_chacha_counter_limit():
+    print("*** Test of the 32 bit chacha counter limit:")
+    errors = 0
+    key = l2lw32(key_bytes)
+    nonce = l2lw32(nonce_bytes)
+    last = 2**32 - 1
+
+    engines = [("chacha_block", lambda c, n: [chacha_block(key, c + i, nonce)
+                                               for i in range(n)]),
+               ("chacha_xor", lambda c, n: chacha_xor(key, c, nonce, bytes(64 * n),
+                                                     bytearray(64 * n))),
+               ("SWAR", lambda c, n: swar_chacha.keystream(key, c, nonce, 64 * n))]
+    try:
+        from ch20p1305 import np_chacha
+        engines.append(("NumPy", lambda c, n: np_chacha.chacha_blocks(key, c, nonce, n)))
+    except ImportError:
+        print("NumPy not available, NumPy engine not tested.")
+
+    for (name, engine) in engines:
+        try:
+            engine(last, 1)
+        except ValueError:
+            print("Error: Last block rejected by %s." % name)
+            errors += 1
+        for (counter, num_blocks) in [(2**32, 1), (last, 2)]:
+            try:
+                engine(counter, num_blocks)
+                print("Error: Counter wrapped in %s." % name)
+                errors += 1
+            except ValueError:
+                pass
+
+    if errors == 0:
+        print("Blocks past the counter rejected.")
+    print("")
+    assert errors == 0
+
+
 #-------------------------------------------------------------------
 # main()
 #
@@ -387,6 +378,8 @@ def main():
     run_chacha_doubleround_function_test()
     run_chacha_block_test()
     run_chacha_encryption_test()
+    test_chacha_djb_layout()
+    test_chacha_counter_limit()
 
 
 #-------------------------------------------------------------------
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# compare_test.py
+# ---------------
+# Tests of the bulk comparison and reporting of results.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+from ch20p1305.compare import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+SIZE = 200003
+
+
+#-------------------------------------------------------------------
+# engines()
+#
+# Return the use_numpy settings that can be tested.
+#-------------------------------------------------------------------
+def engines():
+    if load_numpy() is None:
+        print("NumPy not available, testing pure Python only.")
+        return [False]
+    return [False, True]
+
+
+#-------------------------------------------------------------------
+# test_compare_ranges()
+#
+# Mismatching ranges, including ranges crossing chunk borders and
+# differing lengths, must be found by both engines.
+#-------------------------------------------------------------------
+def test_compare_ranges():
+    print("*** Test of bulk comparison ranges.")
+    errors = 0
+
+    expected = bytes((i * 13 + (i >> 9)) & 0xff for i in range(SIZE))
+    data = bytearray(expected)
+    data[0] ^= 1
+    data[100 : 103] = bytes(3)
+    data[CHUNK_SIZE - 2 : CHUNK_SIZE + 2] = bytes(b ^ 0x80 for b in
+                                                  data[CHUNK_SIZE - 2 : CHUNK_SIZE + 2])
+    data[SIZE - 1] ^= 0xff
+    ranges = [(0, 1), (100, 103), (CHUNK_SIZE - 2, CHUNK_SIZE + 2),
+              (SIZE - 1, SIZE)]
+
+    for use_numpy in engines():
+        result = compare_buffers(data, expected, use_numpy)
+        if result["ranges"] != ranges or result["mismatches"] != 9 or \
+           result["first"] != 0 or result["equal"]:
+            print("Error: Incorrect result %s with use_numpy %s." %
+                  (result, use_numpy))
+            errors += 1
+
+        result = compare_buffers(expected, expected, use_numpy)
+        if not result["equal"] or result["ranges"] or result["first"] is not None:
+            print("Error: Equal buffers reported as different.")
+            errors += 1
+
+        result = compare_buffers(list(expected[0 : 10]), expected[0 : 13], use_numpy)
+        if result["ranges"] != [(10, 13)] or result["length"] != 10:
+            print("Error: Length difference not reported, %s." % result)
+            errors += 1
+
+    # The first mismatch is found for every range and for equal
+    # and shorter buffers.
+    for (start, end) in ranges:
+        probe = bytearray(expected)
+        probe[start : end] = data[start : end]
+        if first_mismatch(probe, expected) != start:
+            print("Error: First mismatch at %d not found." % start)
+            errors += 1
+    if first_mismatch(expected, expected) is not None or \
+       first_mismatch(expected[0 : 100], expected) != 100:
+        print("Error: Incorrect first mismatch for equal or short data.")
+        errors += 1
+
+    if errors == 0:
+        print("Mismatching ranges found.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_compare_report()
+#
+# The report must be bounded in the number of windows and bytes
+# shown, and mark the differing bytes.
+#-------------------------------------------------------------------
+def test_compare_report():
+    print("*** Test of bulk comparison report.")
+    errors = 0
+
+    expected = bytes(SIZE)
+    data = bytearray(SIZE)
+    for i in range(0, SIZE, 1000):
+        data[i] = 0xaa
+    result = compare_buffers(data, expected)
+    report = format_report(result, data, expected, max_windows=3)
+    lines = report.split("\n")
+
+    if len(result["ranges"]) != (SIZE + 999) // 1000:
+        print("Error: Incorrect number of ranges.")
+        errors += 1
+    if report.count("Range ") != 3 or "198 more ranges not shown." not in report:
+        print("Error: Report windows not bounded.")
+        errors += 1
+    if len(lines) > 40 or report.count("^^") != 3:
+        print("Error: Unexpected report:\n%s" % report)
+        errors += 1
+
+    window = hexdump_window(data, expected, 1000, 1001)
+    if window[2] != "%08x  data:     %s" % (992, " ".join(["00"] * 8 + ["aa"] + ["00"] * 7)):
+        print("Error: Incorrect hexdump line %s." % window[2])
+        errors += 1
+
+    # Context larger than the window must still show the difference.
+    window = hexdump_window(data, expected, 1000, 1001, context=200, max_bytes=64)
+    marks = [line for line in window if line.strip() == "^^"]
+    if len(marks) != 1 or len(window) > 9:
+        print("Error: Difference not shown in window:\n%s" % "\n".join(window))
+        errors += 1
+
+    # Windows smaller than two lines must still show the difference.
+    small = bytearray(256)
+    small[100] = 0x55
+    for max_bytes in [1, 8, 16, 24]:
+        window = hexdump_window(small, bytes(256), 100, 101, max_bytes=max_bytes)
+        if sum(line.count("^^") for line in window) != 1:
+            print("Error: Difference not shown in %d byte window:\n%s" %
+                  (max_bytes, "\n".join(window)))
+            errors += 1
+
+    if format_report(compare_buffers(b"abc", b"abc"), b"abc", b"abc") != \
+       "Data is correct, 3 bytes.":
+        print("Error: Incorrect report for equal data.")
+        errors += 1
+
+    if errors == 0:
+        print("Bounded report generated.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run compare tests.
+#-------------------------------------------------------------------
+def main():
+    test_compare_ranges()
+    test_compare_report()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF compare_test.py
+#=======================================================================
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# drbg_test.py
+# ------------
+# Tests of the ChaCha20 based random byte generator.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+from ch20p1305.drbg import *
+from ch20p1305.chacha import chacha_encryption
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+SEED = b"simulation run 17"
+
+
+#-------------------------------------------------------------------
+# reference_stream()
+#
+# The expected generator output, the keystream for the given
+# stream index and counter.
+#-------------------------------------------------------------------
+def reference_stream(seed, stream, counter, num_bytes):
+    key = ChaChaDRBG(seed).key_words
+    nonce = [stream & 0xffffffff, stream >> 32, 0]
+    return bytes(chacha_encryption(key, counter, nonce, [0] * num_bytes))
+
+
+#-------------------------------------------------------------------
+# test_drbg_stream()
+#
+# Test that the output is the keystream no matter how it is
+# requested, and that jump(), substream() and split() select
+# the expected parts of the keystream.
+#-------------------------------------------------------------------
+def test_drbg_stream():
+    print("*** Test of the DRBG output stream.")
+    errors = 0
+    expected = reference_stream(SEED, 0, 0, 1500)
+
+    drbg = ChaChaDRBG(SEED, buffer_size=128)
+    data = drbg.random_bytes(1) + drbg.random_bytes(200)
+    data += bytes(drbg.fill(bytearray(1000))) + drbg.random_bytes(299)
+    if data != expected:
+        print("Error: Output depends on the request sizes.")
+        errors += 1
+    if drbg.tell() != 1500:
+        print("Error: Incorrect position %d." % drbg.tell())
+        errors += 1
+
+    drbg = ChaChaDRBG(SEED)
+    drbg.random_bytes(10)
+    drbg.jump(5)
+    if drbg.random_bytes(30) != expected[330 : 360]:
+        print("Error: Incorrect output after jump.")
+        errors += 1
+
+    if ChaChaDRBG(SEED).substream(2**40 + 3).random_bytes(100) != \
+       reference_stream(SEED, 2**40 + 3, 0, 100):
+        print("Error: Incorrect substream output.")
+        errors += 1
+
+    parts = ChaChaDRBG(SEED).split(4)
+    if parts[3].random_bytes(64) != reference_stream(SEED, 0, 3 * 2**30, 64):
+        print("Error: Incorrect output from split part.")
+        errors += 1
+
+    drbg = ChaChaDRBG(SEED, first_block=10, end_block=12)
+    drbg.random_bytes(100)
+    try:
+        drbg.random_bytes(100)
+        print("Error: Counter range exhausted without error.")
+        errors += 1
+    except StreamExhaustedError:
+        pass
+
+    drbg = ChaChaDRBG(SEED)
+    drbg.reseed(b"more entropy")
+    if drbg.random_bytes(64) == expected[0 : 64]:
+        print("Error: Same output after reseed.")
+        errors += 1
+
+    if errors == 0:
+        print("Correct output stream.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_drbg_fork()
+#
+# Test that a forked child reseeds instead of repeating the
+# output of the parent.
+#-------------------------------------------------------------------
+def test_drbg_fork():
+    print("*** Test of DRBG reseed after fork.")
+    if not hasattr(os, "fork"):
+        print("Fork not available, skipping test.")
+        print("")
+        return
+
+    errors = 0
+    drbg = ChaChaDRBG(SEED)
+    drbg.random_bytes(10)
+    (read_fd, write_fd) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, drbg.random_bytes(32))
+        os._exit(0)
+
+    os.close(write_fd)
+    child_data = os.read(read_fd, 32)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    if len(child_data) != 32 or child_data == drbg.random_bytes(32):
+        print("Error: Child repeated the output of the parent.")
+        errors += 1
+
+    if errors == 0:
+        print("Child reseeded after fork.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run DRBG tests.
+#-------------------------------------------------------------------
+def main():
+    test_drbg_stream()
+    test_drbg_fork()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF drbg_test.py
+#=======================================================================
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# host_driver_test.py
+# -------------------
+# Tests of the host driver model for the chacha20_poly1305 top
+# level register interface.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import re
+from ch20p1305.aead import aead_seal
+from ch20p1305 import host_driver
+from ch20p1305.host_driver import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+RTL_TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "..", "rtl", "chacha20_poly1305.v")
+
+KEY = bytes(range(0x80, 0xa0))
+NONCE = bytes([0x07, 0x00, 0x00, 0x00, 0x40, 0x41, 0x42, 0x43,
+               0x44, 0x45, 0x46, 0x47])
+
+
+#-------------------------------------------------------------------
+# test_register_map()
+#
+# Test that the register map in the driver model matches the
+# localparams in the RTL top level.
+#-------------------------------------------------------------------
+def test_register_map():
+    print("*** Test of the driver register map against the RTL.")
+    with open(RTL_TOP) as f:
+        rtl = f.read()
+    params = re.findall(r"localparam\s+(\w+)\s*=\s*(?:\d+'h([0-9a-fA-F]+)|(\d+))\s*;", rtl)
+
+    errors = 0
+    for (name, hexvalue, decvalue) in params:
+        value = int(hexvalue, 16) if hexvalue else int(decvalue)
+        if getattr(host_driver, name, None) != value:
+            print("Error: %s differs from the RTL value 0x%02x." % (name, value))
+            errors += 1
+
+    if errors == 0:
+        print("Register map matches %d RTL parameters." % len(params))
+    print("")
+    assert errors == 0 and len(params) > 0
+
+
+#-------------------------------------------------------------------
+# test_host_driver()
+#
+# Seal and open messages through the driver and the simulated
+# bus. The ciphertext and tag must match aead_seal() with no AAD,
+# and messages with a partial last block must be refused.
+# Checks that unchanged key, config and data words are not
+# written again.
+#-------------------------------------------------------------------
+def test_host_driver():
+    print("*** Test of the host driver model.")
+    errors = 0
+    for (shadow, burst) in [(False, False), (True, False), (True, True)]:
+        bus = SimulatedBus(DeviceModel(busy_polls=2))
+        driver = HostDriver(bus, shadow, burst)
+        for length in [0, 64, 128, 320]:
+            plaintext = bytes((i * 13) & 0xff for i in range(length))
+            (ciphertext, tag) = driver.seal(KEY, NONCE, plaintext)
+            (expected_ciphertext, expected_tag) = aead_seal(KEY, NONCE, [], plaintext)
+            if ciphertext != bytes(expected_ciphertext):
+                print("Error: Incorrect ciphertext for length %d." % length)
+                errors += 1
+            if tag != bytes(expected_tag):
+                print("Error: Incorrect tag for length %d." % length)
+                errors += 1
+            (decrypted, open_tag) = driver.open(KEY, NONCE, ciphertext)
+            if decrypted != plaintext:
+                print("Error: Incorrect open for length %d." % length)
+                errors += 1
+            if open_tag != tag:
+                print("Error: Incorrect open tag for length %d." % length)
+                errors += 1
+
+        for length in [1, 63, 100, 300]:
+            try:
+                driver.seal(KEY, NONCE, bytes(length))
+                print("Error: Partial block of length %d accepted." % length)
+                errors += 1
+            except ValueError:
+                pass
+
+    bus = SimulatedBus(DeviceModel())
+    driver = HostDriver(bus)
+    driver.seal(KEY, NONCE, bytes(64))
+    first = bus.writes
+    bus.reset_counters()
+    driver.seal(KEY, NONCE[0 : 11] + b"\x48", bytes(64))
+    # Only one nonce word changes and the data is the same.
+    if first != 7 or bus.writes != 4:
+        print("Error: Unexpected writes %d and %d." % (first, bus.writes))
+        errors += 1
+
+    if errors == 0:
+        print("Correct results from the driver.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run host driver tests.
+#-------------------------------------------------------------------
+def main():
+    test_register_map()
+    test_host_driver()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF host_driver_test.py
+#=======================================================================
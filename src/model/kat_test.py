@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# kat_test.py
+# -----------
+# Tests of the known answer test runner.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import io
+import json
+import tempfile
+import multiprocessing
+from ch20p1305 import kat
+from ch20p1305 import backends
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+RFC_VECTORS = os.path.join(MODEL_DIR, "vectors", "rfc7539.json")
+
+
+#-------------------------------------------------------------------
+# test_iter_json_tests()
+#
+# Test that the incremental parser finds the same tests as a
+# complete parse of the file, also when the chunks are small
+# enough to split keys, strings and objects.
+#-------------------------------------------------------------------
+def test_iter_json_tests():
+    print("*** Test of incremental test vector parsing.")
+    with open(RFC_VECTORS) as f:
+        text = f.read()
+    expected = [t for g in json.loads(text)["testGroups"] for t in g["tests"]]
+
+    errors = 0
+    for chunk_size in [1, 7, 100, 65536]:
+        tests = list(kat.iter_json_tests(io.StringIO(text), chunk_size))
+        if tests != expected:
+            print("Error: Incorrect tests parsed with chunk size %d." % chunk_size)
+            errors += 1
+
+    if errors == 0:
+        print("Incremental parsing correct.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_run_kat()
+#
+# Run the RFC vectors, as JSON and as JSON lines, serially and in
+# a process pool against a number of backends. All vectors,
+# including the invalid ones, must pass.
+#-------------------------------------------------------------------
+def test_run_kat():
+    print("*** Test of the known answer test runner.")
+    errors = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jsonl_path = os.path.join(tmpdir, "rfc7539.jsonl")
+        with open(RFC_VECTORS) as f, open(jsonl_path, "w") as out:
+            for test in kat.iter_json_tests(f):
+                out.write(json.dumps(test) + "\n")
+
+        for (backend, workers) in [("bigint", 0), ("reference", 0),
+                                   ("bigint", 2)]:
+            report = kat.run_kat([RFC_VECTORS, jsonl_path], backend, workers)
+            if report["total"] != 10 or report["failed"] != 0:
+                print("Error: %d of %d vectors failed with %s backend." %
+                      (report["failed"], report["total"], backend))
+                errors += 1
+            for r in report["results"]:
+                if r["seconds"] < 0 or r["accepted"] != (r["result"] == "valid"):
+                    print("Error: Incorrect result record %r." % r)
+                    errors += 1
+
+    if errors == 0:
+        print("Known answer test runner correct.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_run_kat_autotune()
+#
+# With no backend and an empty selection cache the autotuning
+# must be run once, before the vectors, and not inside the
+# timing of the first vectors in each worker. The autotuning
+# and the vector checks are logged to a file, so that calls in
+# the workers are seen as well. The workers are forked, so that
+# they inherit the logging functions whatever the default start
+# method is.
+#-------------------------------------------------------------------
+def test_run_kat_autotune():
+    print("*** Test of backend autotuning in the known answer test runner.")
+    errors = 0
+    saved_cache = os.environ.get(backends.ENV_CACHE)
+    saved_selection = dict(backends.selection)
+    autotune = backends.autotune
+    check_vector = kat.check_vector
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = os.path.join(tmpdir, "backends.json")
+        log_path = os.path.join(tmpdir, "events.log")
+
+        def log(event):
+            with open(log_path, "a") as f:
+                f.write(event + "\n")
+
+        def logging_autotune(operation):
+            log("tune " + operation)
+            return autotune(operation)
+
+        def logging_check_vector(path, vector, funcs):
+            log("vector")
+            return check_vector(path, vector, funcs)
+
+        os.environ[backends.ENV_CACHE] = cache_path
+        try:
+            for workers in [0, 2]:
+                if workers and "fork" not in multiprocessing.get_all_start_methods():
+                    print("Fork not available, workers not tested.")
+                    continue
+                context = multiprocessing.get_context("fork") if workers else None
+                for path in [cache_path, log_path]:
+                    if os.path.exists(path):
+                        os.unlink(path)
+                backends.reset()
+                backends.autotune = logging_autotune
+                kat.check_vector = logging_check_vector
+                report = kat.run_kat([RFC_VECTORS], None, workers, batch_size=2,
+                                     mp_context=context)
+                backends.autotune = autotune
+                kat.check_vector = check_vector
+
+                with open(log_path) as f:
+                    events = f.read().splitlines()
+                tuned = [e for e in events if e.startswith("tune")]
+                expected = sorted(["tune chacha_xor", "tune poly1305_mac"])
+                if sorted(events[0:2]) != expected or sorted(tuned) != expected \
+                   or report["backends"] != backends.selection:
+                    print("Error: Backends not selected once before the "
+                          "vectors with %d workers, events %s." %
+                          (workers, events))
+                    errors += 1
+                if events.count("vector") != report["total"] or \
+                   report["failed"] != 0:
+                    print("Error: %d of %d vectors failed." %
+                          (report["failed"], report["total"]))
+                    errors += 1
+        finally:
+            backends.autotune = autotune
+            kat.check_vector = check_vector
+            backends.reset()
+            backends.selection.update(saved_selection)
+            if saved_cache is None:
+                os.environ.pop(backends.ENV_CACHE, None)
+            else:
+                os.environ[backends.ENV_CACHE] = saved_cache
+
+    if errors == 0:
+        print("Backends selected once before the vectors.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run known answer test runner tests.
+#-------------------------------------------------------------------
+def main():
+    test_iter_json_tests()
+    test_run_kat()
+    test_run_kat_autotune()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF kat_test.py
+#=======================================================================
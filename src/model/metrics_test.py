@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# metrics_test.py
+# ---------------
+# Tests of the runtime metrics. Checks that the counters match
+# the work done by the AEAD model.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import threading
+from ch20p1305 import metrics
+from ch20p1305.aead import *
+
+
+#-------------------------------------------------------------------
+# test_metrics_counters()
+#
+# Seal a message, open it and try to open a forgery. Check that
+# the counters and the number of stage observations match the
+# work that must have been done.
+#-------------------------------------------------------------------
+def test_metrics_counters():
+    key = list(range(32))
+    nonce = list(range(12))
+    aad = list(range(13))
+    plaintext = list(range(200))
+
+    print("*** Test of metrics counters.")
+    metrics.enable()
+    (ciphertext, tag) = aead_seal(key, nonce, aad, plaintext)
+    aead_open(key, nonce, aad, ciphertext, tag)
+    forged_tag = tag[:]
+    forged_tag[0] ^= 0x01
+    aead_open(key, nonce, aad, ciphertext, forged_tag)
+    metrics.disable()
+    aead_seal(key, nonce, aad, plaintext)
+
+    # Each tag absorbs one AAD block, 13 ciphertext blocks and
+    # the length block. Each successful operation generates the
+    # Poly1305 key block and four keystream blocks.
+    expected = {"chacha_blocks": 11, "xor_bytes": 400,
+                "poly1305_blocks": 45, "aead_seals": 1,
+                "aead_opens": 2, "aead_open_failures": 1}
+    expected_stages = {"keygen": 3, "keystream": 2, "mac": 3, "compare": 2}
+
+    snap = metrics.snapshot()
+    errors = 0
+    for (name, value) in expected.items():
+        if snap["counters"][name] != value:
+            print("Error: Counter %s is %d, expected %d." %
+                  (name, snap["counters"][name], value))
+            errors += 1
+    for (stage, value) in expected_stages.items():
+        hist = snap["histograms"][stage]
+        if hist["count"] != value or hist["buckets"][-1][1] != value:
+            print("Error: Stage %s observed %d times, expected %d." %
+                  (stage, hist["count"], value))
+            errors += 1
+
+    text = metrics.prometheus_text()
+    if "ch20p1305_chacha_blocks_total 11\n" not in text:
+        print("Error: Counter missing in Prometheus text.")
+        errors += 1
+    if 'ch20p1305_stage_seconds_count{stage="keygen"} 3\n' not in text:
+        print("Error: Histogram missing in Prometheus text.")
+        errors += 1
+
+    # A counter registered by a module is reported from zero.
+    metrics.register("test_registered")
+    text = metrics.prometheus_text()
+    metrics.COUNTERS.remove("test_registered")
+    metrics.reset()
+    if "ch20p1305_test_registered_total 0\n" not in text:
+        print("Error: Registered counter missing in Prometheus text.")
+        errors += 1
+
+    if errors == 0:
+        print("Counters match the work done.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_metrics_threads()
+#
+# Update counters and histograms from many threads at once. No
+# updates may be lost.
+#-------------------------------------------------------------------
+def test_metrics_threads():
+    print("*** Test of metrics updated from many threads.")
+    errors = 0
+    metrics.enable()
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def worker():
+        for i in range(5000):
+            metrics.count("xor_bytes", 3)
+            metrics.observe("mac", 1e-5)
+
+    threads = [threading.Thread(target=worker) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(interval)
+
+    snap = metrics.snapshot()
+    metrics.disable()
+    if snap["counters"]["xor_bytes"] != 8 * 5000 * 3:
+        print("Error: Lost counter updates, %d." % snap["counters"]["xor_bytes"])
+        errors += 1
+    if snap["histograms"]["mac"]["count"] != 8 * 5000 or \
+       snap["histograms"]["mac"]["buckets"][-1][1] != 8 * 5000:
+        print("Error: Lost histogram updates.")
+        errors += 1
+
+    if errors == 0:
+        print("No updates lost.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run metrics tests.
+#-------------------------------------------------------------------
+def main():
+    test_metrics_counters()
+    test_metrics_threads()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF metrics_test.py
+#=======================================================================
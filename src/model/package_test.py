@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# package_test.py
+# ---------------
+# Tests of the ch20p1305 package. Checks that the package imports
+# fast in a fresh interpreter without pulling in the optional
+# backend dependencies, and that the lazily loaded backends give
+# the same results as the core.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import subprocess
+import importlib.util
+import ch20p1305
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+# Max time in seconds for a cold import of the package. A cold
+# import takes about 25 ms, the budget leaves room for slow
+# machines.
+IMPORT_TIME_BUDGET = 0.2
+
+# Modules that must not be imported by the package core.
+LAZY_DEPENDENCIES = ["numpy", "threading", "socket", "multiprocessing",
+                     "asyncio", "concurrent.futures"] + \
+                    ["ch20p1305." + name for name in ch20p1305.LAZY_MODULES]
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import ch20p1305
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(" ".join(m for m in %r if m in sys.modules))
+"""
+
+
+#-------------------------------------------------------------------
+# test_import_time()
+#
+# Import the package in a fresh interpreter and check the import
+# time and that no optional dependency or lazy module was
+# imported.
+#-------------------------------------------------------------------
+def test_import_time():
+    print("*** Test of package cold import.")
+    model_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c",
+                             IMPORT_SCRIPT % LAZY_DEPENDENCIES],
+                            cwd=model_dir, capture_output=True,
+                            text=True, check=True)
+    lines = result.stdout.split("\n")
+    elapsed = float(lines[0])
+    loaded = lines[1].split()
+    print("Import time: %.1f ms (budget %.1f ms)" %
+          (elapsed * 1000, IMPORT_TIME_BUDGET * 1000))
+
+    errors = 0
+    if elapsed > IMPORT_TIME_BUDGET:
+        print("Error: Import time exceeds budget.")
+        errors += 1
+    if loaded:
+        print("Error: Optional dependencies imported: %s" % " ".join(loaded))
+        errors += 1
+    if errors == 0:
+        print("Package import is lean.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_lazy_modules()
+#
+# Test that every lazy module can be accessed as an attribute of
+# the package, and that the star import works.
+#-------------------------------------------------------------------
+def test_lazy_modules():
+    print("*** Test of the lazily loaded modules.")
+    errors = 0
+    have_numpy = importlib.util.find_spec("numpy") is not None
+    for (name, dependency) in ch20p1305.LAZY_MODULES.items():
+        if dependency == "numpy" and not have_numpy:
+            continue
+        module = getattr(ch20p1305, name, None)
+        if module is None or module.__name__ != "ch20p1305." + name:
+            print("Error: Lazy module %s not loaded." % name)
+            errors += 1
+
+    namespace = {}
+    exec("from ch20p1305 import *", namespace)
+    missing = [name for name in ch20p1305.__all__ if name not in namespace]
+    if missing:
+        print("Error: Star import misses %s." % " ".join(missing))
+        errors += 1
+
+    if errors == 0:
+        print("Lazy modules loaded on access.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_np_chacha()
+#
+# Test that the NumPy backend is loaded on first access and
+# generates the same keystream as the core.
+#-------------------------------------------------------------------
+def test_np_chacha():
+    print("*** Test of the lazily loaded NumPy backend.")
+    if importlib.util.find_spec("numpy") is None:
+        print("NumPy not available, skipping test.")
+        print("")
+        return
+
+    key = list(range(8))
+    nonce = [0x09000000, 0x4a000000, 0x00000000]
+    data = bytes(range(256)) * 3 + bytes(7)
+
+    errors = 0
+    expected = ch20p1305.chacha_encryption(key, 1, nonce, list(data))
+    if ch20p1305.np_chacha.chacha_xor(key, 1, nonce, data) != bytes(expected):
+        print("Error: NumPy keystream does not match the core.")
+        errors += 1
+
+    expected = ch20p1305.chacha_encryption(key, 0x12345678, nonce, list(data))
+    out = bytearray(len(data))
+    ch20p1305.np_chacha.chacha_xor(key, 0x12345678, nonce, data, out)
+    if out != bytearray(expected):
+        print("Error: NumPy keystream in output buffer does not match the core.")
+        errors += 1
+
+    if errors == 0:
+        print("NumPy backend matches the core.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run package tests.
+#-------------------------------------------------------------------
+def main():
+    test_import_time()
+    test_lazy_modules()
+    test_np_chacha()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF package_test.py
+#=======================================================================
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# parallel_poly1305_test.py
+# -------------------------
+# Tests of the multi process Poly1305 of files.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import os
+import sys
+import tempfile
+from ch20p1305.poly1305 import poly1305_mac_fast
+from ch20p1305.parallel_poly1305 import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+KEY = bytes(range(0x80, 0xa0))
+
+
+#-------------------------------------------------------------------
+# test_parallel_poly1305()
+#
+# The tags of files split into different numbers of shards, in
+# this process and in worker processes, must be the tags of the
+# serial computation.
+#-------------------------------------------------------------------
+def test_parallel_poly1305():
+    print("*** Test of multi process Poly1305 of files.")
+    errors = 0
+
+    for length in [0, 1, 15, 16, 17, 1000, 100003]:
+        data = bytes((i * 7 + (i >> 8)) & 0xff for i in range(length))
+        expected = poly1305_mac_fast(KEY, data)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(data)
+        try:
+            for num_shards in [1, 2, 3, 7, 64]:
+                if poly1305_mac_file(KEY, f.name, 0, num_shards) != expected:
+                    print("Error: Incorrect tag for length %d and %d shards." %
+                          (length, num_shards))
+                    errors += 1
+            if poly1305_mac_file(KEY, f.name, 2, 5) != expected:
+                print("Error: Incorrect tag for length %d with workers." % length)
+                errors += 1
+        finally:
+            os.unlink(f.name)
+
+    if errors == 0:
+        print("Tags equal to the serial tags.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_shard_ranges()
+#
+# Shards must cover the input in order, and all shards except
+# the last must hold complete blocks.
+#-------------------------------------------------------------------
+def test_shard_ranges():
+    print("*** Test of Poly1305 shard ranges.")
+    errors = 0
+
+    for (num_bytes, num_shards) in [(0, 4), (1, 4), (33, 4), (1000, 3), (4096, 5)]:
+        ranges = shard_ranges(num_bytes, num_shards)
+        pos = 0
+        for (i, (start, end)) in enumerate(ranges):
+            if start != pos or end <= start:
+                print("Error: Gap or empty shard in %s." % ranges)
+                errors += 1
+            if i < len(ranges) - 1 and (end - start) % 16:
+                print("Error: Partial block inside %s." % ranges)
+                errors += 1
+            pos = end
+        if pos != num_bytes or len(ranges) > num_shards:
+            print("Error: Shards %s do not cover %d bytes." % (ranges, num_bytes))
+            errors += 1
+
+    if errors == 0:
+        print("Shard ranges correct.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run parallel Poly1305 tests.
+#-------------------------------------------------------------------
+def main():
+    test_parallel_poly1305()
+    test_shard_ranges()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF parallel_poly1305_test.py
+#=======================================================================
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# pipeline_test.py
+# ----------------
+# Tests of the pipelined AEAD seal and open.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import random
+import threading
+from ch20p1305 import pipeline
+from ch20p1305.aead import aead_seal
+from ch20p1305.pipeline import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+KEY = bytes(range(0x80, 0xa0))
+NONCE = bytes([0x07, 0x00, 0x00, 0x00, 0x40, 0x41, 0x42, 0x43,
+               0x44, 0x45, 0x46, 0x47])
+AAD = bytes([0x50, 0x51, 0x52, 0x53, 0xc0, 0xc1, 0xc2, 0xc3,
+             0xc4, 0xc5, 0xc6, 0xc7])
+
+
+#-------------------------------------------------------------------
+# test_pipeline_seal()
+#
+# Seal and open messages around the chunk boundaries with the
+# pipeline and check that the result is bit identical to
+# aead_seal(). Also check that the stage statistics are given.
+#-------------------------------------------------------------------
+def test_pipeline_seal():
+    print("*** Test of the pipelined AEAD seal and open.")
+    rng = random.Random(0x9e)
+    errors = 0
+    for length in [0, 1, 255, 256, 257, 1000, 5000]:
+        plaintext = bytes(rng.randrange(256) for i in range(length))
+        (ciphertext, tag) = aead_seal(KEY, NONCE, AAD, plaintext)
+
+        stats = {}
+        out = bytearray(length)
+        if pipeline_seal(KEY, NONCE, AAD, plaintext, out, 256, stats) != tag:
+            print("Error: Incorrect tag for length %d." % length)
+            errors += 1
+        if out != bytearray(ciphertext):
+            print("Error: Incorrect ciphertext for length %d." % length)
+            errors += 1
+        if not 0.0 <= stats["overlap"] <= 1.0:
+            print("Error: Overlap %f out of range." % stats["overlap"])
+            errors += 1
+
+        decrypted = bytearray(length)
+        if pipeline_open(KEY, NONCE, AAD, out, tag, decrypted, 256) != plaintext:
+            print("Error: Incorrect plaintext for length %d." % length)
+            errors += 1
+
+    if errors == 0:
+        print("Pipeline results identical to aead_seal().")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_pipeline_forgery()
+#
+# Test that a forged message is rejected and that no plaintext
+# is written into the output buffer.
+#-------------------------------------------------------------------
+def test_pipeline_forgery():
+    print("*** Test of forgery rejection in the pipelined open.")
+    errors = 0
+    plaintext = bytes(range(256)) * 4
+    (ciphertext, tag) = aead_seal(KEY, NONCE, AAD, plaintext)
+    tag[15] ^= 0x01
+
+    out = bytearray(b"\xaa" * len(plaintext))
+    if pipeline_open(KEY, NONCE, AAD, ciphertext, tag, out, 128) is not None:
+        print("Error: Forged message accepted.")
+        errors += 1
+    if out != b"\xaa" * len(plaintext):
+        print("Error: Plaintext of forged message written to output.")
+        errors += 1
+
+    if errors == 0:
+        print("Forged message rejected.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_pipeline_mac_error()
+#
+# Test that an error in the MAC stage is raised and that the
+# keystream worker is stopped, also when the queue is full.
+#-------------------------------------------------------------------
+def test_pipeline_mac_error():
+    print("*** Test of MAC stage errors in the pipeline.")
+    errors = 0
+
+    class FailingPoly1305(pipeline.Poly1305):
+        def update(self, segment):
+            if len(segment) == 64:
+                raise RuntimeError("MAC failure")
+            return super().update(segment)
+
+    threads = threading.active_count()
+    saved = pipeline.Poly1305
+    pipeline.Poly1305 = FailingPoly1305
+    try:
+        plaintext = bytes(64 * 64)
+        out = bytearray(len(plaintext))
+        try:
+            pipeline_seal(KEY, NONCE, AAD, plaintext, out, 64)
+            print("Error: MAC stage error not raised.")
+            errors += 1
+        except RuntimeError:
+            pass
+    finally:
+        pipeline.Poly1305 = saved
+    if threading.active_count() != threads:
+        print("Error: Keystream worker still running.")
+        errors += 1
+
+    if errors == 0:
+        print("MAC stage error raised and worker stopped.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run pipeline tests.
+#-------------------------------------------------------------------
+def main():
+    test_pipeline_seal()
+    test_pipeline_forgery()
+    test_pipeline_mac_error()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF pipeline_test.py
+#=======================================================================
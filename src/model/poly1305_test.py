@@ -42,7 +42,12 @@
 # Python module imports.
 #-------------------------------------------------------------------
 import sys
+import io
+import random
+import contextlib
 from ch20p1305_utils import *
+from ch20p1305.poly1305 import poly1305_mac_fast
+from ch20p1305.poly1305 import Poly1305
 
 #-------------------------------------------------------------------
 # Defines.
@@ -243,6 +248,143 @@ def test_poly1305_mac():
     print("")
 
 
+#-------------------------------------------------------------------
+# test_poly1305_mac_fast()
+#
+# Test that the fast Poly1305 implementation generates the same
+# tags as poly1305_mac(). The RFC test vector from 2.5.2 is used
+# as well as a number of random keys and messages, including
+# keys with all bits in r and s set.
+#-------------------------------------------------------------------
+def test_poly1305_mac_fast():
+    key = [0x85, 0xd6, 0xbe, 0x78, 0x57, 0x55, 0x6d, 0x33,
+           0x7f, 0x44, 0x52, 0xfe, 0x42, 0xd5, 0x06, 0xa8,
+           0x01, 0x03, 0x80, 0x8a, 0xfb, 0x0d, 0xb2, 0xfd,
+           0x4a, 0xbf, 0xf6, 0xaf, 0x41, 0x49, 0xf5, 0x1b]
+
+    message = [0x43, 0x72, 0x79, 0x70, 0x74, 0x6f, 0x67, 0x72,
+               0x61, 0x70, 0x68, 0x69, 0x63, 0x20, 0x46, 0x6f,
+               0x72, 0x75, 0x6d, 0x20, 0x52, 0x65, 0x73, 0x65,
+               0x61, 0x72, 0x63, 0x68, 0x20, 0x47, 0x72, 0x6f,
+               0x75, 0x70]
+
+    expected = [0xa8, 0x06, 0x1d, 0xc1, 0x30, 0x51, 0x36, 0xc6,
+                0xc2, 0x2b, 0x8b, 0xaf, 0x0c, 0x01, 0x27, 0xa9]
+
+    print("*** Testing fast Poly1305 mac.")
+    errors = 0
+    if poly1305_mac_fast(key, message) != expected:
+        print("Incorrect tag generated for RFC test vector.")
+        errors += 1
+
+    rng = random.Random(0x1305)
+    keys = [[0xff] * 32]
+    keys += [[rng.randrange(256) for i in range(32)] for j in range(7)]
+    for k in keys:
+        for length in [0, 1, 15, 16, 17, 63, 64, 255]:
+            msg = [0xff] * length
+            if k != keys[0]:
+                msg = [rng.randrange(256) for i in range(length)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                ref_tag = poly1305_mac(k, msg)
+            if poly1305_mac_fast(k, msg) != ref_tag:
+                print("Incorrect tag generated for message length %d." % length)
+                errors += 1
+
+    if errors == 0:
+        print("Correct tags generated.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_poly1305_segments()
+#
+# Test that streaming a message as random segments, given as
+# bytes, bytearrays, memoryviews and lists, generates the same
+# tag as poly1305_mac_fast() on the complete message.
+#-------------------------------------------------------------------
+def test_poly1305_segments():
+    print("*** Testing Poly1305 with segmented messages.")
+    rng = random.Random(0x5e6)
+    errors = 0
+    for i in range(50):
+        key = bytes(rng.randrange(256) for j in range(32))
+        message = bytes(rng.randrange(256) for j in range(rng.randrange(200)))
+
+        mac = Poly1305(key)
+        pos = 0
+        while pos < len(message):
+            seglen = rng.randrange(1, 40)
+            segment = message[pos : pos + seglen]
+            kind = rng.randrange(4)
+            if kind == 1:
+                segment = bytearray(segment)
+            elif kind == 2:
+                segment = memoryview(message)[pos : pos + seglen]
+            elif kind == 3:
+                segment = list(segment)
+            mac.update(segment)
+            pos += seglen
+
+        if mac.finalize() != poly1305_mac_fast(key, message):
+            print("Incorrect tag for message length %d." % len(message))
+            errors += 1
+
+    if errors == 0:
+        print("Correct tags generated.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_poly1305_batch()
+#
+# Test that the NumPy batch of many keys and messages with
+# different lengths generates the same tags as poly1305_mac()
+# for every message, and that the verification bitmap flags
+# the incorrect tags.
+#-------------------------------------------------------------------
+def test_poly1305_batch():
+    print("*** Testing batched Poly1305 with NumPy.")
+    try:
+        from ch20p1305 import np_poly1305
+    except ImportError:
+        print("NumPy not available, skipping test.")
+        print("")
+        return
+
+    rng = random.Random(0xba7)
+    keys = [[0xff] * 32]
+    keys += [[rng.randrange(256) for i in range(32)] for j in range(39)]
+    messages = [[0xff] * 255]
+    messages += [[rng.randrange(256) for i in range(rng.randrange(200))]
+                 for j in range(39)]
+    messages[1:6] = [[], [0x01], [0x02] * 15, [0x03] * 16, [0x04] * 17]
+
+    errors = 0
+    tags = np_poly1305.poly1305_macs(keys, messages)
+    for i in range(len(messages)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ref_tag = poly1305_mac(keys[i], messages[i][:])
+        if tags[i] != ref_tag:
+            print("Incorrect tag for message %d, length %d." % (i, len(messages[i])))
+            errors += 1
+
+    expected = [tag[:] for tag in tags]
+    for i in [0, 7, 23]:
+        expected[i][15] ^= 0x80
+    bitmap = np_poly1305.poly1305_verify(keys, messages, expected)
+    if [i for i in range(len(bitmap)) if not bitmap[i]] != [0, 7, 23]:
+        print("Incorrect verification bitmap.")
+        errors += 1
+
+    if errors == 0:
+        print("Correct tags generated for all messages.")
+    print("")
+    assert errors == 0
+
+
 #-------------------------------------------------------------------
 # main()
 #
@@ -254,6 +396,9 @@ def main():
 #    test_clamp_r()
 #    test_poly1305_update()
     test_poly1305_mac()
+    test_poly1305_mac_fast()
+    test_poly1305_segments()
+    test_poly1305_batch()
 
 
 #-------------------------------------------------------------------
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# precompute_test.py
+# ------------------
+# Tests of the background keystream precomputation for records.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+from ch20p1305 import metrics
+from ch20p1305.record import RecordSealer, RecordOpener
+from ch20p1305.precompute import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+KEY = bytes(range(0x80, 0xa0))
+IV = bytes([0x07, 0x00, 0x00, 0x00, 0x40, 0x41, 0x42, 0x43,
+            0x44, 0x45, 0x46, 0x47])
+
+
+#-------------------------------------------------------------------
+# test_precompute_records()
+#
+# Seal records with and without precomputation, including records
+# longer than the precomputed keystream, and open them with a
+# precomputing opener. A forged record before every real record
+# must not use up the cache entry, so all records must be hits.
+#-------------------------------------------------------------------
+def test_precompute_records():
+    print("*** Test of records with precomputed keystream.")
+    errors = 0
+    metrics.enable()
+    metrics.reset()
+
+    reference = RecordSealer(KEY, IV, 100)
+    sealer = RecordSealer(KEY, IV, 100)
+    opener = RecordOpener(KEY, IV, 100)
+    sealer_cache = KeystreamCache(sealer, depth=3, blocks=2)
+    opener_cache = KeystreamCache(opener, depth=3, blocks=2)
+
+    lengths = [0, 1, 127, 128, 129, 1000]
+    for length in lengths:
+        plaintext = bytes((i * 3) & 0xff for i in range(length))
+        sealer_cache.wait_filled(10)
+        opener_cache.wait_filled(10)
+        record = sealer.seal([0x17], plaintext)
+        if record != reference.seal([0x17], plaintext):
+            print("Error: Incorrect record for length %d." % length)
+            errors += 1
+        forged_tag = list(record[1])
+        forged_tag[0] ^= 0x01
+        if opener.open([0x17], record[0], forged_tag) is not None:
+            print("Error: Forged record of length %d opened." % length)
+            errors += 1
+        if opener.open([0x17], record[0], record[1]) != list(plaintext):
+            print("Error: Record of length %d not opened." % length)
+            errors += 1
+
+    counters = metrics.snapshot()["counters"]
+    if counters["key_cache_hits"] != 2 * len(lengths) or counters["key_cache_misses"]:
+        print("Error: Unexpected cache hits and misses %s." % counters)
+        errors += 1
+    metrics.disable()
+    sealer_cache.close()
+    opener_cache.close()
+
+    if errors == 0:
+        print("Correct records from the cache.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_precompute_limits()
+#
+# Test the memory cap and that rekeying invalidates the cache.
+#-------------------------------------------------------------------
+def test_precompute_limits():
+    print("*** Test of the precompute memory cap and rekey.")
+    errors = 0
+
+    try:
+        KeystreamCache(RecordSealer(KEY, IV), blocks=16, max_bytes=1000)
+        print("Error: Cache larger than the memory cap accepted.")
+        errors += 1
+    except ValueError:
+        pass
+
+    sealer = RecordSealer(KEY, IV)
+    cache = KeystreamCache(sealer, depth=8, blocks=4, max_bytes=1000)
+    cache.wait_filled(10)
+    if cache.memory() > 1000 or len(cache.entries) != 3:
+        print("Error: Memory cap not enforced, %d bytes." % cache.memory())
+        errors += 1
+
+    new_key = KEY[::-1]
+    sealer.rekey(new_key, IV)
+    cache.wait_filled(10)
+    if sealer.seal([], [1, 2, 3]) != RecordSealer(new_key, IV).seal([], [1, 2, 3]):
+        print("Error: Stale keystream used after rekey.")
+        errors += 1
+    cache.close()
+
+    if errors == 0:
+        print("Memory cap and rekey handled.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run precompute tests.
+#-------------------------------------------------------------------
+def main():
+    test_precompute_records()
+    test_precompute_limits()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF precompute_test.py
+#=======================================================================
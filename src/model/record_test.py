@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# record_test.py
+# --------------
+# Tests of the record layer sealer and opener.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+from ch20p1305.aead import aead_seal
+from ch20p1305.record import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+KEY = bytes(range(0x80, 0xa0))
+IV = bytes([0x07, 0x00, 0x00, 0x00, 0x40, 0x41, 0x42, 0x43,
+            0x44, 0x45, 0x46, 0x47])
+
+
+#-------------------------------------------------------------------
+# rfc7905_nonce()
+#
+# The record nonce computed as bytes as described in RFC 7905.
+#-------------------------------------------------------------------
+def rfc7905_nonce(iv, seq):
+    padded_seq = bytes(4) + seq.to_bytes(8, "big")
+    return bytes(iv[i] ^ padded_seq[i] for i in range(12))
+
+
+#-------------------------------------------------------------------
+# test_record_sealer()
+#
+# Seal records and check them against aead_seal() with the RFC
+# 7905 nonce, then open them in order. A forged record must be
+# rejected without advancing the sequence number.
+#-------------------------------------------------------------------
+def test_record_sealer():
+    print("*** Test of the record layer sealer and opener.")
+    errors = 0
+    first_seq = 0x00ff00ff00fffffe
+    sealer = RecordSealer(KEY, IV, first_seq)
+    opener = RecordOpener(KEY, IV, first_seq)
+
+    records = []
+    for i in range(4):
+        aad = [0x17, 0x03, 0x03, i]
+        plaintext = list(range(i * 30))
+        (ciphertext, tag) = sealer.seal(aad, plaintext)
+        expected = aead_seal(KEY, rfc7905_nonce(IV, first_seq + i), aad, plaintext)
+        if (ciphertext, tag) != expected:
+            print("Error: Incorrect record %d." % i)
+            errors += 1
+        records.append((aad, ciphertext, tag, plaintext))
+
+    (aad, ciphertext, tag, plaintext) = records[0]
+    if opener.open(aad, ciphertext, [t ^ 1 for t in tag]) is not None:
+        print("Error: Forged record accepted.")
+        errors += 1
+    for (aad, ciphertext, tag, plaintext) in records:
+        if opener.open(aad, ciphertext, tag) != plaintext:
+            print("Error: Record not opened.")
+            errors += 1
+    if opener.seq != first_seq + 4:
+        print("Error: Incorrect sequence number after open.")
+        errors += 1
+
+    if errors == 0:
+        print("Records correctly sealed and opened.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_record_limits()
+#
+# Test that sequence number exhaustion and the record limit are
+# enforced, and that rekeying resets them.
+#-------------------------------------------------------------------
+def test_record_limits():
+    print("*** Test of the record layer limits.")
+    errors = 0
+
+    sealer = RecordSealer(KEY, IV, MAX_SEQUENCE)
+    sealer.seal([], [1, 2, 3])
+    try:
+        sealer.seal([], [1, 2, 3])
+        print("Error: Sequence number wrapped.")
+        errors += 1
+    except RecordLimitError:
+        pass
+
+    sealer = RecordSealer(KEY, IV, max_records=2)
+    sealer.seal([], [])
+    sealer.seal([], [])
+    try:
+        sealer.seal([], [])
+        print("Error: Record limit not enforced.")
+        errors += 1
+    except RecordLimitError:
+        pass
+    sealer.rekey(KEY[::-1], IV)
+    if sealer.seal([], [1])[0] != aead_seal(KEY[::-1], IV, [], [1])[0]:
+        print("Error: Incorrect record after rekey.")
+        errors += 1
+
+    if errors == 0:
+        print("Record limits enforced.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run record layer tests.
+#-------------------------------------------------------------------
+def main():
+    test_record_sealer()
+    test_record_limits()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF record_test.py
+#=======================================================================
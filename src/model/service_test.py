@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# service_test.py
+# ---------------
+# Tests of the local batching seal and open service.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import socket
+import tempfile
+import threading
+import importlib.util
+from ch20p1305.aead import aead_seal
+from ch20p1305.service import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+KEY = bytes(range(0x80, 0xa0))
+AAD = bytes([0x50, 0x51, 0x52, 0x53, 0xc0, 0xc1, 0xc2, 0xc3])
+
+
+#-------------------------------------------------------------------
+# check_service()
+#
+# Seal and open messages from a number of client threads through
+# a server using the given engine. Returns the number of errors
+# and the server, which is closed.
+#-------------------------------------------------------------------
+def check_service(path, engine):
+    errors = []
+    server = BatchServer(path, max_batch=16, max_batch_delay=0.01,
+                         engine=engine).start()
+    client = ServiceClient(path, pool_size=4)
+
+    def worker(index):
+        for length in [0, 1, 64, 65, 300]:
+            nonce = bytes([index, length & 0xff]) + bytes(10)
+            plaintext = bytes((i * index) & 0xff for i in range(length))
+            (ciphertext, tag) = client.seal(KEY, nonce, AAD, plaintext)
+            if (ciphertext, tag) != tuple(bytes(x) for x in
+                                          aead_seal(KEY, nonce, AAD, plaintext)):
+                errors.append("Incorrect seal for length %d." % length)
+            if client.open(KEY, nonce, AAD, ciphertext, tag) != plaintext:
+                errors.append("Incorrect open for length %d." % length)
+            forged = bytes([tag[0] ^ 1]) + tag[1:]
+            if client.open(KEY, nonce, AAD, ciphertext, forged) is not None:
+                errors.append("Forged message accepted for length %d." % length)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.close()
+    server.close()
+    for error in errors:
+        print("Error: " + error)
+    return (len(errors), server)
+
+
+#-------------------------------------------------------------------
+# test_service_seal_open()
+#
+# Test that the service gives the same results as aead_seal()
+# with both engines, and that concurrent requests are batched.
+#-------------------------------------------------------------------
+def test_service_seal_open():
+    print("*** Test of seal and open through the service.")
+    errors = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "service.sock")
+        (n, server) = check_service(path, process_batch_core)
+        errors += n
+        if importlib.util.find_spec("numpy") is not None:
+            (n, server) = check_service(path, process_batch_numpy)
+            errors += n
+        else:
+            print("NumPy not available, NumPy engine not tested.")
+
+        if server.batches >= server.batched_requests:
+            print("Error: No requests were batched.")
+            errors += 1
+
+    if errors == 0:
+        print("Service results identical to aead_seal().")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_service_bad_request()
+#
+# Test that a request with an unknown operation is rejected and
+# that the load generator reports latencies.
+#-------------------------------------------------------------------
+def test_service_bad_request():
+    print("*** Test of bad requests and the load generator.")
+    errors = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "service.sock")
+        server = BatchServer(path).start()
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        sock.sendall(REQUEST.pack(7, 42, KEY, bytes(12), 0, 0, bytes(16)))
+        response = recv_exact(sock, RESPONSE.size)
+        sock.close()
+        if response is None or RESPONSE.unpack(response)[0:2] != (STATUS_BAD_REQUEST, 42):
+            print("Error: Bad request not rejected.")
+            errors += 1
+
+        result = load_test(path, 200, 0.25, concurrency=4)
+        if result["requests"] != 50 or not 0 < result["p50"] <= result["p99"]:
+            print("Error: Incorrect load generator result %s." % result)
+            errors += 1
+        server.close()
+
+    if errors == 0:
+        print("Bad request rejected, load generator ok.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_service_isolation()
+#
+# Test that a client that stops reading its responses does not
+# stall other clients, and that a failing engine answers the
+# batch with STATUS_BAD_REQUEST instead of stopping the service.
+#-------------------------------------------------------------------
+def test_service_isolation():
+    print("*** Test of stalled clients and engine failures.")
+    errors = 0
+
+    def engine(batch):
+        if any(r["aad"] == b"fail" for r in batch):
+            raise RuntimeError("Engine failure.")
+        return process_batch_core(batch)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "service.sock")
+        server = BatchServer(path, max_batch=1, engine=engine).start()
+
+        # Enough response data to fill the socket buffers.
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect(path)
+        data = bytes(128 * 1024)
+        for i in range(8):
+            stalled.sendall(REQUEST.pack(OP_SEAL, i, KEY, bytes(12), 0,
+                                         len(data), bytes(16)) + data)
+
+        results = []
+        def other_client():
+            client = ServiceClient(path)
+            results.append(client.seal(KEY, bytes(12), AAD, b"abc"))
+            try:
+                client.seal(KEY, bytes(12), b"fail", b"abc")
+                results.append("accepted")
+            except ValueError:
+                results.append("rejected")
+            results.append(client.seal(KEY, bytes(12), AAD, b"abc"))
+            client.close()
+
+        thread = threading.Thread(target=other_client, daemon=True)
+        thread.start()
+        thread.join(10)
+        expected = tuple(bytes(x) for x in aead_seal(KEY, bytes(12), AAD, b"abc"))
+        if thread.is_alive():
+            print("Error: Client stalled by a client not reading.")
+            errors += 1
+        elif results != [expected, "rejected", expected]:
+            print("Error: Incorrect results %s." % results)
+            errors += 1
+        stalled.close()
+        server.close()
+
+    if errors == 0:
+        print("Clients isolated and engine failures answered.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run service tests.
+#-------------------------------------------------------------------
+def main():
+    test_service_seal_open()
+    test_service_bad_request()
+    test_service_isolation()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF service_test.py
+#=======================================================================
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# snapshots_test.py
+# -----------------
+# Tests of the round snapshot store and the divergence search.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+import os
+import tempfile
+from ch20p1305.chacha import chacha_block, doubleround
+from ch20p1305.snapshots import *
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+KEY = list(range(8))
+NONCE = [0x09000000, 0x4a000000, 0x00000000]
+
+
+#-------------------------------------------------------------------
+# test_trace_block()
+#
+# Test that the traced block matches chacha_block() and that the
+# doubleround steps match doubleround().
+#-------------------------------------------------------------------
+def test_trace_block():
+    print("*** Test of the traced ChaCha block function.")
+    trace = trace_block(KEY, 1, NONCE)
+
+    errors = 0
+    if len(trace) != STEPS or list(trace[FINAL_STEP]) != chacha_block(KEY, 1, NONCE):
+        print("Error: Final state does not match chacha_block().")
+        errors += 1
+    state = list(trace[0])
+    for dr in range(1, 11):
+        state = doubleround(state)
+        if list(trace[8 * dr]) != state:
+            print("Error: State after doubleround %d incorrect." % dr)
+            errors += 1
+
+    if errors == 0:
+        print("Traced states correct.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# corrupt()
+#
+# Write a copy of the model store to bad_path with an error in
+# word 1 from the given step to the final addition of the given
+# blocks. Errors is a list of (vector, block, first step).
+#-------------------------------------------------------------------
+def corrupt(model_path, bad_path, model, errors):
+    with open(model_path, "rb") as f:
+        data = bytearray(f.read())
+    for (vector, block, step) in errors:
+        for offset in range(model.offset(vector, block, step),
+                            model.offset(vector, block, FINAL_STEP) + 64, 64):
+            data[offset + 4] ^= 0x01
+    with open(bad_path, "wb") as f:
+        f.write(data)
+
+
+#-------------------------------------------------------------------
+# test_first_divergence()
+#
+# Record a model store for two vectors. Build a text dump with
+# the doubleround states and a binary dump with all states, and
+# inject errors that stay in the rest of a block. The search
+# must find the first injected error.
+#-------------------------------------------------------------------
+def test_first_divergence():
+    print("*** Test of the snapshot divergence search.")
+    errors = 0
+    runs = [(0, KEY, 1, NONCE, 3), (7, KEY[::-1], 100, NONCE, 4)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_path = os.path.join(tmpdir, "model.chrs")
+        write_store(model_path, runs)
+        model = SnapshotStore(model_path)
+
+        if model.state(7, 102, FINAL_STEP) != tuple(chacha_block(KEY[::-1], 102, NONCE)):
+            print("Error: Incorrect state read from store.")
+            errors += 1
+
+        # Text dump with the doubleround states, error injected from
+        # doubleround 6 in block 101 of vector 7.
+        dump_path = os.path.join(tmpdir, "dump.txt")
+        with open(dump_path, "w") as f:
+            f.write("# vector block step words\n")
+            for (vector, key, counter, nonce, num_blocks) in runs:
+                for block in range(counter, counter + num_blocks):
+                    for step in [0] + [8 * d for d in range(1, 11)] + [FINAL_STEP]:
+                        words = list(model.state(vector, block, step))
+                        if (vector, block) == (7, 101) and step >= 48:
+                            words[9] ^= 0x100
+                        f.write("%d %d %d %s\n" % (vector, block, step,
+                                                   " ".join("%08x" % w for w in words)))
+        if first_divergence(model, load_dump(model_path)) is not None:
+            print("Error: Divergence found comparing model with itself.")
+            errors += 1
+        d = first_divergence(model, load_dump(dump_path))
+        if d is None or (d["vector"], d["block"], d["step"], d["word"]) != (7, 101, 48, 9):
+            print("Error: Incorrect divergence found in text dump: %r" % d)
+            errors += 1
+
+        # Binary dump with an error in block 3 of vector 0 from step
+        # 40 to the final addition only. The following blocks start
+        # again from the key, counter and nonce and are correct.
+        bad_path = os.path.join(tmpdir, "bad.chrs")
+        corrupt(model_path, bad_path, model, [(0, 3, 40)])
+        d = first_divergence(model, load_dump(bad_path))
+        if d is None or (d["vector"], d["block"], d["step"], d["word"]) != (0, 3, 40, 1):
+            print("Error: Incorrect divergence found for one block: %r" % d)
+            errors += 1
+
+        # A systematic error hitting every block from vector 0 block 2,
+        # but at an earlier step in the later blocks. The first
+        # diverging block must be reported.
+        bad_path = os.path.join(tmpdir, "bad_many.chrs")
+        corrupt(model_path, bad_path, model,
+                [(0, 2, 60), (0, 3, 10), (7, 100, 5), (7, 101, 5),
+                 (7, 102, 5), (7, 103, 5)])
+        d = first_divergence(model, load_dump(bad_path))
+        if d is None or (d["vector"], d["block"], d["step"], d["word"]) != (0, 2, 60, 1):
+            print("Error: Incorrect divergence found for many blocks: %r" % d)
+            errors += 1
+
+        # A dump with a block that is not in the model.
+        long_path = os.path.join(tmpdir, "long.chrs")
+        write_store(long_path, [(0, KEY, 1, NONCE, 4)])
+        d = first_divergence(model, load_dump(long_path))
+        if d is None or not d["missing"] or \
+           (d["vector"], d["block"], d["step"]) != (0, 4, 0):
+            print("Error: Missing model key not reported: %r" % d)
+            errors += 1
+        model.close()
+
+    if errors == 0:
+        print("Divergence search correct.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run snapshot tests.
+#-------------------------------------------------------------------
+def main():
+    test_trace_block()
+    test_first_divergence()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF snapshots_test.py
+#=======================================================================
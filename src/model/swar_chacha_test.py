@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# swar_chacha_test.py
+# -------------------
+# Tests of the SWAR multi block ChaCha20 model.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+from ch20p1305.utils import l2lw32
+from ch20p1305.chacha import chacha_block, chacha_encryption
+from ch20p1305 import swar_chacha
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+KEY = l2lw32(list(range(32)))
+NONCE = l2lw32([0x00, 0x00, 0x00, 0x09, 0x00, 0x00, 0x00, 0x4a,
+                0x00, 0x00, 0x00, 0x00])
+
+
+#-------------------------------------------------------------------
+# test_swar_blocks()
+#
+# Check every lane of the SWAR core against chacha_block() for
+# four and eight lanes. The lanes straddle the 32 bit counter
+# wrap to check that the guard bits keep the lanes apart.
+#-------------------------------------------------------------------
+def test_swar_blocks():
+    print("*** Test of the SWAR ChaCha20 block function.")
+    errors = 0
+    for lanes in [1, 4, 8]:
+        for counter in [1, 0xfffffff8]:
+            keystream = swar_chacha.chacha_blocks(KEY, counter, NONCE, lanes)
+            for lane in range(lanes):
+                block = chacha_block(KEY, counter + lane, NONCE)
+                expected = b"".join(w.to_bytes(4, "little") for w in block)
+                if keystream[lane * 64 : (lane + 1) * 64] != expected:
+                    print("Error: Incorrect block in lane %d of %d, counter 0x%08x." %
+                          (lane, lanes, counter))
+                    errors += 1
+
+    if errors == 0:
+        print("Correct blocks in all lanes.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_swar_xor()
+#
+# Encipher messages of lengths that do not fill the last set of
+# lanes and compare against chacha_encryption().
+#-------------------------------------------------------------------
+def test_swar_xor():
+    print("*** Test of SWAR ChaCha20 encryption.")
+    errors = 0
+    for length in [0, 1, 63, 64, 65, 300, 1000]:
+        plaintext = bytes((i * 7) & 0xff for i in range(length))
+        expected = bytearray(chacha_encryption(KEY, 1, NONCE, list(plaintext)))
+        for lanes in [4, 8]:
+            out = bytearray(length)
+            if swar_chacha.chacha_xor(KEY, 1, NONCE, plaintext, out, lanes) != expected:
+                print("Error: Incorrect ciphertext, length %d, %d lanes." %
+                      (length, lanes))
+                errors += 1
+
+    if errors == 0:
+        print("Correct ciphertext for all lengths.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run SWAR ChaCha20 tests.
+#-------------------------------------------------------------------
+def main():
+    test_swar_blocks()
+    test_swar_xor()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF swar_chacha_test.py
+#=======================================================================
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#=======================================================================
+#
+# xchacha_test.py
+# ---------------
+# Tests of HChaCha20, XChaCha20 and XChaCha20-Poly1305 with the
+# test vectors from draft-irtf-cfrg-xchacha-03.
+#
+#
+# Copyright (c) 2016 Secworks Sweden AB
+# Author: Joachim Strömbergson
+#
+# Redistribution and use in source and binary forms, with or
+# without modification, are permitted provided that the following
+# conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT,
+# STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+# ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#=======================================================================
+
+#-------------------------------------------------------------------
+# Python module imports.
+#-------------------------------------------------------------------
+import sys
+from ch20p1305.utils import l2lw32, w32bl
+from ch20p1305.chacha import hchacha20, chacha_encryption
+from ch20p1305.aead import chacha_xor
+from ch20p1305.xchacha import *
+from ch20p1305 import swar_chacha
+
+
+#-------------------------------------------------------------------
+# Defines.
+#-------------------------------------------------------------------
+AEAD_KEY = bytes(range(0x80, 0xa0))
+AEAD_NONCE = bytes(range(0x40, 0x58))
+AEAD_AAD = bytes.fromhex("50515253c0c1c2c3c4c5c6c7")
+AEAD_PLAINTEXT = (b"Ladies and Gentlemen of the class of '99: If I could "
+                  b"offer you only one tip for the future, sunscreen would "
+                  b"be it.")
+
+
+#-------------------------------------------------------------------
+# test_hchacha20()
+#
+# Test vector from 2.2.1 in the draft.
+#-------------------------------------------------------------------
+def test_hchacha20():
+    print("*** Test of HChaCha20.")
+    key = l2lw32(list(range(32)))
+    nonce = l2lw32([0x00, 0x00, 0x00, 0x09, 0x00, 0x00, 0x00, 0x4a,
+                    0x00, 0x00, 0x00, 0x00, 0x31, 0x41, 0x59, 0x27])
+    expected = bytes.fromhex("82413b4227b27bfed30e42508a877d73"
+                             "a0f9e4d58a74a853c12ec41326d3ecdc")
+
+    errors = 0
+    if bytes(w32bl(hchacha20(key, nonce))) != expected:
+        print("Error: Incorrect subkey.")
+        errors += 1
+
+    if errors == 0:
+        print("Correct subkey generated.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_xchacha_aead()
+#
+# Test vector from A.3.1 in the draft. Also checks that a forged
+# tag is rejected.
+#-------------------------------------------------------------------
+def test_xchacha_aead():
+    print("*** Test of XChaCha20-Poly1305.")
+    expected_ciphertext = bytes.fromhex(
+        "bd6d179d3e83d43b9576579493c0e939572a1700252bfaccbed2902c21396cbb"
+        "731c7f1b0b4aa6440bf3a82f4eda7e39ae64c6708c54c216cb96b72e1213b452"
+        "2f8c9ba40db5d945b11b69b982c1bb9e3f3fac2bc369488f76b2383565d3fff9"
+        "21f9664c97637da9768812f615c68b13b52e")
+    expected_tag = bytes.fromhex("c0875924c1c7987947deafd8780acf49")
+
+    errors = 0
+    (ciphertext, tag) = xchacha_seal(AEAD_KEY, AEAD_NONCE, AEAD_AAD,
+                                     AEAD_PLAINTEXT)
+    if bytes(ciphertext) != expected_ciphertext:
+        print("Error: Incorrect ciphertext.")
+        errors += 1
+    if bytes(tag) != expected_tag:
+        print("Error: Incorrect tag.")
+        errors += 1
+
+    out = bytearray(len(ciphertext))
+    if xchacha_open(AEAD_KEY, AEAD_NONCE, AEAD_AAD, ciphertext, tag, out) != \
+       bytearray(AEAD_PLAINTEXT):
+        print("Error: Incorrect plaintext.")
+        errors += 1
+    tag[0] ^= 0x01
+    if xchacha_open(AEAD_KEY, AEAD_NONCE, AEAD_AAD, ciphertext, tag) is not None:
+        print("Error: Forged message accepted.")
+        errors += 1
+
+    if errors == 0:
+        print("Correct ciphertext and tag generated.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_xchacha20()
+#
+# Keystream and ciphertext test vector from A.3.2 in the draft.
+# The keystream starts at block counter 1.
+#-------------------------------------------------------------------
+def test_xchacha20():
+    print("*** Test of XChaCha20.")
+    key = bytes(range(0x80, 0xa0))
+    nonce = bytes.fromhex("404142434445464748494a4b4c4d4e4f5051525354555658")
+    plaintext = (b'The dhole (pronounced "dole") is also known as the Asiatic '
+                 b'wild dog, red dog, and whistling dog. It is about the size '
+                 b'of a German shepherd but looks more like a long-legged fox. '
+                 b'This highly elusive and skilled jumper is classified with '
+                 b'wolves, coyotes, jackals, and foxes in the taxonomic family '
+                 b'Canidae.')
+    expected_keystream = bytes.fromhex(
+        "29624b4b1b140ace53740e405b2168540fd7d630c1f536fecd722fc3cddba7f4"
+        "cca98cf9e47e5e64d115450f9b125b54449ff76141ca620a1f9cfcab2a1a8a25"
+        "5e766a5266b878846120ea64ad99aa479471e63befcbd37cd1c22a221fe46221"
+        "5cf32c74895bf505863ccddd48f62916dc6521f1ec50a5ae08903aa259d9bf60"
+        "7cd8026fba548604f1b6072d91bc91243a5b845f7fd171b02edc5a0a84cf28dd"
+        "241146bc376e3f48df5e7fee1d11048c190a3d3deb0feb64b42d9c6fdeee290f"
+        "a0e6ae2c26c0249ea8c181f7e2ffd100cbe5fd3c4f8271d62b15330cb8fdcf00"
+        "b3df507ca8c924f7017b7e712d15a2eb5c50484451e54e1b4b995bd8fdd94597"
+        "bb94d7af0b2c04df10ba0890899ed9293a0f55b8bafa999264035f1d4fbe7fe0"
+        "aafa109a62372027e50e10cdfecca127")
+    expected_ciphertext = bytes.fromhex(
+        "7d0a2e6b7f7c65a236542630294e063b7ab9b555a5d5149aa21e4ae1e4fbce87"
+        "ecc8e08a8b5e350abe622b2ffa617b202cfad72032a3037e76ffdcdc4376ee05"
+        "3a190d7e46ca1de04144850381b9cb29f051915386b8a710b8ac4d027b8b050f"
+        "7cba5854e028d564e453b8a968824173fc16488b8970cac828f11ae53cabd201"
+        "12f87107df24ee6183d2274fe4c8b1485534ef2c5fbc1ec24bfc3663efaa08bc"
+        "047d29d25043532db8391a8a3d776bf4372a6955827ccb0cdd4af403a7ce4c63"
+        "d595c75a43e045f0cce1f29c8b93bd65afc5974922f214a40b7c402cdb91ae73"
+        "c0b63615cdad0480680f16515a7ace9d39236464328a37743ffc28f4ddb324f4"
+        "d0f5bbdc270c65b1749a6efff1fbaa09536175ccd29fb9e6057b307320d31683"
+        "8a9c71f70b5b5907a66f7ea49aadc409")
+
+    errors = 0
+    keystream = xchacha20_xor(key, nonce, bytes(len(plaintext)),
+                              bytearray(len(plaintext)), 1)
+    if bytes(keystream) != expected_keystream:
+        print("Error: Incorrect keystream.")
+        errors += 1
+    ciphertext = xchacha20_xor(key, nonce, plaintext, bytearray(len(plaintext)), 1)
+    if bytes(ciphertext) != expected_ciphertext:
+        print("Error: Incorrect ciphertext.")
+        errors += 1
+
+    if errors == 0:
+        print("Correct keystream and ciphertext generated.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# test_xchacha20_engines()
+#
+# Test that XChaCha20 gives the same keystream with all engines,
+# and that it is the ChaCha20 keystream for the subkey.
+#-------------------------------------------------------------------
+def test_xchacha20_engines():
+    print("*** Test of XChaCha20 with all engines.")
+    data = bytes(range(256)) + bytes(44)
+    (subkey, subnonce) = xchacha_key_nonce(AEAD_KEY, AEAD_NONCE)
+    expected = bytearray(chacha_encryption(subkey, 1, subnonce, list(data)))
+
+    engines = [("core", chacha_xor), ("swar", swar_chacha.chacha_xor)]
+    try:
+        from ch20p1305 import np_chacha
+        engines.append(("numpy", np_chacha.chacha_xor))
+    except ImportError:
+        print("NumPy not available, NumPy engine not tested.")
+
+    errors = 0
+    for (name, xor) in engines:
+        out = bytearray(len(data))
+        if xchacha20_xor(AEAD_KEY, AEAD_NONCE, data, out, 1, xor) != expected:
+            print("Error: Incorrect keystream from the %s engine." % name)
+            errors += 1
+
+    if errors == 0:
+        print("Same keystream from all engines.")
+    print("")
+    assert errors == 0
+
+
+#-------------------------------------------------------------------
+# main()
+#
+# Run XChaCha tests.
+#-------------------------------------------------------------------
+def main():
+    test_hchacha20()
+    test_xchacha20()
+    test_xchacha_aead()
+    test_xchacha20_engines()
+
+
+#-------------------------------------------------------------------
+#-------------------------------------------------------------------
+if __name__=="__main__":
+    sys.exit(main())
+
+#=======================================================================
+# EOF xchacha_test.py
+#=======================================================================